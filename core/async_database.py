@@ -0,0 +1,155 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+from core.database import Database
+from core.metrics import metrics
+from core.player_cache import PlayerCache
+from models.player import Player
+
+logger = logging.getLogger(__name__)
+
+class AsyncDatabase:
+    """Awaitable facade over Database for use inside handlers
+
+    Writes are serialized on a single writer thread (SQLite only allows one
+    writer at a time anyway) while reads fan out over a few reader threads,
+    so a slow fsync never blocks the event loop or other users' reads.
+
+    Players go through a write-behind PlayerCache: save_player() only marks
+    the player dirty and a background task writes all dirty players in one
+    transaction every flush_interval seconds. Call flush() when a change
+    must be on disk before replying (e.g. purchases).
+
+    The Database itself is opened on first use rather than at import, so
+    importing a handler module never touches the disk.
+    """
+
+    def __init__(self, database: Database = None, reader_threads: int = 3,
+                 cache_size: int = 5000, flush_interval: float = 2.0):
+        self._db = database
+        self._pool_size = reader_threads + 1
+        self._db_lock = threading.Lock()
+        self.cache = PlayerCache(max_entries=cache_size)
+        self.flush_interval = flush_interval
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=reader_threads, thread_name_prefix="db-reader")
+        self._flush_task = None
+        self._flush_lock = None
+
+    @property
+    def db(self) -> Database:
+        """The shared Database, opened the first time it is needed"""
+        if self._db is None:
+            with self._db_lock:
+                if self._db is None:
+                    self._db = Database(pool_size=self._pool_size)
+        return self._db
+
+    async def _run(self, executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Measured from the loop, so the time includes waiting for a free thread
+        with metrics.track("db", getattr(func, '__name__', 'call')):
+            return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def run_read(self, func, *args, **kwargs):
+        """Run a blocking read callable on a reader thread"""
+        return await self._run(self._readers, func, *args, **kwargs)
+
+    async def run_write(self, func, *args, **kwargs):
+        """Run a blocking write callable on the writer thread"""
+        return await self._run(self._writer, func, *args, **kwargs)
+
+    async def get_player(self, user_id: int) -> Player:
+        """Get player data by user ID"""
+        player = self.cache.get(user_id)
+        if player is not None:
+            player.apply_regen()
+            return player
+
+        player = await self.run_read(self.db.get_player, user_id)
+        if player is None:
+            return None
+        return self.cache.add(player)
+
+    async def save_player(self, player: Player):
+        """Queue player data for the next batched write"""
+        self.cache.mark_dirty(player)
+
+    async def get_players(self, user_ids: Iterable[int]) -> Dict[int, Player]:
+        """Get several players, reading only the uncached ones in one query"""
+        players = {}
+        missing = []
+        for user_id in user_ids:
+            player = self.cache.get(user_id)
+            if player is not None:
+                player.apply_regen()
+                players[user_id] = player
+            else:
+                missing.append(user_id)
+
+        if missing:
+            loaded = await self.run_read(self.db.get_players, missing)
+            for user_id, player in loaded.items():
+                players[user_id] = self.cache.add(player)
+        return players
+
+    async def save_players(self, players: Iterable[Player]):
+        """Queue several players for the next batched write"""
+        for player in players:
+            self.cache.mark_dirty(player)
+
+    async def flush(self):
+        """Write every dirty player now and wait until it is committed"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            players = self.cache.take_dirty()
+            if not players:
+                return
+            try:
+                await self.run_write(self._write_players, players)
+            except Exception:
+                self.cache.restore_dirty(players)
+                raise
+            self.cache.confirm_saved(players)
+
+    def _write_players(self, players: List[Player]):
+        self.db.save_players(players)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Periodic player flush failed, will retry")
+
+    def start(self):
+        """Start the periodic flush task on the running event loop"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the periodic task and write anything still pending"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    def close(self):
+        """Wait for queued work, then stop the threads and close connections"""
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        if self._db is not None:
+            self._db.close()
+
+# Global async database instance
+async_db = AsyncDatabase()
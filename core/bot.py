@@ -1,97 +1,160 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters, CallbackQueryHandler, Application
-from core.database import Database
+from telegram import Update
+from telegram.request import BaseRequest
+from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters, Application, TypeHandler
+from core.async_database import async_db
+from core.outbound import outbound
+from core.frame_renderer import renderer
+from core.router import CallbackRouter
+from core import keyboards
+from core.services import services
+from core.metrics import metrics, metrics_server, admin_ids
+from core.profiler import profiler, MAX_DURATION
+from pathlib import Path
+import asyncio
 from models.player import Player
 import os
 import logging
 
-# Import handlers with proper error handling
-try:
-    from shop.shop_handlers import get_shop_handlers
-    SHOP_AVAILABLE = True
-except ImportError:
-    print("⚠️ Shop module not available - shop features disabled")
-    SHOP_AVAILABLE = False
+logger = logging.getLogger(__name__)
 
-try:
-    from handlers.combat_integration import integrate_combat_system
-    COMBAT_AVAILABLE = True
-except ImportError:
-    print("⚠️ Combat module not available - combat features disabled") 
-    COMBAT_AVAILABLE = False
+# Combat and shop register their buttons up front but are only imported on first use
+from handlers.combat_routes import BOT_BATTLE_ROUTES, COMBAT_ROUTES
+from shop.shop_routes import SHOP_ROUTES
 
-# Initialize database
-db = Database()
+SHOP_AVAILABLE = services.available("shop")
+if not SHOP_AVAILABLE:
+    logger.warning("Shop module not available - shop features disabled")
+
+COMBAT_AVAILABLE = services.available("combat")
+if not COMBAT_AVAILABLE:
+    logger.warning("Combat module not available - combat features disabled")
+
+# Shared async database facade
+db = async_db
 
 class MafiaBot:
-    def __init__(self):
-        self.logger = logging.getLogger(__name__)
-        self.db = Database()
+    def __init__(self, token: str = None, request: BaseRequest = None):
+        """token defaults to $BOT_TOKEN; request replaces the HTTP layer (used by the load test)"""
+        self.logger = logger
+        self.db = async_db
+        self.router = CallbackRouter()  # Every inline button goes through here
         
         # Get bot token from environment
-        self.token = os.environ.get("BOT_TOKEN")
+        self.token = token or os.environ.get("BOT_TOKEN")
         if not self.token:
             raise ValueError("BOT_TOKEN environment variable not set!")
         
         # Create application
-        self.application = Application.builder().token(self.token).build()
+        builder = Application.builder()
+        if request is not None:
+            builder = builder.request(request).get_updates_request(request)
+        self.application = (
+            builder
+            .token(self.token)
+            # Battle turns are serialized per battle in CombatCore, so updates
+            # from different users can safely be handled in parallel
+            .concurrent_updates(True)
+            .post_init(self._post_init)
+            .post_stop(self._post_stop)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
         
         # Register handlers
-        self.setup_handlers()
+        with services.phase("handlers"):
+            self.setup_handlers()
         
-        print("✅ MafiaBot initialized successfully!")
+        self.logger.info("MafiaBot initialized")
     
     def setup_handlers(self):
         """Register all handlers"""
-        self.application.add_handler(CommandHandler("start", start_handler))
-        self.application.add_handler(CommandHandler("profile", profile_handler_query))
-        self.application.add_handler(CallbackQueryHandler(button_handler, pattern="^(create_char|my_profile|combat|gang_info|shop)$"))
+        # Runs before every other handler so new input cuts animations short
+        self.application.add_handler(TypeHandler(Update, metrics.instrument(fast_forward_animation, label="fast_forward")), group=-1)
+        for command, callback in (("start", start_handler), ("profile", profile_command), ("stats", stats_command),
+                                  ("profile_start", profile_start_command), ("profile_stop", profile_stop_command)):
+            self.application.add_handler(
+                CommandHandler(command, metrics.instrument(callback, label=f"command:{command}"))
+            )
         
-        # Add shop handlers if available
+        # Add shop routes if available; the shop itself loads on the first tap
         if SHOP_AVAILABLE:
-            try:
-                shop_handlers = get_shop_handlers()
-                for handler in shop_handlers:
-                    self.application.add_handler(handler)
-                print("✅ Shop handlers integrated")
-            except Exception as e:
-                print(f"❌ Shop handler integration failed: {e}")
+            for key, name, prefix, block in SHOP_ROUTES:
+                self.router.add_lazy(key, services.loader("shop", name), prefix=prefix, block=block)
+            self.logger.info("Shop routes registered (lazy)")
         
-        # Add combat system if available
+        # Add combat routes if available; the combat system loads on the first tap
         if COMBAT_AVAILABLE:
-            try:
-                integrate_combat_system(self.application)
-                print("✅ Combat system integrated")
-            except Exception as e:
-                print(f"❌ Combat system integration failed: {e}")
+            for key, method, prefix, block in COMBAT_ROUTES:
+                self.router.add_lazy(key, _combat_handler(method), prefix=prefix, block=block)
+            for key, method, prefix, block in BOT_BATTLE_ROUTES:
+                self.router.add_lazy(key, _combat_handler(method, "bot_battles"), prefix=prefix, block=block)
+            self.logger.info("Combat routes registered (lazy)")
+        
+        # Main menu buttons; combat and shop fall back to "coming soon" if their module didn't register
+        for key in ("create_char", "my_profile", "combat", "gang_info", "shop"):
+            if key not in self.router:
+                self.router.add(key, button_handler)
+        for key in ("class_enforcer", "class_hacker", "class_smuggler"):
+            self.router.add(key, class_selection_handler)
+        self.router.add("main_menu", main_menu_handler)
+        self.router.add("find_opponent", find_opponent_handler)
         
-        self.application.add_handler(CallbackQueryHandler(class_selection_handler, pattern="^(class_enforcer|class_hacker|class_smuggler)$"))
-        self.application.add_handler(CallbackQueryHandler(main_menu_handler, pattern="^main_menu$"))
-        self.application.add_handler(CallbackQueryHandler(profile_handler_query, pattern="^my_profile$"))
-        self.application.add_handler(CallbackQueryHandler(combat_menu, pattern="^find_opponent$"))
+        self.application.add_handler(self.router.handler())
+        self.logger.info("Callback routes registered", extra={'routes': len(self.router)})
     
+    async def _post_init(self, application: Application):
+        """Open the database and start background flushing once the event loop is running"""
+        services.get("database")
+        self.db.start()
+        metrics.gauge("outbound_queued", "Bot API calls waiting in the outbound queue", outbound.pending)
+        metrics.gauge("animations_running", "Animations currently playing", renderer.running)
+        metrics.gauge("player_cache_size", "Players held in the write-behind cache", lambda: len(self.db.cache))
+        await metrics_server.start()
+        services.mark_serving()
+        services.log_report(self.logger)
+
+    async def _post_stop(self, application: Application):
+        """Finish animations and deliver queued messages while the bot can still send them"""
+        await renderer.stop()
+        await outbound.stop()
+        await metrics_server.stop()
+        if profiler.running:
+            await asyncio.to_thread(profiler.stop)
+
+    async def _post_shutdown(self, application: Application):
+        """Stop background services, flush queued writes and release database threads"""
+        if services.loaded("combat"):
+            await services.get("combat").shutdown()
+        await self.db.stop()
+        self.db.close()
+
     def run(self):
         """Start the bot"""
-        print("🚀 Starting Mafia Wars Bot...")
+        self.logger.info("Starting Mafia Wars Bot")
         self.application.run_polling()
 
+def _combat_handler(method: str, owner: str = "handlers"):
+    """Loader for a method of the combat system's handlers (or bot_battles), importing it if needed"""
+    def load():
+        return getattr(getattr(services.get("combat"), owner), method)
+    load.__qualname__ = f"combat.{method}" if owner == "handlers" else f"combat.{owner}.{method}"
+    return load
+
 # Handler functions (keep all your existing functions below)
+async def fast_forward_animation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Skip the chat's running animation to its final frame on any new input"""
+    if update.effective_chat:
+        renderer.fast_forward(update.effective_chat.id)
+
 
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     # Check if player already exists
-    existing_player = db.get_player(user.id)
+    existing_player = await db.get_player(user.id)
     
     # Create main menu keyboard
-    keyboard = [
-        [InlineKeyboardButton("🎮 Create Character", callback_data="create_char")],
-        [InlineKeyboardButton("📊 My Profile", callback_data="my_profile")],
-        [InlineKeyboardButton("⚔️ Fight", callback_data="combat")],
-        [InlineKeyboardButton("👥 Gang Info", callback_data="gang_info")],
-        [InlineKeyboardButton("🏪 Shop", callback_data="shop")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.MAIN_MENU
     
     if existing_player:
         welcome_text = f"""
@@ -110,7 +173,8 @@ Your criminal empire awaits...
 **Choose your action:**
         """
     
-    await update.message.reply_text(
+    await outbound.reply_text(
+        update.message,
         welcome_text,
         parse_mode='Markdown',
         reply_markup=reply_markup
@@ -128,52 +192,19 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == "my_profile":
         await profile_handler_query(query)
     elif data == "combat":
-        if COMBAT_AVAILABLE:
-            from handlers.combat_handlers import combat_handlers
-            await combat_handlers.combat_menu(update, context)
-        else:
-            await query.edit_message_text("⚔️ **Combat System**\n\nCombat features coming soon! 🔥", parse_mode='Markdown')
+        # Only routed here when the combat module didn't register its own menu
+        await outbound.edit_message_text(query, keyboards.COMBAT_UNAVAILABLE_TEXT, parse_mode='Markdown')
     elif data == "gang_info":
-        await query.edit_message_text("👥 **Gang System**\n\nForm alliances with other players!\n\n*Coming soon in next update!*", parse_mode='Markdown')
+        await outbound.edit_message_text(query, keyboards.GANG_INFO_TEXT, parse_mode='Markdown')
     elif data == "shop":
-        if SHOP_AVAILABLE:
-            from shop.shop_handlers import shop_main_menu
-            await shop_main_menu(update, context)
-        else:
-            await query.edit_message_text("🏪 **Black Market**\n\nShop features coming soon! 🛍️", parse_mode='Markdown')
+        # Only routed here when the shop module didn't register its own menu
+        await outbound.edit_message_text(query, keyboards.SHOP_UNAVAILABLE_TEXT, parse_mode='Markdown')
 
 async def create_character_menu(query):
     """Show character creation with buttons"""
-    keyboard = [
-        [InlineKeyboardButton("🎯 Enforcer - Combat Specialist", callback_data="class_enforcer")],
-        [InlineKeyboardButton("💻 Hacker - Tech Master", callback_data="class_hacker")],
-        [InlineKeyboardButton("🚗 Smuggler - Stealth Expert", callback_data="class_smuggler")],
-        [InlineKeyboardButton("🔙 Back to Main Menu", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.CLASS_SELECTION
     
-    text = """
-🎭 **Character Creation**
-
-Choose your criminal specialty:
-
-**🎯 Enforcer**
-• Extra health and damage
-• Perfect for direct combat
-• Strong and intimidating
-
-**💻 Hacker**  
-• Better income from operations
-• Stealth and intelligence
-• Tech and cyber skills
-
-**🚗 Smuggler**
-• More energy for actions
-• Better escape chances
-• Logistics and transport
-    """
-    
-    await query.edit_message_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+    await outbound.edit_message_text(query, keyboards.CREATE_CHARACTER_TEXT, parse_mode='Markdown', reply_markup=reply_markup)
 
 async def class_selection_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -192,9 +223,10 @@ async def class_selection_handler(update: Update, context: ContextTypes.DEFAULT_
         class_name, display_name = class_map[data]
         
         # Check if player already exists
-        existing_player = db.get_player(user.id)
+        existing_player = await db.get_player(user.id)
         if existing_player:
-            await query.edit_message_text(
+            await outbound.edit_message_text(
+                query,
                 f"⚠️ You already have a character!\n\n"
                 f"**{existing_player.first_name}** ({existing_player.character_class.title()})\n\n"
                 f"Use /reset to create a new character (loses all progress).",
@@ -211,17 +243,13 @@ async def class_selection_handler(update: Update, context: ContextTypes.DEFAULT_
         )
         
         # Save to database
-        db.save_player(new_player)
+        await db.save_player(new_player)
         
         # Success message with menu
-        keyboard = [
-            [InlineKeyboardButton("📊 View Profile", callback_data="my_profile")],
-            [InlineKeyboardButton("⚔️ Start Fighting", callback_data="combat")],
-            [InlineKeyboardButton("🎮 Main Menu", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.CHARACTER_CREATED
         
-        await query.edit_message_text(
+        await outbound.edit_message_text(
+            query,
             f"🎉 **Character Created!**\n\n"
             f"Welcome, **{new_player.first_name}** the **{display_name}**!\n\n"
             f"{new_player.get_stats()}\n\n"
@@ -230,53 +258,40 @@ async def class_selection_handler(update: Update, context: ContextTypes.DEFAULT_
             reply_markup=reply_markup
         )
 
-async def profile_handler_query(query):
-    """Show profile with inline keyboard"""
-    user = query.from_user
-    player = db.get_player(user.id)
+async def _profile_screen(user_id: int):
+    """Profile text and keyboard for a user"""
+    player = await db.get_player(user_id)
     
     if player:
-        keyboard = [
-            [InlineKeyboardButton("⚔️ Fight", callback_data="combat")],
-            [InlineKeyboardButton("🏪 Shop", callback_data="shop")],
-            [InlineKeyboardButton("🎮 Main Menu", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            f"📊 **Criminal Profile**\n\n"
-            f"{player.get_stats()}\n\n"
-            f"**Available Actions:**",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-    else:
-        keyboard = [[InlineKeyboardButton("🎮 Create Character", callback_data="create_char")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            "❌ You don't have a character yet!\n\nCreate your character to start your criminal journey.",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
+        text = f"📊 **Criminal Profile**\n\n" \
+               f"{player.get_stats()}\n\n" \
+               f"**Available Actions:**"
+        return text, keyboards.PROFILE
+    return keyboards.NO_CHARACTER_TEXT, keyboards.NO_CHARACTER
+
+async def profile_handler_query(query):
+    """Show profile with inline keyboard"""
+    text, reply_markup = await _profile_screen(query.from_user.id)
+    await outbound.edit_message_text(query, text, parse_mode='Markdown', reply_markup=reply_markup)
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile"""
+    text, reply_markup = await _profile_screen(update.effective_user.id)
+    await outbound.reply_text(update.message, text, parse_mode='Markdown', reply_markup=reply_markup)
 
 async def combat_menu(query):
     """Show combat menu"""
     user = query.from_user
-    player = db.get_player(user.id)
+    player = await db.get_player(user.id)
     
     if not player:
-        await query.edit_message_text("❌ Create a character first!", parse_mode='Markdown')
+        await outbound.edit_message_text(query, "❌ Create a character first!", parse_mode='Markdown')
         return
     
-    keyboard = [
-        [InlineKeyboardButton("🎯 Find Opponent", callback_data="find_opponent")],
-        [InlineKeyboardButton("📊 My Stats", callback_data="my_profile")],
-        [InlineKeyboardButton("🔙 Main Menu", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.FALLBACK_COMBAT_MENU
     
-    await query.edit_message_text(
+    await outbound.edit_message_text(
+        query,
         f"⚔️ **Combat Arena**\n\n"
         f"Ready for some action, {player.first_name}?\n\n"
         f"**Your Combat Stats:**\n"
@@ -288,28 +303,93 @@ async def combat_menu(query):
         reply_markup=reply_markup
     )
 
+async def find_opponent_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Fallback combat menu's "Find Opponent" button"""
+    query = update.callback_query
+    await query.answer()
+    await combat_menu(query)
+
+def _stats_text() -> str:
+    """Latency and call counts per handler, database call and outbound lane"""
+    lines = ["📈 Stats (p50 / p99 / max ms, calls, errors, in flight)"]
+    for family in metrics.families():
+        rows = [row for row in metrics.summary(family, limit=8) if row['calls'] or row['in_flight']]
+        if not rows:
+            continue
+        lines.append(f"\n{family}")
+        for row in rows:
+            lines.append(
+                f"{row['label'][:28]:<28} {row['p50_ms']:7.1f} {row['p99_ms']:7.1f} {row['max_ms']:7.1f} "
+                f"{row['calls']:>6} {row['errors']:>3} {row['in_flight']:>3}"
+            )
+    lines.append(f"\noutbound: {outbound.stats()}")
+    lines.append(f"animations: {renderer.stats()}")
+    return "```\n" + "\n".join(lines) + "\n```"
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stats - admins only (ADMIN_IDS)"""
+    if update.effective_user.id not in admin_ids():
+        return
+    await outbound.reply_text(update.message, _stats_text(), parse_mode='Markdown')
+
+async def profile_start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile_start [seconds] - sample the bot's stacks, admins only"""
+    if update.effective_user.id not in admin_ids():
+        return
+    if profiler.running:
+        await outbound.reply_text(update.message, "⚠️ Profiler already running, /profile_stop to finish it.")
+        return
+    try:
+        seconds = min(MAX_DURATION, max(1, int(context.args[0]))) if context.args else 30
+    except ValueError:
+        await outbound.reply_text(update.message, "Usage: /profile_start [seconds]")
+        return
+
+    profiler.start()
+    session = profiler.started_at
+    await outbound.reply_text(update.message, f"🔬 Profiling for {seconds}s...")
+    context.application.create_task(_finish_profile(update, seconds, session), update=update)
+
+async def _finish_profile(update: Update, seconds: int, session: float):
+    await asyncio.sleep(seconds)
+    if profiler.running and profiler.started_at == session:
+        await _send_profile(update)
+
+async def profile_stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile_stop - end a profiling run early, admins only"""
+    if update.effective_user.id not in admin_ids():
+        return
+    if not profiler.running:
+        await outbound.reply_text(update.message, "Profiler is not running.")
+        return
+    await _send_profile(update)
+
+async def _send_profile(update: Update):
+    """Stop the profiler and reply with the collapsed-stack file and top hotspots"""
+    path = await asyncio.to_thread(profiler.stop)
+    hotspots = "\n".join(f"{count:>6}  {frame}" for frame, count in profiler.hotspots(8))
+    caption = f"🔬 {profiler.samples} samples, {len(profiler.stacks)} stacks\n{path}"
+    await outbound.reply_text(update.message, f"{caption}\n\nSelf time (samples):\n{hotspots}")
+    await outbound.send(
+        update.message.chat_id,
+        lambda: update.message.reply_document(document=Path(path), filename=Path(path).name)
+    )
+
 async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     user = query.from_user
-    existing_player = db.get_player(user.id)
+    existing_player = await db.get_player(user.id)
     
-    keyboard = [
-        [InlineKeyboardButton("🎮 Create Character", callback_data="create_char")],
-        [InlineKeyboardButton("📊 My Profile", callback_data="my_profile")],
-        [InlineKeyboardButton("⚔️ Fight", callback_data="combat")],
-        [InlineKeyboardButton("👥 Gang Info", callback_data="gang_info")],
-        [InlineKeyboardButton("🏪 Shop", callback_data="shop")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.MAIN_MENU
     
     if existing_player:
         text = f"👋 **Welcome back, {user.first_name}!**\n\nWhat would you like to do?"
     else:
         text = f"👋 **Welcome to Mafia Wars!**\n\nStart your criminal journey!"
     
-    await query.edit_message_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+    await outbound.edit_message_text(query, text, parse_mode='Markdown', reply_markup=reply_markup)
 
 # Keep the old register_handlers function for compatibility
 def register_handlers(application):
@@ -1,83 +1,322 @@
 import sqlite3
-import json
-from models.player import Player
+import functools
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List
+from models.player import Player, COUNTER_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Column order shared by every player query
+PLAYER_COLUMNS = (
+    'user_id', 'username', 'first_name', 'character_class', 'level',
+    'cash', 'health', 'energy', 'reputation', 'created_at', 'last_regen_at'
+)
+
+# SQL is kept constant so sqlite3's per-connection statement cache reuses
+# the prepared statements instead of re-parsing them on every call
+INSERT_PLAYER_SQL = f'''
+    INSERT INTO players
+    ({", ".join(PLAYER_COLUMNS)})
+    VALUES ({", ".join("?" * len(PLAYER_COLUMNS))})
+    ON CONFLICT(user_id) DO UPDATE SET
+    {", ".join(f"{col} = excluded.{col}" for col in PLAYER_COLUMNS[1:])}
+'''
+SELECT_PLAYERS_SQL = f'SELECT {", ".join(PLAYER_COLUMNS)} FROM players'
+GET_PLAYER_SQL = f'{SELECT_PLAYERS_SQL} WHERE user_id = ?'
+ITER_PLAYERS_FIRST_SQL = f'{SELECT_PLAYERS_SQL} ORDER BY user_id LIMIT ?'
+ITER_PLAYERS_NEXT_SQL = f'{SELECT_PLAYERS_SQL} WHERE user_id > ? ORDER BY user_id LIMIT ?'
+
+# Stay well below SQLite's bound-parameter limit in IN (...) lists
+MAX_QUERY_PARAMS = 900
+
+@functools.lru_cache(maxsize=256)
+def _update_player_sql(columns: tuple, counters: tuple) -> str:
+    """Build (once per column combination) a minimal UPDATE statement"""
+    assignments = [f"{col} = {col} + ?" for col in counters]
+    assignments += [f"{col} = ?" for col in columns]
+    return f"UPDATE players SET {', '.join(assignments)} WHERE user_id = ?"
+
+# Tuned for many small reads/writes from a single process
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-8000',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA foreign_keys=ON',
+)
 
 class Database:
-    def __init__(self, db_path="mafia_bot.db"):
+    def __init__(self, db_path=None, pool_size=4):
+        db_path = db_path or os.environ.get("DB_PATH", "mafia_bot.db")
         self.db_path = db_path
+        # Every ":memory:" connection is a separate database, so share one
+        self.pool_size = 1 if db_path == ":memory:" else max(1, pool_size)
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        self._pool_lock = threading.Lock()
+        self._connections = []
+        self._local = threading.local()
+        # Write transactions committed and player rows they wrote
+        self.write_transactions = 0
+        self.players_written = 0
         self._init_database()
-    
+
+    def _connect(self):
+        """Open a new pooled connection with tuned pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            isolation_level=None,  # Transactions are managed explicitly
+            cached_statements=128
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        """Take a connection from the pool, opening one if below pool_size"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if len(self._connections) < self.pool_size:
+                conn = self._connect()
+                self._connections.append(conn)
+                return conn
+
+        return self._pool.get()
+
+    def _release(self, conn):
+        self._pool.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection (reuses the open transaction, if any)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Run several statements atomically on one connection
+
+        Nested calls join the outer transaction.
+        """
+        if getattr(self._local, 'conn', None) is not None:
+            yield self._local.conn
+            return
+
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self._local.conn = conn
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            else:
+                conn.execute('COMMIT')
+            finally:
+                self._local.conn = None
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._pool_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self._pool = queue.LifoQueue(maxsize=self.pool_size)
+
     def _init_database(self):
         """Initialize database tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Players table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS players (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                character_class TEXT,
-                level INTEGER DEFAULT 1,
-                cash INTEGER DEFAULT 1000,
-                health INTEGER DEFAULT 100,
-                energy INTEGER DEFAULT 50,
-                reputation INTEGER DEFAULT 0,
-                created_at TEXT
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print("✅ Database initialized successfully!")
-    
+        with self.transaction() as conn:
+            # Players table
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS players (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    first_name TEXT,
+                    character_class TEXT,
+                    level INTEGER DEFAULT 1,
+                    cash INTEGER DEFAULT 1000,
+                    health INTEGER DEFAULT 100,
+                    energy INTEGER DEFAULT 50,
+                    reputation INTEGER DEFAULT 0,
+                    created_at TEXT,
+                    last_regen_at TEXT
+                )
+            ''')
+
+            # Databases created before lazy regeneration lack last_regen_at
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(players)')}
+            if 'last_regen_at' not in columns:
+                conn.execute('ALTER TABLE players ADD COLUMN last_regen_at TEXT')
+
+        logger.info("Database initialized", extra={'event': 'db_init', 'path': self.db_path})
+
+    def _update_statement(self, player: Player, changes: Dict):
+        """Minimal UPDATE (sql, params) for an already stored player"""
+        counters = tuple(
+            col for col in COUNTER_FIELDS
+            if col in changes and player.get_saved_value(col) is not None
+        )
+        columns = tuple(col for col in changes if col not in counters)
+        params = [changes[col] - player.get_saved_value(col) for col in counters]
+        params += [changes[col] for col in columns]
+        params.append(player.user_id)
+        return _update_player_sql(columns, counters), tuple(params)
+
+    @staticmethod
+    def _row_values(player: Player) -> tuple:
+        data = player.to_dict()
+        return tuple(data[col] for col in PLAYER_COLUMNS)
+
+    @staticmethod
+    def _player_from_row(row) -> Player:
+        player = Player.from_dict(dict(zip(PLAYER_COLUMNS, row)))
+        player.mark_saved()
+        # Regenerated stats are only written back once the player acts
+        player.apply_regen()
+        return player
+
     def save_player(self, player: Player):
-        """Save or update player data"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO players 
-            (user_id, username, first_name, character_class, level, cash, health, energy, reputation, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            player.user_id, player.username, player.first_name,
-            player.character_class, player.level, player.cash,
-            player.health, player.energy, player.reputation, player.created_at
-        ))
-        
-        conn.commit()
-        conn.close()
-        print(f"✅ Player {player.first_name} saved to database!")
-    
+        """Save or update player data
+
+        New players are inserted; existing ones only get the columns that
+        changed since they were loaded, with counters applied as increments.
+        """
+        changes = player.get_changes()
+        if not changes:
+            return
+
+        with self.transaction() as conn:
+            if player.is_new():
+                conn.execute(INSERT_PLAYER_SQL, self._row_values(player))
+            else:
+                cursor = conn.execute(*self._update_statement(player, changes))
+                if cursor.rowcount == 0:
+                    # Row vanished since it was loaded, write it back whole
+                    conn.execute(INSERT_PLAYER_SQL, self._row_values(player))
+
+        player.mark_saved()
+        self.write_transactions += 1
+        self.players_written += 1
+        logger.info("Player saved", extra={'event': 'player_saved', 'user_id': player.user_id})
+
+    def save_players(self, players: Iterable[Player]) -> int:
+        """Save many players in one transaction with batched statements
+
+        Players sharing the same change set go through a single executemany.
+        Returns the number of players that needed a write.
+        """
+        inserts = []
+        updates = defaultdict(list)
+        changed = []
+        for player in players:
+            changes = player.get_changes()
+            if not changes:
+                continue
+            changed.append(player)
+            if player.is_new():
+                inserts.append(self._row_values(player))
+            else:
+                sql, params = self._update_statement(player, changes)
+                updates[sql].append((player, params))
+
+        if not changed:
+            return 0
+
+        with self.transaction() as conn:
+            if inserts:
+                conn.executemany(INSERT_PLAYER_SQL, inserts)
+            for sql, batch in updates.items():
+                cursor = conn.executemany(sql, [params for _, params in batch])
+                if cursor.rowcount < len(batch):
+                    # Some rows vanished since they were loaded, write them back whole
+                    existing = self._existing_ids(conn, [player.user_id for player, _ in batch])
+                    conn.executemany(INSERT_PLAYER_SQL, [
+                        self._row_values(player) for player, _ in batch
+                        if player.user_id not in existing
+                    ])
+
+        for player in changed:
+            player.mark_saved()
+        self.write_transactions += 1
+        self.players_written += len(changed)
+        logger.info("Players saved", extra={'event': 'players_saved', 'players': len(changed)})
+        return len(changed)
+
+    def _existing_ids(self, conn, user_ids: List[int]) -> set:
+        found = set()
+        for start in range(0, len(user_ids), MAX_QUERY_PARAMS):
+            chunk = user_ids[start:start + MAX_QUERY_PARAMS]
+            sql = f"SELECT user_id FROM players WHERE user_id IN ({', '.join('?' * len(chunk))})"
+            found.update(row[0] for row in conn.execute(sql, chunk))
+        return found
+
     def get_player(self, user_id: int) -> Player:
         """Get player data by user ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM players WHERE user_id = ?', (user_id,))
-        row = cursor.fetchone()
-        conn.close()
-        
+        with self.connection() as conn:
+            row = conn.execute(GET_PLAYER_SQL, (user_id,)).fetchone()
+
         if row:
-            # Convert row to dictionary
-            player_data = {
-                'user_id': row[0],
-                'username': row[1],
-                'first_name': row[2],
-                'character_class': row[3],
-                'level': row[4],
-                'cash': row[5],
-                'health': row[6],
-                'energy': row[7],
-                'reputation': row[8],
-                'created_at': row[9]
-            }
-            return Player.from_dict(player_data)
+            return self._player_from_row(row)
         return None
 
+    def get_players(self, user_ids: Iterable[int]) -> Dict[int, Player]:
+        """Get several players with one IN (...) query, keyed by user ID
+
+        Unknown IDs are simply missing from the result.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        players = {}
+        with self.connection() as conn:
+            for start in range(0, len(user_ids), MAX_QUERY_PARAMS):
+                chunk = user_ids[start:start + MAX_QUERY_PARAMS]
+                sql = f"{SELECT_PLAYERS_SQL} WHERE user_id IN ({', '.join('?' * len(chunk))})"
+                for row in conn.execute(sql, chunk):
+                    players[row[0]] = self._player_from_row(row)
+        return players
+
+    def iter_players(self, chunk_size: int = 500) -> Iterator[Player]:
+        """Stream every player, loading chunk_size rows at a time
+
+        Uses keyset pagination on user_id, so no cursor stays open between
+        chunks and callers may write to the table while iterating.
+        """
+        last_id = None
+        while True:
+            with self.connection() as conn:
+                if last_id is None:
+                    rows = conn.execute(ITER_PLAYERS_FIRST_SQL, (chunk_size,)).fetchall()
+                else:
+                    rows = conn.execute(ITER_PLAYERS_NEXT_SQL, (last_id, chunk_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._player_from_row(row)
+            last_id = rows[-1][0]
+
 # Test the database
 if __name__ == "__main__":
-    db = Database()
+    db = Database(":memory:")
+    db.save_players([Player(1, "test", "Test"), Player(2, "test2", "Test2")])
+    print(db.get_player(1))
+    print(list(db.get_players([1, 2, 3])))
+    print(sum(1 for _ in db.iter_players(chunk_size=1)))
+    db.close()
     print("✅ Database module working!")
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core.outbound import outbound, PRIORITY_ANIMATION, PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+class FrameRenderer:
+    """Plays animation frames by editing one message in place
+
+    Instead of a new reply per frame, every frame replaces the text of the
+    same message, at most once per min_interval seconds. Intermediate frames
+    are dropped when they would not change the message or when the chat's
+    send budget is already used up; the final frame (which carries the
+    keyboard) is always delivered. An intermediate frame that fails to send
+    is logged and skipped rather than ending the animation.
+
+    Handlers normally call spawn(), which plays the frames in a background
+    task tracked per chat and returns at once. New input in a chat
+    fast-forwards its running animation to the final frame.
+    """
+
+    def __init__(self, scheduler=outbound, min_interval: float = 1.2):
+        self.scheduler = scheduler
+        self.min_interval = min_interval
+        self._tasks: Dict[int, Tuple[asyncio.Task, asyncio.Event]] = {}
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.frames_failed = 0
+        self.fast_forwarded = 0
+
+    async def play(self, message, frames: List[str], reply_markup=None, parse_mode: str = 'Markdown',
+                   new_message: bool = False, min_interval: float = None,
+                   skip: Optional[asyncio.Event] = None):
+        """Show frames on message and return the message they ended up on
+
+        With new_message=True the first frame is sent as a reply to message
+        and the rest edit that reply; otherwise message itself is edited.
+        Once skip is set, the remaining frames are dropped except the last.
+        """
+        if not frames:
+            return message
+        min_interval = self.min_interval if min_interval is None else min_interval
+        chat_id = message.chat_id
+        last_index = len(frames) - 1
+        shown = None
+        last_render = 0.0
+        skip = skip or asyncio.Event()
+
+        for index, text in enumerate(frames):
+            is_final = index == last_index
+            if not is_final and skip.is_set():
+                self.frames_skipped += 1
+                continue
+            if shown is not None:
+                wait = last_render + min_interval - time.monotonic()
+                if wait > 0 and not skip.is_set():
+                    try:
+                        await asyncio.wait_for(skip.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                if not is_final and (skip.is_set() or text == shown or not self.scheduler.available(chat_id)):
+                    self.frames_skipped += 1
+                    continue
+
+            markup = reply_markup if is_final else None
+            priority = PRIORITY_INTERACTIVE if is_final else PRIORITY_ANIMATION
+            try:
+                if shown is None and new_message:
+                    message = await self.scheduler.send(
+                        chat_id,
+                        lambda target=message, text=text, markup=markup: target.reply_text(
+                            text, parse_mode=parse_mode, reply_markup=markup
+                        ),
+                        priority
+                    )
+                elif text != shown or markup is not None:
+                    await self.scheduler.send(
+                        chat_id,
+                        lambda target=message, text=text, markup=markup: target.edit_text(
+                            text, parse_mode=parse_mode, reply_markup=markup
+                        ),
+                        priority
+                    )
+            except Exception as e:
+                if is_final:
+                    raise
+                # The final frame still has to land, so carry on without this one
+                self.frames_failed += 1
+                logger.warning("Frame %d/%d in chat %s failed: %s", index + 1, len(frames), chat_id, e)
+                continue
+            shown = text
+            last_render = time.monotonic()
+            self.frames_rendered += 1
+        return message
+
+    def spawn(self, message, frames: List[str], **kwargs) -> asyncio.Task:
+        """Play frames in a background task and return immediately
+
+        An animation still running in the same chat is fast-forwarded to
+        its final frame first, and this one starts once it has landed.
+        Takes the same keyword arguments as play().
+        """
+        chat_id = message.chat_id
+        previous = None
+        if chat_id in self._tasks:
+            previous = self._tasks[chat_id][0]
+            self.fast_forward(chat_id)
+
+        skip = asyncio.Event()
+        task = asyncio.get_running_loop().create_task(
+            self._play_after(previous, message, frames, skip, kwargs)
+        )
+        self._tasks[chat_id] = (task, skip)
+        task.add_done_callback(lambda done, chat_id=chat_id: self._forget(chat_id, done))
+        return task
+
+    async def _play_after(self, previous, message, frames, skip, kwargs):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            return await self.play(message, frames, skip=skip, **kwargs)
+        except Exception:
+            logger.exception("Animation in chat %s failed", message.chat_id)
+
+    def _forget(self, chat_id, task: asyncio.Task):
+        entry = self._tasks.get(chat_id)
+        if entry is not None and entry[0] is task:
+            del self._tasks[chat_id]
+
+    def fast_forward(self, chat_id) -> bool:
+        """Make the chat's running animation jump to its final frame"""
+        entry = self._tasks.get(chat_id)
+        if entry is None or entry[1].is_set():
+            return False
+        entry[1].set()
+        self.fast_forwarded += 1
+        return True
+
+    def running(self, chat_id=None) -> int:
+        """Animations in progress for one chat, or for every chat if chat_id is None"""
+        if chat_id is None:
+            return len(self._tasks)
+        return int(chat_id in self._tasks)
+
+    async def stop(self, drain_timeout: float = 3.0):
+        """Land every running animation on its final frame, cancelling stragglers"""
+        tasks = [task for task, _ in self._tasks.values()]
+        for chat_id in list(self._tasks):
+            self.fast_forward(chat_id)
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            'running': len(self._tasks),
+            'frames_rendered': self.frames_rendered,
+            'frames_skipped': self.frames_skipped,
+            'frames_failed': self.frames_failed,
+            'fast_forwarded': self.fast_forwarded,
+        }
+
+# Global frame renderer
+renderer = FrameRenderer()
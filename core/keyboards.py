@@ -0,0 +1,148 @@
+"""
+KEYBOARD REGISTRY
+Inline keyboards and static screens, built once and shared
+
+PTB's InlineKeyboardMarkup is immutable once created, so the same object
+can be sent any number of times. Static menus are plain module constants;
+keyboards that depend on a value (a battle handle, a toggle) come from
+small lru_cached builders.
+"""
+
+from functools import lru_cache
+from typing import Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from core.callback_codec import BATTLE_ACTIONS, encode_battle_action
+
+def column(*buttons: Tuple[str, str]) -> InlineKeyboardMarkup:
+    """Keyboard with one (text, callback_data) button per row"""
+    return InlineKeyboardMarkup(
+        tuple((InlineKeyboardButton(text, callback_data=data),) for text, data in buttons)
+    )
+
+# Main menu and character creation (core/bot.py)
+MAIN_MENU = column(
+    ("🎮 Create Character", "create_char"),
+    ("📊 My Profile", "my_profile"),
+    ("⚔️ Fight", "combat"),
+    ("👥 Gang Info", "gang_info"),
+    ("🏪 Shop", "shop"),
+)
+CLASS_SELECTION = column(
+    ("🎯 Enforcer - Combat Specialist", "class_enforcer"),
+    ("💻 Hacker - Tech Master", "class_hacker"),
+    ("🚗 Smuggler - Stealth Expert", "class_smuggler"),
+    ("🔙 Back to Main Menu", "main_menu"),
+)
+CHARACTER_CREATED = column(
+    ("📊 View Profile", "my_profile"),
+    ("⚔️ Start Fighting", "combat"),
+    ("🎮 Main Menu", "main_menu"),
+)
+PROFILE = column(
+    ("⚔️ Fight", "combat"),
+    ("🏪 Shop", "shop"),
+    ("🎮 Main Menu", "main_menu"),
+)
+NO_CHARACTER = column(
+    ("🎮 Create Character", "create_char"),
+)
+FALLBACK_COMBAT_MENU = column(
+    ("🎯 Find Opponent", "find_opponent"),
+    ("📊 My Stats", "my_profile"),
+    ("🔙 Main Menu", "main_menu"),
+)
+
+# Combat (handlers/combat_handlers.py)
+COMBAT_MENU = column(
+    ("⚔️ 1v1 Quick Match", "combat_quick"),
+    ("🤖 Practice vs Bot", "combat_bot"),
+    ("🏆 Bot Challenge", "fight_bots"),
+    ("👥 Gang War (Coming Soon)", "combat_gang"),
+    ("📊 My Combat Stats", "combat_stats"),
+    ("🔙 Main Menu", "main_menu"),
+)
+BATTLE_VICTORY = column(
+    ("🛒 Spend Rewards", "shop"),
+    ("⚔️ Fight Again", "combat_quick"),
+    ("🎮 Main Menu", "main_menu"),
+)
+BATTLE_DEFEAT = column(
+    ("⚔️ Try Again", "combat_quick"),
+    ("🏥 Heal Up", "shop"),
+    ("🎮 Main Menu", "main_menu"),
+)
+
+_BATTLE_ACTION_LABELS = {
+    'attack': "💥 Attack",
+    'defend': "🛡️ Defend",
+    'special': "✨ Special",
+    'escape': "🏃 Escape",
+}
+
+@lru_cache(maxsize=4096)
+def battle_actions(handle: int, epoch: int) -> InlineKeyboardMarkup:
+    """Attack/Defend/Special/Escape buttons for one battle"""
+    return column(*(
+        (_BATTLE_ACTION_LABELS[action], encode_battle_action(action, handle, epoch))
+        for action in BATTLE_ACTIONS
+    ))
+
+# Arena and bot battles (handlers/combat_enhanced.py)
+ARENA_MENU = column(
+    ("🤖 Fight Bots", "fight_bots"),
+    ("👥 PvP Battle", "pvp_battle"),
+    ("🏆 Boss Fight", "boss_fight"),
+    ("🎯 Training", "training_mode"),
+    ("🔙 Main Menu", "main_menu"),
+)
+BOT_BATTLE_RESULTS = column(
+    ("⚔️ Fight Again", "fight_bots"),
+    ("📊 My Profile", "my_profile"),
+    ("🎮 Main Menu", "main_menu"),
+)
+
+@lru_cache(maxsize=2)
+def bot_difficulty(instant: bool) -> InlineKeyboardMarkup:
+    """Difficulty picker, showing the current instant-results setting"""
+    return column(
+        ("🥊 Easy - Street Thugs", "bot_easy"),
+        ("💪 Medium - Gang Members", "bot_medium"),
+        ("🔥 Hard - Police Officers", "bot_hard"),
+        (f"⚡ Instant Results: {'ON' if instant else 'OFF'}", "bot_instant_toggle"),
+        ("🔙 Back", "combat"),
+    )
+
+# Static screens
+CREATE_CHARACTER_TEXT = """
+🎭 **Character Creation**
+
+Choose your criminal specialty:
+
+**🎯 Enforcer**
+• Extra health and damage
+• Perfect for direct combat
+• Strong and intimidating
+
+**💻 Hacker**
+• Better income from operations
+• Stealth and intelligence
+• Tech and cyber skills
+
+**🚗 Smuggler**
+• More energy for actions
+• Better escape chances
+• Logistics and transport
+    """
+NO_CHARACTER_TEXT = "❌ You don't have a character yet!\n\nCreate your character to start your criminal journey."
+GANG_INFO_TEXT = "👥 **Gang System**\n\nForm alliances with other players!\n\n*Coming soon in next update!*"
+COMBAT_UNAVAILABLE_TEXT = "⚔️ **Combat System**\n\nCombat features coming soon! 🔥"
+SHOP_UNAVAILABLE_TEXT = "🏪 **Black Market**\n\nShop features coming soon! 🛍️"
+
+def cache_info() -> dict:
+    """Hit/miss counts of the parametrized keyboards"""
+    return {
+        'battle_actions': battle_actions.cache_info()._asdict(),
+        'bot_difficulty': bot_difficulty.cache_info()._asdict(),
+    }
@@ -0,0 +1,184 @@
+"""
+LOGGING
+Structured, non-blocking logging for the whole bot
+
+Handlers only put records on a queue (QueueHandler); a QueueListener
+thread formats them and writes to stderr, so a slow terminal or pipe
+never stalls the event loop.
+
+Configured from the environment:
+    LOG_FORMAT   logfmt (default) or json
+    LOG_LEVEL    root level, default INFO
+    LOG_LEVELS   per-logger levels, e.g. "core.database=DEBUG,telegram=WARNING"
+    LOG_SAMPLE   keep-rates for high-frequency events, e.g. "player_saved=0.01"
+
+Log high-frequency events with extra={'event': name, ...}; records whose
+event has a sample rate below 1 are kept with that probability. Any other
+extra fields become keys in the output.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Dict, Optional
+
+# Every LogRecord has these; anything else on a record came in through extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+DEFAULT_LEVELS = {
+    # httpx logs every Bot API request (including each getUpdates poll) at INFO
+    'httpx': logging.WARNING,
+    'httpcore': logging.WARNING,
+}
+DEFAULT_SAMPLE_RATES = {
+    'player_saved': 0.01,
+    'players_saved': 0.1,
+    'user_access': 0.1,
+}
+
+def _fields(record: logging.LogRecord) -> Dict:
+    fields = {
+        'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+        'level': record.levelname.lower(),
+        'logger': record.name,
+        'msg': record.getMessage(),
+    }
+    for key, value in vars(record).items():
+        if key not in _RECORD_FIELDS:
+            fields[key] = value
+    if record.exc_info and not record.exc_text:
+        record.exc_text = logging.Formatter().formatException(record.exc_info)
+    if record.exc_text:
+        fields['exc'] = record.exc_text
+    return fields
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(_fields(record), ensure_ascii=False, default=str)
+
+class LogfmtFormatter(logging.Formatter):
+    """key=value pairs, quoted where needed"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return " ".join(f"{key}={self._value(value)}" for key, value in _fields(record).items())
+
+    @staticmethod
+    def _value(value) -> str:
+        text = str(value)
+        if not text or any(char in text for char in ' ="\n\t'):
+            return json.dumps(text, ensure_ascii=False)
+        return text
+
+FORMATTERS = {'json': JsonFormatter, 'logfmt': LogfmtFormatter}
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records for events with a sample rate
+
+    Warnings and errors are never sampled away. Dropped records are
+    counted per event.
+    """
+
+    def __init__(self, rates: Dict[str, float], rng: Optional[random.Random] = None):
+        super().__init__()
+        self.rates = rates
+        self.rng = rng or random.Random()
+        self.dropped: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, 'event', None)
+        rate = self.rates.get(event, 1.0) if event is not None else 1.0
+        if rate >= 1.0 or record.levelno >= logging.WARNING or self.rng.random() < rate:
+            return True
+        self.dropped[event] = self.dropped.get(event, 0) + 1
+        return False
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Leave formatting (and the extra fields) to the listener thread;
+        # only resolve the message now, since args may be mutated later
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def _parse_pairs(text: str) -> Dict[str, str]:
+    """'a=1,b=2' -> {'a': '1', 'b': '2'}"""
+    pairs = {}
+    for part in text.split(','):
+        if '=' in part:
+            key, value = part.split('=', 1)
+            pairs[key.strip()] = value.strip()
+    return pairs
+
+_listener: Optional[logging.handlers.QueueListener] = None
+sampler: Optional[SamplingFilter] = None
+
+def configure_logging(fmt: str = None, level: str = None, levels: Dict[str, str] = None,
+                      sample_rates: Dict[str, float] = None, stream=None):
+    """Route all logging through a queue to a background writer thread
+
+    Arguments override the LOG_* environment variables. Safe to call again;
+    the previous listener is stopped first.
+    """
+    global _listener, sampler
+    stop_logging()
+
+    fmt = (fmt or os.environ.get('LOG_FORMAT', 'logfmt')).lower()
+    level = level or os.environ.get('LOG_LEVEL', 'INFO')
+    module_levels = dict(DEFAULT_LEVELS)
+    module_levels.update(levels if levels is not None else _parse_pairs(os.environ.get('LOG_LEVELS', '')))
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    if sample_rates is not None:
+        rates.update(sample_rates)
+    else:
+        rates.update({event: float(rate) for event, rate in _parse_pairs(os.environ.get('LOG_SAMPLE', '')).items()})
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(FORMATTERS.get(fmt, LogfmtFormatter)())
+
+    records = queue.SimpleQueue()
+    sampler = SamplingFilter(rates)
+    handler = _QueueHandler(records)
+    handler.addFilter(sampler)
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level.upper() if isinstance(module_level, str) else module_level)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    """Write out everything still queued and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(stop_logging)
+
+# Test the pipeline
+if __name__ == "__main__":
+    configure_logging(fmt='logfmt', sample_rates={'tick': 0.0, 'player_saved': 1.0})
+    log = logging.getLogger("demo")
+    log.info("Player saved", extra={'event': 'player_saved', 'user_id': 42, 'first_name': "Tony Soprano"})
+    for _ in range(1000):
+        log.info("tick", extra={'event': 'tick'})
+    log.info("Sampling", extra={'dropped': sampler.dropped})
+    configure_logging(fmt='json')
+    log.warning("Slow flush", extra={'event': 'flush', 'players': 3, 'ms': 812.5})
+    stop_logging()
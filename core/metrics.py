@@ -0,0 +1,281 @@
+"""
+METRICS
+Latency histograms, counters and in-flight gauges for handlers, database
+and outbound calls
+
+Histograms use HDR-style log-linear buckets: 16 sub-buckets per power of
+two, so any recorded value is known to within ~6% while a histogram
+covering microseconds to hours stays a few hundred sparse counters.
+Recording is a dict increment, cheap enough to leave on all the time.
+Everything is recorded from the event loop thread, so no locking is done.
+
+Exposed as Prometheus text on METRICS_PORT (127.0.0.1 by default,
+METRICS_PORT=0 turns it off) and summarized by the admin /stats command.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUB_BUCKET_BITS = 5
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_HALF = _SUB_BUCKETS // 2
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+NAMESPACE = "mafia"
+
+def _bucket_index(value: int) -> int:
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    if shift <= 0:
+        return value
+    return shift * _HALF + (value >> shift)
+
+def _bucket_upper(index: int) -> int:
+    """Largest value that lands in bucket index"""
+    if index < _SUB_BUCKETS:
+        return index
+    shift = index // _HALF - 1
+    return ((index - shift * _HALF + 1) << shift) - 1
+
+class Histogram:
+    """Log-linear histogram of non-negative integers (here: microseconds)"""
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value: int):
+        value = max(0, int(value))
+        index = _bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def percentile(self, quantile: float) -> int:
+        """Upper bound of the bucket holding the given quantile (0..1)"""
+        if not self.count:
+            return 0
+        rank = max(1, round(quantile * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(_bucket_upper(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+class Series:
+    """Calls, errors, in-flight count and latency for one labelled operation"""
+
+    __slots__ = ('calls', 'errors', 'in_flight', 'latency')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency = Histogram()
+
+class Metrics:
+    """Registry of Series grouped into families (handler, db, outbound, ...)"""
+
+    def __init__(self):
+        self._families: Dict[str, Dict[str, Series]] = {}
+        self._help: Dict[str, str] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self.started = time.time()
+
+    def family(self, name: str, help_text: str):
+        """Declare a family so it is exported even before its first call"""
+        self._families.setdefault(name, {})
+        self._help[name] = help_text
+
+    def series(self, family: str, label: str) -> Series:
+        series_map = self._families.setdefault(family, {})
+        series = series_map.get(label)
+        if series is None:
+            series = series_map[label] = Series()
+        return series
+
+    @contextmanager
+    def track(self, family: str, label: str):
+        """Count, time and gauge the wrapped block"""
+        series = self.series(family, label)
+        series.in_flight += 1
+        started = time.perf_counter()
+        try:
+            yield series
+        except BaseException:
+            series.errors += 1
+            raise
+        finally:
+            series.in_flight -= 1
+            series.calls += 1
+            series.latency.record((time.perf_counter() - started) * 1_000_000)
+
+    def observe(self, family: str, label: str, seconds: float):
+        """Record one already measured duration"""
+        series = self.series(family, label)
+        series.calls += 1
+        series.latency.record(seconds * 1_000_000)
+
+    def instrument(self, callback, family: str = "handler", label: str = None):
+        """Wrap an async callback so every call is tracked"""
+        label = label or getattr(callback, '__qualname__', repr(callback))
+
+        async def tracked(*args, **kwargs):
+            with self.track(family, label):
+                return await callback(*args, **kwargs)
+
+        tracked.__qualname__ = getattr(callback, '__qualname__', label)
+        tracked.__wrapped__ = callback
+        return tracked
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]):
+        """Export read() as a gauge, sampled at scrape time"""
+        self._gauges[name] = (help_text, read)
+
+    def summary(self, family: str, limit: int = 10) -> List[Dict]:
+        """Busiest series of a family with their latency percentiles in ms"""
+        rows = []
+        for label, series in self._families.get(family, {}).items():
+            latency = series.latency
+            rows.append({
+                'label': label,
+                'calls': series.calls,
+                'errors': series.errors,
+                'in_flight': series.in_flight,
+                'p50_ms': latency.percentile(0.5) / 1000,
+                'p99_ms': latency.percentile(0.99) / 1000,
+                'max_ms': latency.max / 1000,
+            })
+        rows.sort(key=lambda row: row['calls'], reverse=True)
+        return rows[:limit]
+
+    def families(self) -> List[str]:
+        return list(self._families)
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for family, series_map in self._families.items():
+            base = f"{NAMESPACE}_{family}"
+            help_text = self._help.get(family, f"{family} operations")
+            lines.append(f"# HELP {base}_latency_seconds {help_text}: latency")
+            lines.append(f"# TYPE {base}_latency_seconds summary")
+            for label, series in series_map.items():
+                tag = f'{family}="{_escape(label)}"'
+                latency = series.latency
+                for quantile in QUANTILES:
+                    seconds = latency.percentile(quantile) / 1_000_000
+                    lines.append(f'{base}_latency_seconds{{{tag},quantile="{quantile}"}} {seconds:.6f}')
+                lines.append(f"{base}_latency_seconds_sum{{{tag}}} {latency.total / 1_000_000:.6f}")
+                lines.append(f"{base}_latency_seconds_count{{{tag}}} {latency.count}")
+            for suffix, kind, attribute in (("calls_total", "counter", 'calls'),
+                                            ("errors_total", "counter", 'errors'),
+                                            ("in_flight", "gauge", 'in_flight')):
+                lines.append(f"# HELP {base}_{suffix} {help_text}: {attribute.replace('_', ' ')}")
+                lines.append(f"# TYPE {base}_{suffix} {kind}")
+                for label, series in series_map.items():
+                    lines.append(f'{base}_{suffix}{{{family}="{_escape(label)}"}} {getattr(series, attribute)}')
+        for name, (help_text, read) in self._gauges.items():
+            try:
+                value = float(read())
+            except Exception:
+                logger.exception("Gauge %s failed", name)
+                continue
+            lines.append(f"# HELP {NAMESPACE}_{name} {help_text}")
+            lines.append(f"# TYPE {NAMESPACE}_{name} gauge")
+            lines.append(f"{NAMESPACE}_{name} {value:g}")
+        lines.append(f"# HELP {NAMESPACE}_uptime_seconds Seconds since the bot started")
+        lines.append(f"# TYPE {NAMESPACE}_uptime_seconds gauge")
+        lines.append(f"{NAMESPACE}_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+def _escape(label: str) -> str:
+    return label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsServer:
+    """Minimal HTTP server answering every GET with the Prometheus text"""
+
+    def __init__(self, registry: Metrics, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if self._server is None and self.port:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            logger.info("Metrics endpoint listening", extra={'host': self.host, 'port': self.port})
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+            if request.startswith(b"GET "):
+                status, body = "200 OK", self.registry.render_prometheus().encode()
+            else:
+                status, body = "405 Method Not Allowed", b""
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+def admin_ids() -> frozenset:
+    """Telegram user ids allowed to use admin commands (ADMIN_IDS=1,2,3)"""
+    return frozenset(int(part) for part in os.environ.get("ADMIN_IDS", "").split(",") if part.strip())
+
+# Global metrics registry and its endpoint
+metrics = Metrics()
+metrics.family("handler", "Telegram update handlers")
+metrics.family("db", "Database calls")
+metrics.family("outbound", "Bot API calls")
+metrics.family("outbound_queue", "Time Bot API calls waited in the outbound queue")
+metrics_server = MetricsServer(
+    metrics,
+    host=os.environ.get("METRICS_HOST", "127.0.0.1"),
+    port=int(os.environ.get("METRICS_PORT", "9108")),
+)
+
+# Test the histogram
+if __name__ == "__main__":
+    import random
+    histogram = Histogram()
+    values = [random.expovariate(1 / 5000) for _ in range(100_000)]
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for quantile in QUANTILES:
+        exact = values[int(quantile * len(values)) - 1]
+        estimate = histogram.percentile(quantile)
+        assert abs(estimate - exact) <= exact * 0.07 + 1, (quantile, estimate, exact)
+    print(f"✅ Histogram working! {len(histogram.counts)} buckets, "
+          f"p50={histogram.percentile(0.5)}us p99={histogram.percentile(0.99)}us")
@@ -0,0 +1,304 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+from telegram.error import RetryAfter
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, lower is sent first
+PRIORITY_INTERACTIVE = 0  # Direct replies to what the user just pressed
+PRIORITY_ANIMATION = 1    # Battle frames and other eye candy
+PRIORITY_BROADCAST = 2    # Announcements to many chats
+LANE_NAMES = ('interactive', 'animation', 'broadcast')
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_idle(self, now: float) -> bool:
+        """Full and not blocked, so it can be dropped and recreated later"""
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+    def block(self, seconds: float, now: float):
+        """Stop handing out tokens for a while (after a RetryAfter)"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+        # Refill only from the end of the pause, not during it
+        self.updated = self.blocked_until
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'chat_id', 'make_call', 'future', 'queued_at')
+
+    def __init__(self, priority, seq, chat_id, make_call, future):
+        self.queued_at = time.perf_counter()
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.make_call = make_call
+        self.future = future
+
+    def __lt__(self, other: '_Job') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class OutboundScheduler:
+    """Central queue for Bot API calls with Telegram's rate limits built in
+
+    Every call passes a global token bucket (about 30 messages per second)
+    and a per-chat bucket (about one per second with a small burst). Calls
+    for the same chat go out one at a time, best priority lane first and in
+    the order they were queued within a lane; across chats the one whose next
+    call has the best lane goes first. Either way interactive replies
+    overtake animation frames and broadcasts. A
+    RetryAfter from Telegram pauses the affected chat (or everything, if it
+    had no chat) and the call is retried.
+    """
+
+    def __init__(self, global_rate: float = 30.0, per_chat_rate: float = 1.0,
+                 per_chat_burst: float = 3.0, max_concurrency: int = 32):
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.max_concurrency = max_concurrency
+        self._chat_buckets: Dict[Optional[int], TokenBucket] = {}
+        # Per-chat heap of jobs ordered by (priority, seq)
+        self._chat_queues: Dict[Optional[int], List[_Job]] = {}
+        # One ordered set of chat ids per lane, keyed by the chat's next call
+        self._lanes = [OrderedDict() for _ in range(PRIORITY_BROADCAST + 1)]
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._worker = None
+        self._in_flight = set()
+        self._busy_chats = set()  # At most one call per chat in flight keeps order
+        self.sent_total = 0
+        self.retry_after_total = 0
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    def available(self, chat_id) -> bool:
+        """True if a call for this chat would go out right away"""
+        now = time.monotonic()
+        if self._chat_queues.get(chat_id):
+            return False
+        bucket = self._chat_buckets.get(chat_id)
+        chat_ready = bucket is None or bucket.wait_time(now) == 0
+        return chat_ready and self.global_bucket.wait_time(now) == 0
+
+    def pending(self, chat_id=None) -> int:
+        """Queued calls for one chat, or for every chat if chat_id is None"""
+        if chat_id is None:
+            return sum(len(queue) for queue in self._chat_queues.values())
+        return len(self._chat_queues.get(chat_id, ()))
+
+    def send(self, chat_id, make_call: Callable[[], Awaitable],
+             priority: int = PRIORITY_INTERACTIVE) -> asyncio.Future:
+        """Queue a Bot API call and return a future for its result
+
+        make_call must create a fresh awaitable each time it is invoked,
+        since a call may be retried. Await the future to wait for delivery,
+        or ignore it to fire and forget (failures are logged either way).
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        job = _Job(priority, next(self._seq), chat_id, make_call, future)
+
+        self._push(job)
+        self._wakeup.set()
+        return future
+
+    def reply_text(self, message, text: str, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> asyncio.Future:
+        """Queue message.reply_text(text, **kwargs)"""
+        return self.send(message.chat_id, lambda: message.reply_text(text, **kwargs), priority)
+
+    def edit_message_text(self, query, text: str, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> asyncio.Future:
+        """Queue query.edit_message_text(text, **kwargs)"""
+        chat_id = query.message.chat_id if query.message else None
+        return self.send(chat_id, lambda: query.edit_message_text(text, **kwargs), priority)
+
+    def _push(self, job: _Job):
+        """Add a job to its chat queue, re-filing the chat if it is the new head"""
+        queue = self._chat_queues.get(job.chat_id)
+        if queue is None:
+            queue = self._chat_queues[job.chat_id] = []
+        head = queue[0] if queue else None
+        heapq.heappush(queue, job)
+        if queue[0] is not head:
+            if head is not None:
+                self._lanes[head.priority].pop(job.chat_id, None)
+            self._lanes[job.priority][job.chat_id] = None
+
+    def _advance(self, chat_id):
+        """Re-file a chat under the lane of its next queued call"""
+        queue = self._chat_queues[chat_id]
+        if queue:
+            self._lanes[queue[0].priority][chat_id] = None
+        else:
+            del self._chat_queues[chat_id]
+
+    def _next_job(self, now: float):
+        """Pop the best ready job, or return the seconds until one may be ready"""
+        global_wait = self.global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        soonest = None
+        for lane in self._lanes:
+            for chat_id in lane:
+                if chat_id in self._busy_chats:
+                    continue
+                wait = self._chat_bucket(chat_id).wait_time(now)
+                if wait == 0:
+                    del lane[chat_id]
+                    job = heapq.heappop(self._chat_queues[chat_id])
+                    self.global_bucket.take(now)
+                    self._chat_buckets[chat_id].take(now)
+                    self._advance(chat_id)
+                    self._busy_chats.add(chat_id)
+                    return job, 0
+                soonest = wait if soonest is None else min(soonest, wait)
+        return None, soonest
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if len(self._in_flight) >= self.max_concurrency:
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            now = time.monotonic()
+            job, wait = self._next_job(now)
+            if job is not None:
+                task = asyncio.get_running_loop().create_task(self._execute(job))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+                continue
+
+            self._prune_buckets(now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job: _Job):
+        try:
+            await self._call(job)
+        finally:
+            self._busy_chats.discard(job.chat_id)
+            self._wakeup.set()
+
+    async def _call(self, job: _Job):
+        lane = LANE_NAMES[job.priority]
+        metrics.observe("outbound_queue", lane, time.perf_counter() - job.queued_at)
+        try:
+            with metrics.track("outbound", lane):
+                result = await job.make_call()
+        except RetryAfter as e:
+            retry_after = float(getattr(e.retry_after, 'total_seconds', lambda: e.retry_after)())
+            self.retry_after_total += 1
+            now = time.monotonic()
+            bucket = self.global_bucket if job.chat_id is None else self._chat_bucket(job.chat_id)
+            bucket.block(retry_after, now)
+            logger.warning("RetryAfter %.1fs for chat %s, requeueing", retry_after, job.chat_id)
+            self._requeue(job)
+            return
+        except Exception as e:
+            if not job.future.done():
+                logger.warning("Outbound call for chat %s failed: %s", job.chat_id, e)
+                job.future.set_exception(e)
+            return
+
+        self.sent_total += 1
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def _requeue(self, job: _Job):
+        """Put a job back in its chat queue; its seq keeps it ahead of later calls in its lane"""
+        self._push(job)
+        self._wakeup.set()
+
+    def _prune_buckets(self, now: float):
+        """Forget full buckets of chats with nothing queued"""
+        if len(self._chat_buckets) < 1000:
+            return
+        for chat_id in list(self._chat_buckets):
+            if chat_id not in self._chat_queues and self._chat_buckets[chat_id].is_idle(now):
+                del self._chat_buckets[chat_id]
+
+    def start(self):
+        """Start the dispatch task on the running event loop (idempotent)"""
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Give queued calls up to drain_timeout seconds, then cancel the rest"""
+        if self._worker is None:
+            return
+        deadline = time.monotonic() + drain_timeout
+        while (self._chat_queues or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        self._worker.cancel()
+        for task in list(self._in_flight):
+            task.cancel()
+        await asyncio.gather(self._worker, *self._in_flight, return_exceptions=True)
+        self._worker = None
+
+        for queue in self._chat_queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._chat_queues.clear()
+        for lane in self._lanes:
+            lane.clear()
+
+    def stats(self) -> Dict:
+        return {
+            'queued': self.pending(),
+            'in_flight': len(self._in_flight),
+            'chats_tracked': len(self._chat_buckets),
+            'sent_total': self.sent_total,
+            'retry_after_total': self.retry_after_total,
+        }
+
+def _consume_exception(future: asyncio.Future):
+    # Failures are already logged; mark them retrieved for fire-and-forget callers
+    if not future.cancelled():
+        future.exception()
+
+# Global outbound scheduler
+outbound = OutboundScheduler()
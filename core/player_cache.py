@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from models.player import Player
+
+class PlayerCache:
+    """In-process identity map of Player objects with write-behind tracking
+
+    Every lookup for a user returns the same Player instance while it stays
+    cached. Saved players are only marked dirty; the owner collects them with
+    take_dirty() and writes them in one batch; they count as in flight until
+    confirm_saved() or restore_dirty(). Once max_entries is exceeded, least
+    recently used entries are evicted, but only those that are neither dirty
+    nor in flight and whose get_changes() is empty, so changes made in place
+    without save_player() are not dropped either.
+
+    Not thread-safe: it is meant to be used from the event loop thread only.
+    """
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Player]" = OrderedDict()
+        self._dirty = set()
+        self._flushing: Dict[int, int] = {}  # user_id -> snapshots taken but not yet confirmed
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id: int):
+        return user_id in self._entries
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    @property
+    def flushing_count(self) -> int:
+        return len(self._flushing)
+
+    def get(self, user_id: int) -> Optional[Player]:
+        """Return the cached player and mark it recently used"""
+        player = self._entries.get(user_id)
+        if player is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(user_id)
+        return player
+
+    def add(self, player: Player) -> Player:
+        """Cache a player loaded from the database
+
+        If another coroutine cached the same user in the meantime, that
+        instance wins so there is only ever one live object per user.
+        """
+        existing = self._entries.get(player.user_id)
+        if existing is not None:
+            self._entries.move_to_end(player.user_id)
+            return existing
+        self._entries[player.user_id] = player
+        self._evict()
+        return player
+
+    def mark_dirty(self, player: Player):
+        """Record that a player must be written on the next flush"""
+        self._entries[player.user_id] = player
+        self._entries.move_to_end(player.user_id)
+        self._dirty.add(player.user_id)
+        self._evict()
+
+    def take_dirty(self) -> List[Player]:
+        """Snapshot dirty players for writing and hold them until the write ends
+
+        Copies are returned so the writer thread never sees a player that is
+        being mutated on the event loop at the same time. The players stay
+        pinned in the cache until confirm_saved() or restore_dirty().
+        """
+        snapshots = [
+            self._entries[user_id].copy()
+            for user_id in self._dirty
+            if user_id in self._entries
+        ]
+        self._dirty.clear()
+        for snapshot in snapshots:
+            self._flushing[snapshot.user_id] = self._flushing.get(snapshot.user_id, 0) + 1
+        return snapshots
+
+    def _release(self, user_id: int):
+        count = self._flushing.get(user_id, 0) - 1
+        if count > 0:
+            self._flushing[user_id] = count
+        else:
+            self._flushing.pop(user_id, None)
+
+    def confirm_saved(self, snapshots: List[Player]):
+        """Carry the written state of flushed copies back to the live objects"""
+        for snapshot in snapshots:
+            self._release(snapshot.user_id)
+            player = self._entries.get(snapshot.user_id)
+            if player is not None:
+                player._saved = snapshot._saved
+        self._evict()
+
+    def restore_dirty(self, players: List[Player]):
+        """Re-mark players whose write failed so the next flush retries"""
+        for player in players:
+            self._release(player.user_id)
+            if player.user_id in self._entries:
+                self._dirty.add(player.user_id)
+
+    def user_ids(self) -> List[int]:
+        """IDs of every cached player"""
+        return list(self._entries)
+
+    def invalidate(self, user_id: int):
+        """Forget a clean cached player (unsaved entries are kept)"""
+        if self._is_clean(user_id):
+            self._entries.pop(user_id, None)
+
+    def _is_clean(self, user_id: int) -> bool:
+        """True if dropping the entry loses nothing the database doesn't have"""
+        player = self._entries.get(user_id)
+        return (
+            user_id not in self._dirty
+            and user_id not in self._flushing
+            and (player is None or not player.get_changes())
+        )
+
+    def _evict(self):
+        """Drop least recently used clean entries above max_entries"""
+        if len(self._entries) <= self.max_entries:
+            return
+        for user_id in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if self._is_clean(user_id):
+                del self._entries[user_id]
+
+    def stats(self) -> Dict:
+        return {
+            'entries': len(self._entries),
+            'dirty': len(self._dirty),
+            'flushing': len(self._flushing),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,156 @@
+"""
+SAMPLING PROFILER
+On-demand stack sampling of the event loop and database threads
+
+A daemon thread wakes every `interval` seconds, grabs the current frame of
+every thread with sys._current_frames() and counts each stack. Nothing is
+hooked into the profiled code, so the cost is one stack walk per thread
+per sample (well under 1% CPU at the default 100 Hz) and it can be
+switched on in production with /profile_start.
+
+Stacks are written in the collapsed format used by flamegraph.pl and
+speedscope, one line per stack:
+
+    event-loop;task:CallbackRouter._run;core.router:CallbackRouter._run;... 42
+
+Frames are "module:qualified name", so handlers show up as e.g.
+handlers.combat_handlers:CombatHandlers.battle_action. On the event loop
+thread the asyncio task running at that moment is added under the
+thread root, naming the coroutine that owns the stack.
+
+Profiles go to $PROFILE_DIR, by default a mafia-profiles directory under
+the system temp dir so they never land in the working tree.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+DB_THREAD_PREFIXES = ("db-reader", "db-writer")
+MAX_DURATION = 600  # seconds
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), "mafia-profiles")
+
+# Current task per event loop, maintained by asyncio itself
+_current_tasks = getattr(asyncio.tasks, '_current_tasks', {})
+
+class SamplingProfiler:
+    """Collects collapsed stacks from selected threads for a while"""
+
+    def __init__(self, interval: float = 0.01, thread_prefixes: Tuple[str, ...] = DB_THREAD_PREFIXES,
+                 output_dir: str = None):
+        self.interval = interval
+        self.thread_prefixes = thread_prefixes
+        self.output_dir = output_dir or os.environ.get("PROFILE_DIR", DEFAULT_PROFILE_DIR)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self._labels: Dict[object, str] = {}
+        self._loop = None
+        self._loop_thread = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        """Begin sampling; call from the event loop thread (or pass loop)"""
+        if self.running:
+            raise RuntimeError("Profiler already running")
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling, write the collapsed stacks and return the file path"""
+        if not self.running:
+            raise RuntimeError("Profiler not running")
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _frame_label(self, code, frame) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get('__name__', '?')
+            label = self._labels[code] = f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+        return label
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self._loop_thread:
+                root = ["event-loop"]
+                task = _current_tasks.get(self._loop)
+                if task is not None:
+                    coro = task.get_coro()
+                    root.append(f"task:{getattr(coro, '__qualname__', task.get_name())}")
+            else:
+                name = names.get(ident, "")
+                if not name.startswith(self.thread_prefixes):
+                    continue
+                root = [name.rsplit('_', 1)[0]]  # db-reader_0 -> db-reader
+
+            frames = []
+            while frame is not None:
+                frames.append(self._frame_label(frame.f_code, frame))
+                frame = frame.f_back
+            frames.reverse()
+            self.stacks[";".join(root + frames)] += 1
+        self.samples += 1
+
+    def write(self) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))
+        path = os.path.join(self.output_dir, f"profile-{stamp}.folded")
+        with open(path, 'w', encoding='utf-8') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+        return path
+
+    def hotspots(self, limit: int = 5) -> List[Tuple[str, int]]:
+        """Functions most often on top of a stack (self time), with sample counts"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return leaves.most_common(limit)
+
+# Global profiler, driven by /profile_start and /profile_stop
+profiler = SamplingProfiler()
+
+# Test the profiler
+if __name__ == "__main__":
+    def busy():
+        return sum(i * i for i in range(200_000))
+
+    async def handler():
+        for _ in range(30):
+            busy()
+            await asyncio.sleep(0)
+
+    async def main():
+        test = SamplingProfiler(interval=0.001, output_dir="/tmp")
+        test.start()
+        await handler()
+        path = test.stop()
+        assert any("task:" in stack and "busy" in stack for stack in test.stacks), test.stacks
+        print(f"✅ Profiler working! {test.samples} samples -> {path}")
+        print(test.hotspots(3))
+
+    asyncio.run(main())
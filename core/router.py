@@ -0,0 +1,197 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, ContextTypes
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable]
+
+class RouteConflictError(ValueError):
+    """Two routes would both match some callback_data"""
+
+@dataclass
+class Route:
+    key: str
+    callback: Optional[Callback]
+    prefix: bool = False
+    block: bool = True
+    calls: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    # Builds the callback on the first dispatch (see CallbackRouter.add_lazy)
+    loader: Optional[Callable[[], Callback]] = None
+
+    @property
+    def name(self) -> str:
+        if self.callback is None:
+            return f"lazy {getattr(self.loader, '__qualname__', repr(self.loader))}"
+        return getattr(self.callback, '__qualname__', repr(self.callback))
+
+    def describe(self) -> str:
+        return f"{self.key}{'*' if self.prefix else ''} -> {self.name}"
+
+class _Node:
+    __slots__ = ('children', 'route')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.route: Optional[Route] = None
+
+class CallbackRouter:
+    """One CallbackQueryHandler that routes by callback_data
+
+    Exact keys are a dict lookup; prefix routes live in a character trie
+    walked once per callback. Any overlap between routes (the same key
+    twice, a prefix covering an exact key, or nested prefixes) raises
+    RouteConflictError when the route is added, so ambiguities surface at
+    startup instead of depending on registration order.
+
+    Routes added with block=False run as their own task, so a slow handler
+    (e.g. waiting for the matchmaker) does not hold up the update queue.
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, Route] = {}
+        self._root = _Node()
+        self._prefix_count = 0
+        self.unmatched = 0
+
+    def __contains__(self, key: str):
+        return key in self._exact or self._find_prefix_node(key) is not None
+
+    def __len__(self):
+        return len(self._exact) + self._prefix_count
+
+    def add(self, key: str, callback: Callback, prefix: bool = False, block: bool = True) -> Route:
+        """Route callback_data equal to key (or starting with it, if prefix)"""
+        route = Route(key, callback, prefix=prefix, block=block)
+        covering = self._longest_prefix(key)
+        if covering is not None:
+            raise RouteConflictError(f"{route.describe()} overlaps {covering.describe()}")
+
+        if prefix:
+            covered = [other for other in self._exact.values() if other.key.startswith(key)]
+            covered += self._routes_below(key)
+            if covered:
+                raise RouteConflictError(f"{route.describe()} overlaps {covered[0].describe()}")
+            node = self._root
+            for char in key:
+                node = node.children.setdefault(char, _Node())
+            node.route = route
+            self._prefix_count += 1
+        else:
+            if key in self._exact:
+                raise RouteConflictError(f"{route.describe()} overlaps {self._exact[key].describe()}")
+            self._exact[key] = route
+        return route
+
+    def add_lazy(self, key: str, loader: Callable[[], Callback], prefix: bool = False,
+                 block: bool = True) -> Route:
+        """Like add(), but the callback comes from loader() on first use
+
+        Lets a subsystem claim its keys at startup without being imported
+        until someone actually presses one of its buttons.
+        """
+        route = self.add(key, None, prefix=prefix, block=block)
+        route.loader = loader
+        return route
+
+    def _find_prefix_node(self, key: str) -> Optional[_Node]:
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node if node.route is not None else None
+
+    def _routes_below(self, key: str) -> List[Route]:
+        """Prefix routes whose key starts with key"""
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        found, stack = [], [node]
+        while stack:
+            node = stack.pop()
+            if node.route is not None:
+                found.append(node.route)
+            stack.extend(node.children.values())
+        return found
+
+    def _longest_prefix(self, data: str) -> Optional[Route]:
+        node, match = self._root, None
+        for char in data:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.route is not None:
+                match = node.route
+        return match
+
+    def resolve(self, data: str) -> Optional[Route]:
+        """Route for a callback_data value, or None"""
+        route = self._exact.get(data)
+        if route is None:
+            route = self._longest_prefix(data)
+        return route
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """The CallbackQueryHandler callback"""
+        query = update.callback_query
+        route = self.resolve(query.data or "")
+        if route is None:
+            self.unmatched += 1
+            logger.debug("No route for callback_data %r", query.data)
+            await query.answer()
+            return
+
+        if route.block:
+            await self._run(route, update, context)
+        else:
+            context.application.create_task(self._run(route, update, context), update=update)
+
+    async def _run(self, route: Route, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        started = time.perf_counter()
+        try:
+            with metrics.track("handler", f"callback:{route.key}"):
+                if route.callback is None:
+                    route.callback = route.loader()
+                return await route.callback(update, context)
+        except Exception:
+            route.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            route.calls += 1
+            route.total_time += elapsed
+            route.max_time = max(route.max_time, elapsed)
+
+    def handler(self) -> CallbackQueryHandler:
+        """Single handler to register with the Application"""
+        return CallbackQueryHandler(self.dispatch)
+
+    def routes(self) -> List[Route]:
+        return list(self._exact.values()) + self._routes_below("")
+
+    def stats(self) -> List[Dict]:
+        """Per-route call counts and latency, busiest first"""
+        rows = [
+            {
+                'route': route.describe(),
+                'calls': route.calls,
+                'errors': route.errors,
+                'avg_ms': route.total_time / route.calls * 1000 if route.calls else 0.0,
+                'max_ms': route.max_time * 1000,
+            }
+            for route in self.routes()
+        ]
+        rows.sort(key=lambda row: row['calls'], reverse=True)
+        return rows
@@ -0,0 +1,123 @@
+"""
+SERVICE CONTAINER
+Process-wide services that are built once, on first use
+
+Subsystems register a factory under a name; services.get(name) runs it
+the first time and hands back the same object afterwards. Everything that
+is built, and every startup phase wrapped in services.phase(), is timed so
+the bot can print where its cold start went.
+"""
+
+import importlib
+import importlib.util
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Taken as early as possible: core.services is the first project module main.py imports
+PROCESS_START = time.perf_counter()
+
+class Services:
+    """Lazily built, process-wide singletons with a startup timing report"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        # (label, seconds, modules imported while it ran), in the order they happened
+        self.timings: List[Tuple[str, float, int]] = []
+        self.serving_after = None
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Declare how to build a service; nothing runs until get(name)"""
+        self._factories[name] = factory
+
+    def available(self, name: str) -> bool:
+        return name in self._factories
+
+    def loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def get(self, name: str):
+        """The service, built on the first call"""
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._instances:
+                with self.phase(name):
+                    self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def loader(self, name: str, attribute: str) -> Callable[[], Any]:
+        """Zero-argument callable returning getattr(get(name), attribute)"""
+        def load():
+            return getattr(self.get(name), attribute)
+        load.__qualname__ = f"{name}.{attribute}"
+        return load
+
+    @contextmanager
+    def phase(self, label: str):
+        """Time a block of startup (or first-use) work"""
+        modules = len(sys.modules)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.timings.append((label, elapsed, len(sys.modules) - modules))
+            if self.serving_after is not None:
+                logger.info("%s loaded on first use in %.1f ms", label, elapsed * 1000)
+
+    def mark_serving(self):
+        """Record that the bot is about to take updates"""
+        self.serving_after = time.perf_counter() - PROCESS_START
+
+    def log_report(self, log: logging.Logger):
+        """One structured record per startup phase, then the total"""
+        for label, elapsed, modules in self.timings:
+            log.info("Startup phase", extra={'event': 'startup_phase', 'phase': label,
+                                             'ms': round(elapsed * 1000, 1), 'modules': modules})
+        if self.serving_after is not None:
+            log.info("Ready to serve", extra={'event': 'startup', 'ms': round(self.serving_after * 1000, 1)})
+
+    def report(self) -> str:
+        """Cold start broken down by phase"""
+        lines = ["⏱️ Startup time by phase:"]
+        for label, elapsed, modules in self.timings:
+            lines.append(f"  {label:<24} {elapsed * 1000:8.1f} ms  (+{modules} modules)")
+        if self.serving_after is not None:
+            lines.append(f"  {'ready to serve after':<24} {self.serving_after * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+def module_available(name: str) -> bool:
+    """True if name can be imported, without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+def _load_database():
+    from core.async_database import async_db
+    async_db.db  # Opens the connections and creates the tables
+    return async_db
+
+def _load_combat():
+    return importlib.import_module("handlers.combat_integration").combat_system
+
+def _load_shop():
+    return importlib.import_module("shop.shop_handlers")
+
+# Global service container
+services = Services()
+services.register("database", _load_database)
+if module_available("handlers.combat_integration"):
+    services.register("combat", _load_combat)
+if module_available("shop.shop_handlers"):
+    services.register("shop", _load_shop)
@@ -0,0 +1,177 @@
+# handlers/battle_registry.py
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+def battle_user_ids(battle: Dict) -> List[int]:
+    """Telegram user IDs of the real players taking part in a battle"""
+    return [
+        battle[key].user_id
+        for key in ('player1', 'player2')
+        if key in battle and hasattr(battle[key], 'user_id')
+    ]
+
+class BattleRegistry:
+    """Active battles keyed by id, indexed by user, with idle expiry
+
+    Every battle dict carries its own 'battle_id', and add() gives it a
+    small numeric 'handle' for use in callback_data. Handles are only valid
+    together with this registry's epoch, a random number picked at startup,
+    so buttons left over from before a restart never hit a new battle.
+
+    A min-heap of deadlines
+    lets reap() find idle battles without scanning: entries are pushed with
+    the deadline current at the time and re-checked (and re-pushed if the
+    battle saw activity since) when they reach the top.
+    """
+
+    def __init__(self, idle_ttl: float = 600.0, reap_interval: float = 30.0,
+                 on_expire: Callable[[Dict], Awaitable] = None):
+        self.idle_ttl = idle_ttl
+        self.reap_interval = reap_interval
+        self.on_expire = on_expire
+        self._battles: Dict[str, Dict] = {}
+        self._by_user: Dict[int, Set[str]] = {}
+        self._last_active: Dict[str, float] = {}
+        self._deadlines = []
+        self._handles: Dict[int, str] = {}
+        self._next_handle = itertools.count(1)
+        self.epoch = random.getrandbits(16)
+        self.expired_total = 0
+        self._task = None
+
+    def __len__(self):
+        return len(self._battles)
+
+    def __contains__(self, battle_id: str):
+        return battle_id in self._battles
+
+    def add(self, battle: Dict, now: float = None) -> Dict:
+        """Register a battle (it must contain its 'battle_id', unique among active battles)"""
+        now = time.monotonic() if now is None else now
+        battle_id = battle['battle_id']
+        if battle_id in self._battles:
+            raise ValueError(f"Battle {battle_id} is already registered")
+        self._battles[battle_id] = battle
+        handle = next(self._next_handle) & 0xFFFFFFFF
+        self._handles[handle] = battle_id
+        battle['handle'] = handle
+        for user_id in battle_user_ids(battle):
+            self._by_user.setdefault(user_id, set()).add(battle_id)
+        self._last_active[battle_id] = now
+        heapq.heappush(self._deadlines, (now + self.idle_ttl, battle_id))
+        return battle
+
+    def get(self, battle_id: str) -> Optional[Dict]:
+        return self._battles.get(battle_id)
+
+    def get_by_handle(self, handle: int, epoch: int) -> Optional[Dict]:
+        """Battle behind a callback handle, if it is still running"""
+        if epoch != self.epoch:
+            return None
+        battle_id = self._handles.get(handle)
+        return None if battle_id is None else self._battles.get(battle_id)
+    
+    def touch(self, battle_id: str, now: float = None):
+        """Record activity so the battle isn't reaped as idle"""
+        if battle_id in self._battles:
+            self._last_active[battle_id] = time.monotonic() if now is None else now
+
+    def get_by_user(self, user_id: int) -> List[Dict]:
+        """Every active battle a user takes part in"""
+        return [self._battles[battle_id] for battle_id in self._by_user.get(user_id, ())]
+
+    def remove(self, battle_id: str) -> Optional[Dict]:
+        """Drop a battle from the registry and the user index"""
+        battle = self._battles.pop(battle_id, None)
+        if battle is None:
+            return None
+        self._last_active.pop(battle_id, None)
+        self._handles.pop(battle.get('handle'), None)
+        for user_id in battle_user_ids(battle):
+            user_battles = self._by_user.get(user_id)
+            if user_battles is not None:
+                user_battles.discard(battle_id)
+                if not user_battles:
+                    del self._by_user[user_id]
+        # Its heap entry is discarded lazily by reap()
+        return battle
+
+    def pop_expired(self, now: float = None) -> List[Dict]:
+        """Remove and return every battle idle for longer than idle_ttl"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, battle_id = heapq.heappop(self._deadlines)
+            last_active = self._last_active.get(battle_id)
+            if last_active is None:
+                continue  # Already ended
+            deadline = last_active + self.idle_ttl
+            if deadline > now:
+                heapq.heappush(self._deadlines, (deadline, battle_id))
+                continue
+            expired.append(self.remove(battle_id))
+
+        # Ended battles leave stale heap entries behind; rebuild if they pile up
+        if len(self._deadlines) > 2 * len(self._battles) + 64:
+            self._deadlines = [
+                (self._last_active[battle_id] + self.idle_ttl, battle_id)
+                for battle_id in self._battles
+            ]
+            heapq.heapify(self._deadlines)
+        return expired
+
+    async def reap(self, now: float = None) -> int:
+        """Expire idle battles, handing each one to on_expire"""
+        expired = self.pop_expired(now)
+        for battle in expired:
+            self.expired_total += 1
+            if self.on_expire is not None:
+                try:
+                    await self.on_expire(battle)
+                except Exception:
+                    logger.exception("Expiring battle %s failed", battle.get('battle_id'))
+        return len(expired)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            await self.reap()
+
+    def start(self):
+        """Start the periodic reaper on the running event loop (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        """Counts and a rough memory estimate for monitoring"""
+        memory = (
+            sys.getsizeof(self._battles) + sys.getsizeof(self._by_user)
+            + sys.getsizeof(self._last_active) + sys.getsizeof(self._deadlines)
+            + sum(sys.getsizeof(battle) for battle in self._battles.values())
+            + sys.getsizeof(self._handles)
+            + sum(sys.getsizeof(ids) for ids in self._by_user.values())
+        )
+        return {
+            'active_battles': len(self._battles),
+            'users_in_battle': len(self._by_user),
+            'pending_deadlines': len(self._deadlines),
+            'expired_total': self.expired_total,
+            'approx_memory_bytes': memory,
+        }
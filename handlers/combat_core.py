@@ -1,95 +1,113 @@
 # handlers/combat_core.py
-from core.database import Database
-from handlers.animation import CombatAnimations
-from handlers.npc import NPCFactory, NPC
+from core.async_database import async_db
+from utils.animation import CombatAnimations
+from models.npc import NPCFactory, NPC
+from models.player import Player
+from utils.keyed_locks import KeyedLocks
+from handlers.matchmaking import Matchmaker
+from handlers.battle_registry import BattleRegistry, battle_user_ids
 import random
 import asyncio
+import itertools
+import logging
+import os
 from typing import Dict, List, Optional
 
+logger = logging.getLogger(__name__)
+
+# Seconds a quick match waits for a PvP opponent before falling back to an NPC
+MATCH_TIMEOUT = 10
+
 class CombatCore:
-    def __init__(self):
-        self.db = Database()
+    """Battle state and turn resolution
+
+    Every battle owns a random.Random seeded from its own 'seed', and
+    records its starting state and the actions taken, so replay_battle()
+    can reproduce it exactly. Pass seed to make the sequence of battle
+    seeds itself reproducible (e.g. for benchmarks).
+    """
+    
+    def __init__(self, seed: Optional[int] = None):
+        self.db = async_db
+        self.seeds = random.Random(seed)  # Source of per-battle seeds
+        self.battle_numbers = itertools.count(1)  # Keeps battle ids unique
         self.animations = CombatAnimations()
-        self.active_battles = {}  # Track ongoing battles
-        self.waiting_players = []  # Players waiting for PvP matches
+        self.battles = BattleRegistry(on_expire=self._expire_battle)  # Track ongoing battles
+        self.turn_locks = KeyedLocks()  # Serializes turns per battle and per player
+        self.matchmaker = Matchmaker(self._create_pvp_match)  # Pairs players waiting for PvP
     
     async def start_1v1_battle(self, player1_id: int, player2_id: Optional[int] = None, is_bot: bool = False):
         """Start a 1v1 battle - PvP or vs NPC"""
-        player1 = self.db.get_player(player1_id)
+        player1 = await self.db.get_player(player1_id)
         
         if not player1:
             return {"error": "Player not found"}
         
         if not player2_id and not is_bot:
-            # Try to find PvP opponent first
-            opponent = await self.find_pvp_opponent(player1_id)
-            if opponent:
-                return await self.execute_pvp_battle(player1, opponent)
+            # Wait for the matchmaker to pair us with a PvP opponent first
+            battle_data = await self.matchmaker.request_match(player1, timeout=MATCH_TIMEOUT)
+            if battle_data:
+                return battle_data
             else:
-                # No players found, use NPC
+                # No players found in time, use NPC
                 return await self.execute_npc_battle(player1)
         elif is_bot:
             # Force NPC battle
             return await self.execute_npc_battle(player1)
         else:
             # Specific player battle
-            player2 = self.db.get_player(player2_id)
+            player2 = await self.db.get_player(player2_id)
             if player2:
                 return await self.execute_pvp_battle(player1, player2)
             else:
                 return {"error": "Opponent not found"}
     
-    async def find_pvp_opponent(self, player_id: int):
-        """Find online player with similar level - uses your waiting system"""
-        player = self.db.get_player(player_id)
-        
-        if not player:
+    async def _create_pvp_match(self, player1_id: int, player2_id: int):
+        """Called by the matchmaker for every pair it forms"""
+        players = await self.db.get_players([player1_id, player2_id])
+        if len(players) < 2:
             return None
-        
-        # Add player to waiting list
-        if player_id not in self.waiting_players:
-            self.waiting_players.append(player_id)
-        
-        # Find best match (similar level)
-        best_opponent = None
-        best_level_diff = float('inf')
-        
-        for opponent_id in self.waiting_players:
-            if opponent_id == player_id:
-                continue
-                
-            opponent = self.db.get_player(opponent_id)
-            if opponent and opponent.health > 0 and opponent.energy >= 10:
-                level_diff = abs(player.level - opponent.level)
-                if level_diff < best_level_diff:
-                    best_opponent = opponent
-                    best_level_diff = level_diff
-        
-        # Remove matched players from waiting list
-        if best_opponent:
-            self.waiting_players.remove(player_id)
-            self.waiting_players.remove(best_opponent.user_id)
-            return best_opponent
-        
-        return None
+        return await self.execute_pvp_battle(players[player1_id], players[player2_id])
+    
+    def new_seed(self) -> int:
+        """Seed for a new battle, from the source seeded by COMBAT_SEED"""
+        return self.seeds.getrandbits(64)
+    
+    def _new_battle_id(self, *parts) -> str:
+        return "_".join(str(part) for part in parts + (next(self.battle_numbers),))
+    
+    @staticmethod
+    def _create_npc(level: int, rng: random.Random):
+        """NPC matched to a player level"""
+        if level <= 5:
+            return NPCFactory.create_street_thug(level, rng)
+        elif level <= 10:
+            return NPCFactory.create_gang_member(level, rng)
+        elif level <= 15:
+            return NPCFactory.create_police_officer(level, rng)
+        else:
+            return NPCFactory.create_mafia_boss(level, rng)
     
     async def execute_pvp_battle(self, player1, player2):
         """Execute player vs player battle with animations"""
-        battle_id = f"pvp_{player1.user_id}_{player2.user_id}_{random.randint(1000,9999)}"
+        seed = self.new_seed()
+        battle_id = self._new_battle_id("pvp", player1.user_id, player2.user_id)
         
-        self.active_battles[battle_id] = {
+        battle = await self._register_battle({
+            'battle_id': battle_id,
             'player1': player1,
             'player2': player2,
             'turn': 'player1',
             'type': 'pvp',
             'round': 1
-        }
+        }, seed)
         
         # Use your epic animations
         intro_frames = self.animations.combat_intro(player1.first_name, player2.first_name)
         
         battle_data = {
             'battle_id': battle_id,
+            'handle': battle['handle'],
             'players': [player1, player2],
             'type': 'pvp',
             'intro_animation': intro_frames,
@@ -100,31 +118,28 @@ class CombatCore:
     
     async def execute_npc_battle(self, player):
         """Execute battle against your NPC system"""
-        # Create NPC based on player level using your NPCFactory
-        if player.level <= 5:
-            npc = NPCFactory.create_street_thug(player.level)
-        elif player.level <= 10:
-            npc = NPCFactory.create_gang_member(player.level)
-        elif player.level <= 15:
-            npc = NPCFactory.create_police_officer(player.level)
-        else:
-            npc = NPCFactory.create_mafia_boss(player.level)
+        # Create NPC based on player level using your NPCFactory, from the battle's own RNG
+        seed = self.new_seed()
+        rng = random.Random(seed)
+        npc = self._create_npc(player.level, rng)
         
-        battle_id = f"npc_{player.user_id}_{npc.name}_{random.randint(1000,9999)}"
+        battle_id = self._new_battle_id("npc", player.user_id, npc.name)
         
-        self.active_battles[battle_id] = {
+        battle = await self._register_battle({
+            'battle_id': battle_id,
             'player1': player,
             'npc': npc,
             'turn': 'player1',
             'type': 'pve',
             'round': 1
-        }
+        }, seed, rng)
         
         # Use your animations for NPC battle
         intro_frames = self.animations.combat_intro(player.first_name, npc.name)
         
         battle_data = {
             'battle_id': battle_id,
+            'handle': battle['handle'],
             'players': [player, npc],
             'type': 'pve',
             'intro_animation': intro_frames,
@@ -141,25 +156,73 @@ class CombatCore:
         
         return battle_data
     
-    async def execute_player_turn(self, battle_id: str, action: str, target: str = None):
-        """Execute player's turn in battle"""
-        if battle_id not in self.active_battles:
+    async def execute_player_turn(self, battle_id: str, action: str, target: str = None,
+                                  user_id: Optional[int] = None):
+        """Execute player's turn in battle
+        
+        With user_id, the turn is refused (result has 'rejected') unless that
+        user takes part in the battle and it is their turn.
+        """
+        battle = self.battles.get(battle_id)
+        if battle is None:
             return {"error": "Battle not found"}
         
-        battle = self.active_battles[battle_id]
+        # One turn at a time per battle and per player, so concurrent
+        # callbacks can't apply damage twice or end the battle twice
+        lock_keys = [('battle', battle_id)] + [('user', uid) for uid in battle_user_ids(battle)]
+        async with self.turn_locks.hold(*lock_keys):
+            # The battle may have ended while we were waiting
+            battle = self.battles.get(battle_id)
+            if battle is None:
+                return {"error": "Battle already finished"}
+            
+            error = self._turn_error(battle, user_id)
+            if error:
+                return {"error": error, "rejected": True}
+            
+            self.battles.touch(battle_id)
+            
+            result, battle_result, rewards = self._resolve_turn(battle, action)
+            if battle_result:
+                await self._end_battle(battle, battle_result, rewards)
+            # Damage is applied to the cached players in place; queue them for writing
+            await self.db.save_players(self._battle_players(battle))
+            return result
+    
+    @staticmethod
+    def _battle_players(battle) -> List[Player]:
+        """The real players (not NPCs) taking part in a battle"""
+        return [battle[key] for key in ('player1', 'player2') if isinstance(battle.get(key), Player)]
+    
+    @staticmethod
+    def _turn_error(battle, user_id: Optional[int]) -> Optional[str]:
+        """Why user_id may not act in the battle right now (None if they may)"""
+        if user_id is None:
+            return None
+        if user_id not in battle_user_ids(battle):
+            return "You are not in this battle"
+        if battle['type'] == 'pvp' and battle[battle['turn']].user_id != user_id:
+            return "It's not your turn"
+        return None
+    
+    def _resolve_turn(self, battle, action: str):
+        """Apply one action to the battle state, returning (result, battle_result, rewards)
         
+        Pure apart from the battle's own RNG, so replay_battle() can run it too.
+        """
+        battle['actions'].append(action)
         if battle['type'] == 'pvp':
-            return await self._execute_pvp_turn(battle, action, target)
+            return self._resolve_pvp_turn(battle, action)
         else:
-            return await self._execute_pve_turn(battle, action, target)
+            return self._resolve_pve_turn(battle, action)
     
-    async def _execute_pvp_turn(self, battle, action: str, target: str):
-        """Execute turn in PvP battle"""
+    def _resolve_pvp_turn(self, battle, action: str):
+        """Resolve a turn in a PvP battle"""
         player = battle['player1'] if battle['turn'] == 'player1' else battle['player2']
         opponent = battle['player2'] if battle['turn'] == 'player1' else battle['player1']
         
         # Execute action
-        result = await self._process_action(player, opponent, action)
+        result = self._process_action(player, opponent, action, battle['rng'])
         
         # Switch turns
         battle['turn'] = 'player2' if battle['turn'] == 'player1' else 'player1'
@@ -168,48 +231,88 @@ class CombatCore:
         # Check for battle end
         battle_result = self._check_battle_end(battle)
         if battle_result:
-            await self._end_battle(battle, battle_result)
-        
-        return result
+            winner = battle[battle_result['winner']]
+            return {**result, 'battle_ended': True, 'winner': winner.user_id}, battle_result, None
+        return {**result, 'battle_ended': False}, None, None
     
-    async def _execute_pve_turn(self, battle, action: str, target: str):
-        """Execute turn in PvE battle"""
+    def _resolve_pve_turn(self, battle, action: str):
+        """Resolve a turn in a PvE battle"""
         player = battle['player1']
         npc = battle['npc']
+        rng = battle['rng']
         
         # Player's turn
-        player_result = await self._process_action(player, npc, action)
+        player_result = self._process_action(player, npc, action, rng)
         
         # Check if NPC defeated
         if npc.health <= 0:
             battle_result = {'winner': 'player', 'type': 'victory'}
             rewards = npc.get_rewards()
-            await self._end_battle(battle, battle_result, rewards)
-            return {**player_result, 'battle_ended': True, 'rewards': rewards}
+            return {**player_result, 'battle_ended': True, 'rewards': rewards}, battle_result, rewards
         
         # NPC's turn (AI decision)
-        npc_action = npc.choose_action(player.level)
-        npc_result = await self._process_npc_action(npc, player, npc_action)
+        npc_action = npc.choose_action(player.level, rng)
+        npc_result = self._process_npc_action(npc, player, npc_action, rng)
         
         # Check if player defeated
         if player.health <= 0:
             battle_result = {'winner': 'npc', 'type': 'defeat'}
-            await self._end_battle(battle, battle_result)
-            return {**player_result, **npc_result, 'battle_ended': True}
+            return {**player_result, **npc_result, 'battle_ended': True}, battle_result, None
         
         battle['round'] += 1
         
-        return {**player_result, **npc_result, 'battle_ended': False}
+        return {**player_result, **npc_result, 'battle_ended': False}, None, None
     
-    async def _process_action(self, attacker, defender, action: str):
+    def battle_record(self, battle) -> Dict:
+        """Seed, starting stats and actions: everything replay_battle() needs"""
+        return {
+            'battle_id': battle['battle_id'],
+            'type': battle['type'],
+            'seed': battle['seed'],
+            'initial': battle['initial'],
+            'actions': list(battle['actions']),
+        }
+    
+    def replay_battle(self, record: Dict) -> List[Dict]:
+        """Re-run a recorded battle offline and return every turn's result
+        
+        Rebuilds the players from the stats recorded when the battle
+        started, never from the live (cached, regenerating) Player objects,
+        so the same record replays with identical results any number of times.
+        """
+        rng = random.Random(record['seed'])
+        battle = {
+            'battle_id': record['battle_id'],
+            'type': record['type'],
+            'turn': 'player1',
+            'round': 1,
+            'rng': rng,
+            'actions': [],
+        }
+        for key, stats in record['initial'].items():
+            battle[key] = Player.from_dict(stats)
+        if record['type'] == 'pve':
+            battle['npc'] = self._create_npc(battle['player1'].level, rng)
+        
+        results = []
+        for action in record['actions']:
+            result, battle_result, _ = self._resolve_turn(battle, action)
+            results.append(result)
+            if battle_result:
+                break
+        return results
+    
+    def _process_action(self, attacker, defender, action: str, rng: random.Random):
         """Process combat action"""
         if action == "attack":
-            damage = self._calculate_damage(attacker, defender)
+            damage = self._calculate_damage(attacker, defender, rng)
             defender.health = max(0, defender.health - damage)
             
             # Use your damage animation
             damage_text = self.animations.damage_animation(damage, False)
-            attack_animation = self.animations.class_specific_attack(attacker.first_name, getattr(attacker, 'character_class', 'enforcer'))
+            attack_animation = self.animations.class_specific_attack(
+                attacker.first_name, getattr(attacker, 'character_class', 'enforcer'), rng
+            )
             
             return {
                 'action': 'attack',
@@ -230,20 +333,20 @@ class CombatCore:
         
         elif action == "escape":
             escape_chance = 0.3  # 30% escape chance
-            if random.random() < escape_chance:
+            if rng.random() < escape_chance:
                 escape_frames = self.animations.escape_sequence(attacker.first_name)
                 return {'action': 'escape', 'success': True, 'animation': escape_frames}
             else:
                 return {'action': 'escape', 'success': False, 'message': 'Escape failed!'}
     
-    async def _process_npc_action(self, npc, player, action: str):
+    def _process_npc_action(self, npc, player, action: str, rng: random.Random):
         """Process NPC's AI action"""
         if action == "attack":
-            damage = npc.calculate_damage()
+            damage = npc.calculate_damage(rng)
             player.health = max(0, player.health - damage)
             
             damage_text = self.animations.damage_animation(damage, False)
-            attack_animation = self.animations.class_specific_attack(npc.name, npc.character_class)
+            attack_animation = self.animations.class_specific_attack(npc.name, npc.character_class, rng)
             
             return {
                 'npc_action': 'attack',
@@ -260,9 +363,9 @@ class CombatCore:
         elif action == "defend":
             return {'npc_action': 'defend', 'message': f'{npc.name} defends!'}
     
-    def _calculate_damage(self, attacker, defender):
+    def _calculate_damage(self, attacker, defender, rng: random.Random):
         """Calculate damage between entities"""
-        base_damage = random.randint(8, 15)
+        base_damage = rng.randint(8, 15)
         
         # Level advantage
         attacker_level = getattr(attacker, 'level', 1)
@@ -288,24 +391,44 @@ class CombatCore:
     
     async def _end_battle(self, battle, result, rewards=None):
         """End battle and distribute rewards"""
-        battle_id = None
-        for bid, b in self.active_battles.items():
-            if b == battle:
-                battle_id = bid
-                break
-        
-        if battle_id:
-            del self.active_battles[battle_id]
+        self.battles.remove(battle['battle_id'])
+        # Seed and actions are enough to replay it from the starting stats
+        logger.info("Battle ended", extra={
+            'event': 'battle_ended', 'battle_id': battle['battle_id'], 'type': battle['type'],
+            'seed': battle['seed'], 'actions': list(battle['actions']), 'winner': result['winner'],
+        })
         
         # Apply rewards to player
         if result['winner'] == 'player' and rewards:
             player = battle['player1']
-            player.gold += rewards.get('cash', 0)
+            player.cash += rewards.get('cash', 0)
             player.reputation += rewards.get('reputation', 0)
-            # Add experience to level system
-            self.db.save_player(player)
+            # Add experience to level system (saved with the rest of the turn)
         
         return result
+    
+    async def _register_battle(self, battle, seed: int, rng: random.Random = None):
+        """Start tracking a new battle"""
+        # Replay support: the battle's RNG stream, where it started and what was done
+        battle['seed'] = seed
+        battle['rng'] = rng or random.Random(seed)
+        battle['initial'] = {
+            key: battle[key].to_dict() for key in ('player1', 'player2') if key in battle
+        }
+        battle['actions'] = []
+        
+        self.battles.add(battle)
+        self.battles.start()
+        return battle
+    
+    async def _expire_battle(self, battle):
+        """Forget a battle nobody finished
+        
+        Starting a battle costs no energy, so there is nothing to refund;
+        damage taken so far was already saved with each turn.
+        """
+        logger.info("Battle expired", extra={'event': 'battle_expired', 'battle_id': battle['battle_id'],
+                                             'seed': battle['seed'], 'actions': list(battle['actions'])})
 
-# Global combat instance
-combat_core = CombatCore()
+# Global combat instance (set COMBAT_SEED for reproducible runs)
+combat_core = CombatCore(seed=int(os.environ["COMBAT_SEED"]) if os.environ.get("COMBAT_SEED") else None)
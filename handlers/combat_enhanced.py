@@ -1,44 +1,70 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CallbackQueryHandler
-from core.database import Database
+from telegram import Update
+from telegram.ext import ContextTypes
+from core.async_database import async_db
+from core.outbound import outbound
+from core import keyboards
+from core.frame_renderer import renderer
+from handlers.combat_core import combat_core
+from handlers.combat_handlers import single_flight
 from models.player import Player
 from models.npc import NPCFactory
-from utils.animations import CombatAnimations
+from utils.animation import CombatAnimations
 from utils.combat_calculator import CombatCalculator
+from typing import Dict, List
+import itertools
+import logging
+import os
 import random
 
+logger = logging.getLogger(__name__)
+
 # Initialize systems
-db = Database()
+db = async_db
 combat_calc = CombatCalculator()
 animations = CombatAnimations()
 
+BOT_BATTLE_ENERGY_COST = 15
+MAX_BOT_ROUNDS = 3
+LEVEL_UP_CHANCE = 0.4  # After a victory
+
+# Default for players who haven't picked a mode: set INSTANT_BOT_BATTLES=1 to skip animations
+INSTANT_BATTLES_DEFAULT = os.environ.get("INSTANT_BOT_BATTLES", "0") == "1"
+
 class EnhancedCombatHandler:
+    """Bot battles resolved in one go, animated or as an instant summary
+
+    Like CombatCore, every battle draws from its own random.Random seeded
+    from a recorded 'seed'. The record (seed, difficulty and the player's
+    stats at the start) is kept as the player's last_bot_battle, and
+    replay_battle() re-runs it with identical results.
+    """
+    
     def __init__(self):
-        self.active_battles = {}  # Track ongoing battles
+        self.battle_numbers = itertools.count(1)
+    
+    @staticmethod
+    def instant_mode(context: ContextTypes.DEFAULT_TYPE) -> bool:
+        """Whether this player's bot battles resolve instantly"""
+        return context.user_data.get('instant_battles', INSTANT_BATTLES_DEFAULT)
     
     async def combat_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Main combat menu with buttons"""
         user = update.effective_user
-        player = db.get_player(user.id)
+        player = await db.get_player(user.id)
         
         if not player:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ You need to create a character first! Use /start",
                 parse_mode='Markdown'
             )
             return
         
         # Create combat menu keyboard
-        keyboard = [
-            [InlineKeyboardButton("🤖 Fight Bots", callback_data="fight_bots")],
-            [InlineKeyboardButton("👥 PvP Battle", callback_data="pvp_battle")],
-            [InlineKeyboardButton("🏆 Boss Fight", callback_data="boss_fight")],
-            [InlineKeyboardButton("🎯 Training", callback_data="training_mode")],
-            [InlineKeyboardButton("🔙 Main Menu", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.ARENA_MENU
         
-        await update.message.reply_text(
+        await outbound.reply_text(
+            update.message,
             f"⚔️ **Combat Arena** ⚔️\n\n"
             f"**{player.first_name}** - Level {player.level}\n"
             f"❤️ {player.health}/100 | ⚡ {player.energy}/50\n\n"
@@ -53,71 +79,108 @@ class EnhancedCombatHandler:
         await query.answer()
         
         user = query.from_user
-        player = db.get_player(user.id)
+        player = await db.get_player(user.id)
         
         if not player:
-            await query.edit_message_text("❌ Player not found!")
+            await outbound.edit_message_text(query, "❌ Player not found!")
             return
         
-        keyboard = [
-            [InlineKeyboardButton("🥊 Easy - Street Thugs", callback_data="bot_easy")],
-            [InlineKeyboardButton("💪 Medium - Gang Members", callback_data="bot_medium")],
-            [InlineKeyboardButton("🔥 Hard - Police Officers", callback_data="bot_hard")],
-            [InlineKeyboardButton("🔙 Back", callback_data="combat_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        instant = self.instant_mode(context)
+        reply_markup = keyboards.bot_difficulty(instant)
         
-        await query.edit_message_text(
+        await outbound.edit_message_text(
+            query,
             f"🤖 **Bot Battles**\n\n"
             f"Fight against AI opponents!\n\n"
             f"**Your Level:** {player.level}\n"
-            f"**Recommended:** {'Easy' if player.level < 5 else 'Medium' if player.level < 10 else 'Hard'}\n\n"
+            f"**Recommended:** {'Easy' if player.level < 5 else 'Medium' if player.level < 10 else 'Hard'}\n"
+            f"**Mode:** {'Instant results' if instant else 'Animated'}\n\n"
             f"Choose difficulty:",
             parse_mode='Markdown',
             reply_markup=reply_markup
         )
     
+    async def toggle_instant_mode(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Switch between animated and instant bot battles"""
+        context.user_data['instant_battles'] = not self.instant_mode(context)
+        await self.bot_battle_menu(update, context)
+    
+    @single_flight
     async def start_bot_battle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start a battle against NPC bot"""
         query = update.callback_query
         await query.answer()
         
         user = query.from_user
-        player = db.get_player(user.id)
+        player = await db.get_player(user.id)
         difficulty = query.data.replace("bot_", "")
         
         if not player:
-            await query.edit_message_text("❌ Player not found!")
+            await outbound.edit_message_text(query, "❌ Player not found!")
             return
         
         # Check energy
-        if player.energy < 15:
-            await query.edit_message_text(
-                f"⚡ Not enough energy! You need 15 energy.\n"
+        if player.energy < BOT_BATTLE_ENERGY_COST:
+            await outbound.edit_message_text(
+                query,
+                f"⚡ Not enough energy! You need {BOT_BATTLE_ENERGY_COST} energy.\n"
                 f"Current: {player.energy}/50\n\n"
                 f"Wait for energy to regenerate (1 energy per 5 minutes).",
                 parse_mode='Markdown'
             )
             return
         
-        # Create NPC based on difficulty and player level
+        # Each battle draws from its own seeded RNG, so its record reproduces it
+        record = self.battle_record(player, difficulty, combat_core.new_seed())
+        context.user_data['last_bot_battle'] = record
+        rng = random.Random(record['seed'])
+        npc = self._create_npc(difficulty, player.level, rng)
+        
+        # Start the battle
+        await self._execute_bot_battle(query, player, npc, rng, instant=self.instant_mode(context), record=record)
+    
+    def battle_record(self, player: Player, difficulty: str, seed: int) -> Dict:
+        """Seed and starting stats: everything replay_battle() needs"""
+        return {
+            'battle_id': f"bot_{player.user_id}_{next(self.battle_numbers)}",
+            'type': 'bot',
+            'seed': seed,
+            'difficulty': difficulty,
+            'initial': {'player1': player.to_dict()},
+        }
+    
+    @staticmethod
+    def _create_npc(difficulty: str, level: int, rng: random.Random):
+        """NPC for a difficulty, scaled to the player's level"""
         if difficulty == "easy":
-            npc = NPCFactory.create_street_thug(player.level)
+            return NPCFactory.create_street_thug(level, rng)
         elif difficulty == "medium":
-            npc = NPCFactory.create_gang_member(player.level)
+            return NPCFactory.create_gang_member(level, rng)
         else:  # hard
-            npc = NPCFactory.create_police_officer(player.level)
-        
-        # Start the battle
-        await self._execute_bot_battle(query, player, npc)
+            return NPCFactory.create_police_officer(level, rng)
     
-    async def _execute_bot_battle(self, query, player: Player, npc):
-        """Execute battle against NPC with animations"""
-        # Deduct energy
-        player.energy -= 15
-        db.save_player(player)
+    def _fight(self, player: Player, npc, rng: random.Random):
+        """Every random outcome of a battle: its turns, and whether a victory levels up"""
+        turns = self._simulate_fight(player, npc, rng)
+        level_up = npc.health <= 0 and rng.random() < LEVEL_UP_CHANCE
+        return turns, level_up
+    
+    def replay_battle(self, record: Dict) -> Dict:
+        """Re-run a recorded bot battle offline from its seed and starting stats"""
+        rng = random.Random(record['seed'])
+        player = Player.from_dict(record['initial']['player1'])
+        npc = self._create_npc(record['difficulty'], player.level, rng)
+        turns, level_up = self._fight(player, npc, rng)
+        return {'npc': npc.name, 'turns': turns, 'level_up': level_up}
+    
+    async def _execute_bot_battle(self, query, player: Player, npc, rng: random.Random, instant: bool = False,
+                                  record: Dict = None) -> Dict:
+        """Resolve a battle against an NPC, then animate it or show a one-screen summary
         
-        battle_log = []
+        Returns the outcome in the form replay_battle() does.
+        """
+        # Deduct energy
+        player.energy -= BOT_BATTLE_ENERGY_COST
         
         # BATTLE INTRODUCTION
         intro_text = f"🤖 **BOT BATTLE START!** 🤖\n\n" \
@@ -126,71 +189,122 @@ class EnhancedCombatHandler:
                     f"{animations.generate_health_bar(player.health)} - YOU\n" \
                     f"{animations.generate_health_bar(npc.health, npc.max_health)} - {npc.name}"
         
-        await query.edit_message_text(intro_text, parse_mode='Markdown')
+        # The outcome is pure server-side RNG, so the whole fight is simulated up front
+        turns, level_up = self._fight(player, npc, rng)
+        outcome = {'npc': npc.name, 'turns': turns, 'level_up': level_up}
+        if record is not None:
+            logger.info("Bot battle", extra={
+                'event': 'bot_battle', 'battle_id': record['battle_id'], 'seed': record['seed'],
+                'difficulty': record['difficulty'], 'won': npc.health <= 0,
+            })
+        
+        # BATTLE RESULTS (saves the player once)
+        results_text, reply_markup = await self._battle_results(player, npc, level_up)
+        
+        if instant:
+            await outbound.edit_message_text(
+                query,
+                f"{self._battle_log(player, npc, turns)}\n\n{results_text}",
+                parse_mode='Markdown',
+                reply_markup=reply_markup
+            )
+            return outcome
         
-        # BATTLE ROUNDS (3 rounds max)
-        for round_num in range(1, 4):
+        # Play the whole fight on the battle message, landing on the results
+        frames = [intro_text] + self._turn_frames(player, npc, turns, rng) + [results_text]
+        renderer.spawn(query.message, frames, reply_markup=reply_markup)
+        return outcome
+    
+    def _simulate_fight(self, player: Player, npc, rng: random.Random) -> List[Dict]:
+        """Play out up to MAX_BOT_ROUNDS rounds, returning one entry per turn taken"""
+        turns = []
+        for round_num in range(1, MAX_BOT_ROUNDS + 1):
             if player.health <= 0 or npc.health <= 0:
                 break
             
-            await self._send_round_animation(query, round_num)
-            
             # Player turn
-            player_damage = combat_calc.calculate_damage(player, npc)
-            npc.take_damage(player_damage)
-            player_attack_text = animations.class_specific_attack(player.first_name, player.character_class)
-            player_damage_text = animations.damage_animation(player_damage)
-            
-            round_text = f"**Round {round_num}**\n\n" \
-                        f"{player_attack_text}\n" \
-                        f"{player_damage_text}\n\n" \
-                        f"{animations.generate_health_bar(player.health)} - YOU\n" \
-                        f"{animations.generate_health_bar(npc.health, npc.max_health)} - {npc.name}"
-            
-            await query.edit_message_text(round_text, parse_mode='Markdown')
-            await self._delay(2)
+            player_damage = combat_calc.calculate_damage(player, npc, rng)
+            dealt = npc.take_damage(player_damage)
+            turns.append({
+                'round': round_num, 'side': 'player', 'action': 'attack',
+                'damage': player_damage, 'dealt': dealt,
+                'player_health': player.health, 'npc_health': npc.health
+            })
             
             # Check if NPC defeated
             if npc.health <= 0:
                 break
             
             # NPC turn
-            npc_action = npc.choose_action(player.level)
+            npc_action = npc.choose_action(player.level, rng)
             if npc_action == "attack":
-                npc_damage = npc.calculate_damage()
-                player.health -= npc_damage
-                npc_attack_text = f"🤖 **{npc.name}** attacks!"
-                npc_damage_text = animations.damage_animation(npc_damage)
+                npc_damage = npc.calculate_damage(rng)
             elif npc_action == "defend":
+                npc_damage = 0
+            else:  # special
+                npc_damage = int(npc.calculate_damage(rng) * 1.5)
+            player.health -= npc_damage
+            turns.append({
+                'round': round_num, 'side': 'npc', 'action': npc_action,
+                'damage': npc_damage, 'dealt': npc_damage,
+                'player_health': player.health, 'npc_health': npc.health
+            })
+        return turns
+    
+    def _turn_frames(self, player: Player, npc, turns: List[Dict], rng: random.Random) -> List[str]:
+        """Animation frames for a simulated fight (drawn after the outcome, so they can't shift it)"""
+        frames = []
+        for turn in turns:
+            health_bars = f"{animations.generate_health_bar(turn['player_health'])} - YOU\n" \
+                         f"{animations.generate_health_bar(turn['npc_health'], npc.max_health)} - {npc.name}"
+            if turn['side'] == 'player':
+                frames.append(self._round_animation(turn['round'], rng))
+                player_attack_text = animations.class_specific_attack(player.first_name, player.character_class, rng)
+                frames.append(
+                    f"**Round {turn['round']}**\n\n"
+                    f"{player_attack_text}\n"
+                    f"{animations.damage_animation(turn['damage'])}\n\n"
+                    f"{health_bars}"
+                )
+                continue
+            
+            if turn['action'] == "attack":
+                npc_attack_text = f"🤖 **{npc.name}** attacks!"
+                npc_damage_text = animations.damage_animation(turn['damage'])
+            elif turn['action'] == "defend":
                 npc_attack_text = f"🛡️ **{npc.name}** defends! (Damage reduced next round)"
                 npc_damage_text = "No damage this round!"
             else:  # special
-                npc_damage = int(npc.calculate_damage() * 1.5)
-                player.health -= npc_damage
                 npc_attack_text = f"💫 **{npc.name}** uses SPECIAL MOVE!"
-                npc_damage_text = animations.damage_animation(npc_damage, critical=True)
-            
-            npc_round_text = f"**{npc.name}'s Turn:**\n\n" \
-                            f"{npc_attack_text}\n" \
-                            f"{npc_damage_text}\n\n" \
-                            f"{animations.generate_health_bar(player.health)} - YOU\n" \
-                            f"{animations.generate_health_bar(npc.health, npc.max_health)} - {npc.name}"
-            
-            await query.edit_message_text(npc_round_text, parse_mode='Markdown')
-            await self._delay(2)
-        
-        # BATTLE RESULTS
-        await self._battle_results(query, player, npc)
+                npc_damage_text = animations.damage_animation(turn['damage'], critical=True)
+            frames.append(
+                f"**{npc.name}'s Turn:**\n\n"
+                f"{npc_attack_text}\n"
+                f"{npc_damage_text}\n\n"
+                f"{health_bars}"
+            )
+        return frames
     
-    async def _send_round_animation(self, query, round_num):
-        """Send round animation"""
+    def _battle_log(self, player: Player, npc, turns: List[Dict]) -> str:
+        """Compact one-screen log of a simulated fight"""
+        lines = [f"⚡ **INSTANT BATTLE** vs **{npc.name}** (Level {npc.level})\n"]
+        for turn in turns:
+            if turn['side'] == 'player':
+                lines.append(f"R{turn['round']} 👊 You hit for {turn['dealt']} → {npc.name} ❤️ {turn['npc_health']}")
+            elif turn['action'] == "defend":
+                lines.append(f"R{turn['round']} 🛡️ {npc.name} defends")
+            else:
+                icon = "💫" if turn['action'] == "special" else "🤖"
+                lines.append(f"R{turn['round']} {icon} {npc.name} hits for {turn['dealt']} → You ❤️ {turn['player_health']}")
+        return "\n".join(lines)
+    
+    def _round_animation(self, round_num, rng: random.Random) -> str:
+        """Round banner frame"""
         animations = ["🥊", "💥", "⚡", "🔥", "🎯"]
-        anim_text = f"Round {round_num} " + "".join(random.sample(animations, 3))
-        await query.edit_message_text(anim_text)
-        await self._delay(1)
+        return f"Round {round_num} " + "".join(rng.sample(animations, 3))
     
-    async def _battle_results(self, query, player: Player, npc):
-        """Calculate and display battle results"""
+    async def _battle_results(self, player: Player, npc, level_up: bool):
+        """Calculate battle results, returning the results screen and its keyboard"""
         player_victory = npc.health <= 0
         
         if player_victory:
@@ -206,8 +320,8 @@ class EnhancedCombatHandler:
                           f"📈 +{rewards['exp']} Experience\n\n" \
                           f"**Final Health:** {player.health}/100"
             
-            # Check level up
-            if random.random() < 0.4:  # 40% chance to level up after victory
+            # Check level up (rolled with the rest of the fight)
+            if level_up:
                 player.level += 1
                 player.health = 100
                 player.energy = 50
@@ -227,32 +341,12 @@ class EnhancedCombatHandler:
                           f"Better luck next time!"
         
         # Save player progress
-        db.save_player(player)
+        await db.save_player(player)
         
         # Add continue button
-        keyboard = [
-            [InlineKeyboardButton("⚔️ Fight Again", callback_data="fight_bots")],
-            [InlineKeyboardButton("📊 My Profile", callback_data="my_profile")],
-            [InlineKeyboardButton("🎮 Main Menu", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.BOT_BATTLE_RESULTS
         
-        await query.edit_message_text(
-            victory_text,
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-    
-    async def _delay(self, seconds: int):
-        """Utility delay function"""
-        import asyncio
-        await asyncio.sleep(seconds)
+        return victory_text, reply_markup
 
 # Create handler instance
 combat_handler = EnhancedCombatHandler()
-
-# Handler registration
-def register_handlers(application):
-    application.add_handler(CallbackQueryHandler(combat_handler.combat_menu, pattern="^combat_menu$"))
-    application.add_handler(CallbackQueryHandler(combat_handler.bot_battle_menu, pattern="^fight_bots$"))
-    application.add_handler(CallbackQueryHandler(combat_handler.start_bot_battle, pattern="^bot_(easy|medium|hard)$"))
@@ -1,50 +1,71 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler
-from core.database import Database
-from handlers.combat_core import combat_core
-from handlers.animation import CombatAnimations
-import asyncio
+from telegram import Update
+from telegram.ext import ContextTypes
+from core.async_database import async_db
+from core.outbound import outbound
+from core import keyboards
+from core.frame_renderer import renderer
+from core.callback_codec import CallbackDecodeError, decode_battle_action
+from handlers.combat_core import combat_core, MATCH_TIMEOUT
+from utils.animation import CombatAnimations
+import functools
 
-db = Database()
+db = async_db
 animations = CombatAnimations()
 
-class CombatHandlers:
-    def __init__(self):
-        self.pending_battles = {}
+def single_flight(handler):
+    """Ignore a callback query identical to one that is still being handled
+
+    Rapid double-taps send the same callback_data twice; only the first one
+    runs, the duplicate just gets a toast.
+    """
+    in_flight = set()
+    
+    @functools.wraps(handler)
+    async def wrapper(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        key = (query.from_user.id, query.data)
+        if key in in_flight:
+            await query.answer("⏳ Already on it...")
+            return
+        
+        in_flight.add(key)
+        try:
+            return await handler(self, update, context)
+        finally:
+            in_flight.discard(key)
     
+    return wrapper
+
+class CombatHandlers:
     async def combat_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Main combat menu - called from your existing button handler"""
         query = update.callback_query
         await query.answer()
         
         user = query.from_user
-        player = db.get_player(user.id)
+        player = await db.get_player(user.id)
         
         if not player:
-            await query.edit_message_text(
+            await outbound.edit_message_text(
+                query,
                 "❌ You need to create a character first!",
                 parse_mode='Markdown'
             )
             return
         
         if player.energy < 10:
-            await query.edit_message_text(
+            await outbound.edit_message_text(
+                query,
                 f"⚡ Not enough energy! You have {player.energy}/50 energy.\n\n"
                 f"Wait for energy to regenerate or use energy drinks from the shop!",
                 parse_mode='Markdown'
             )
             return
         
-        keyboard = [
-            [InlineKeyboardButton("⚔️ 1v1 Quick Match", callback_data="combat_quick")],
-            [InlineKeyboardButton("🤖 Practice vs Bot", callback_data="combat_bot")],
-            [InlineKeyboardButton("👥 Gang War (Coming Soon)", callback_data="combat_gang")],
-            [InlineKeyboardButton("📊 My Combat Stats", callback_data="combat_stats")],
-            [InlineKeyboardButton("🔙 Main Menu", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.COMBAT_MENU
         
-        await query.edit_message_text(
+        await outbound.edit_message_text(
+            query,
             f"⚔️ **Combat Arena** ⚔️\n\n"
             f"Welcome, {player.first_name}!\n\n"
             f"**Your Stats:**\n"
@@ -57,22 +78,25 @@ class CombatHandlers:
             reply_markup=reply_markup
         )
     
+    @single_flight
     async def start_quick_match(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start quick PvP match with NPC fallback"""
         query = update.callback_query
         await query.answer()
         
         user = query.from_user
-        player = db.get_player(user.id)
+        player = await db.get_player(user.id)
         
         if not player or player.energy < 10:
-            await query.edit_message_text("❌ Cannot start battle!")
+            await outbound.edit_message_text(query, "❌ Cannot start battle!")
             return
         
         # Show searching animation
-        await query.edit_message_text(
+        await outbound.edit_message_text(
+            query,
             f"🔍 **Searching for opponent...**\n\n"
-            f"Looking for players with similar skill level...",
+            f"Looking for players with similar skill level...\n"
+            f"_A bot will step in if nobody is found in {MATCH_TIMEOUT}s._",
             parse_mode='Markdown'
         )
         
@@ -80,57 +104,51 @@ class CombatHandlers:
         battle_data = await combat_core.start_1v1_battle(user.id)
         
         if 'error' in battle_data:
-            await query.edit_message_text(
+            await outbound.edit_message_text(
+                query,
                 f"❌ {battle_data['error']}",
                 parse_mode='Markdown'
             )
             return
         
-        # Store battle info
-        self.pending_battles[user.id] = battle_data
-        
         # Show battle intro
+        prompt = "**Battle Started!** Choose your action:"
         if battle_data['type'] == 'pvp':
-            opponent = battle_data['players'][1]
+            # Both matched players land here, so pick whoever isn't us
+            opponent = next(p for p in battle_data['players'] if p.user_id != user.id)
             battle_text = f"🎯 **MATCH FOUND!**\n\n**Opponent:** {opponent.first_name}\n⭐ Level: {opponent.level}\n🎭 Class: {opponent.character_class.title()}"
+            if battle_data['players'][0].user_id != user.id:
+                prompt = f"**Battle Started!** ⏳ Waiting for {opponent.first_name}..."
         else:
             npc_data = battle_data['npc_data']
             battle_text = f"🤖 **BOT BATTLE**\n\n**Opponent:** {npc_data['name']}\n⭐ Level: {npc_data['level']}\n🎯 Difficulty: {npc_data['difficulty'].title()}"
         
         # Show battle actions
-        keyboard = [
-            [InlineKeyboardButton("💥 Attack", callback_data=f"battle_attack_{battle_data['battle_id']}")],
-            [InlineKeyboardButton("🛡️ Defend", callback_data=f"battle_defend_{battle_data['battle_id']}")],
-            [InlineKeyboardButton("✨ Special", callback_data=f"battle_special_{battle_data['battle_id']}")],
-            [InlineKeyboardButton("🏃 Escape", callback_data=f"battle_escape_{battle_data['battle_id']}")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Send battle intro animation
-        for frame in battle_data['intro_animation']:
-            await query.message.reply_text(frame, parse_mode='Markdown')
-            await asyncio.sleep(1.5)
-        
-        await query.message.reply_text(
-            f"{battle_text}\n\n"
-            f"**Battle Started!** Choose your action:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
+        reply_markup = keyboards.battle_actions(battle_data['handle'], combat_core.battles.epoch)
+        battle = combat_core.battles.get(battle_data['battle_id'])
+        if battle is not None:
+            # Remember each player's battle screen so both see every turn
+            battle.setdefault('messages', {})[user.id] = query.message
+        
+        # Play the intro on the searching message and land on the battle screen
+        frames = battle_data['intro_animation'] + [f"{battle_text}\n\n{prompt}"]
+        renderer.spawn(query.message, frames, reply_markup=reply_markup)
     
+    @single_flight
     async def start_bot_battle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start battle against NPC bot"""
         query = update.callback_query
         await query.answer()
         
         user = query.from_user
-        player = db.get_player(user.id)
+        player = await db.get_player(user.id)
         
         if not player or player.energy < 10:
-            await query.edit_message_text("❌ Cannot start battle!")
+            await outbound.edit_message_text(query, "❌ Cannot start battle!")
             return
         
-        await query.edit_message_text(
+        await outbound.edit_message_text(
+            query,
             f"🤖 **Creating bot opponent...**",
             parse_mode='Markdown'
         )
@@ -139,164 +157,167 @@ class CombatHandlers:
         battle_data = await combat_core.start_1v1_battle(user.id, is_bot=True)
         
         if 'error' in battle_data:
-            await query.edit_message_text(f"❌ {battle_data['error']}")
+            await outbound.edit_message_text(query, f"❌ {battle_data['error']}")
             return
         
-        # Store battle info
-        self.pending_battles[user.id] = battle_data
-        
         # Show battle actions
-        keyboard = [
-            [InlineKeyboardButton("💥 Attack", callback_data=f"battle_attack_{battle_data['battle_id']}")],
-            [InlineKeyboardButton("🛡️ Defend", callback_data=f"battle_defend_{battle_data['battle_id']}")],
-            [InlineKeyboardButton("✨ Special", callback_data=f"battle_special_{battle_data['battle_id']}")],
-            [InlineKeyboardButton("🏃 Escape", callback_data=f"battle_escape_{battle_data['battle_id']}")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Send battle intro animation
-        for frame in battle_data['intro_animation']:
-            await query.message.reply_text(frame, parse_mode='Markdown')
-            await asyncio.sleep(1.5)
+        reply_markup = keyboards.battle_actions(battle_data['handle'], combat_core.battles.epoch)
         
+        # Play the intro in place and land on the battle screen
         npc_data = battle_data['npc_data']
-        await query.message.reply_text(
+        frames = battle_data['intro_animation'] + [
             f"🤖 **BOT BATTLE STARTED!**\n\n"
             f"**Opponent:** {npc_data['name']}\n"
             f"⭐ Level: {npc_data['level']}\n"
             f"🎯 Difficulty: {npc_data['difficulty'].title()}\n"
             f"🧠 Personality: {npc_data['personality'].title()}\n\n"
             f"{animations.generate_health_bar(npc_data['health'])}\n\n"
-            f"**Choose your action:**",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
+            f"**Choose your action:**"
+        ]
+        renderer.spawn(query.message, frames, reply_markup=reply_markup)
     
+    @single_flight
     async def battle_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle battle actions"""
         query = update.callback_query
-        await query.answer()
         
         user = query.from_user
         data = query.data
         
-        # Extract action and battle_id
-        action_parts = data.split('_')
-        action = action_parts[1]
-        battle_id = '_'.join(action_parts[2:])
+        # Decode the action and the battle's handle
+        try:
+            action, handle, epoch = decode_battle_action(data)
+        except CallbackDecodeError:
+            battle = None
+        else:
+            battle = combat_core.battles.get_by_handle(handle, epoch)
+        if battle is None:
+            await query.answer()
+            await outbound.edit_message_text(query, "❌ This battle has ended or expired.")
+            return
+        battle_id = battle['battle_id']
         
         # Execute player's turn
-        result = await combat_core.execute_player_turn(battle_id, action)
+        result = await combat_core.execute_player_turn(battle_id, action, user_id=user.id)
         
-        if 'error' in result:
-            await query.edit_message_text(f"❌ {result['error']}")
+        if result.get('rejected'):
+            # Not our battle or not our turn: leave the battle screen alone
+            await query.answer(f"⏳ {result['error']}")
             return
+        await query.answer()
         
-        # Show action result
-        response_text = ""
-        
-        # Player's action
-        if 'animation' in result:
-            await query.message.reply_text(result['animation'], parse_mode='Markdown')
-            await asyncio.sleep(1)
-        
-        if 'damage_text' in result:
-            await query.message.reply_text(result['damage_text'], parse_mode='Markdown')
-            await asyncio.sleep(1)
+        if 'error' in result:
+            await outbound.edit_message_text(query, f"❌ {result['error']}")
+            return
         
-        # NPC's action (for PvE)
-        if 'npc_animation' in result:
-            await query.message.reply_text(result['npc_animation'], parse_mode='Markdown')
-            await asyncio.sleep(1)
+        # This turn's frames are played on the battle message itself
+        frames = self._turn_frames(result)
         
-        if 'npc_damage_text' in result:
-            await query.message.reply_text(result['npc_damage_text'], parse_mode='Markdown')
-            await asyncio.sleep(1)
+        if battle['type'] == 'pvp':
+            battle.setdefault('messages', {})[user.id] = query.message
+            self._show_pvp_turn(battle, result, user.id, frames, context)
+            return
         
         # Check if battle ended
         if result.get('battle_ended'):
             if result.get('rewards'):
                 # Victory with rewards
                 rewards = result['rewards']
-                victory_frames = animations.victory_celebration(user.first_name, rewards.get('cash', 0))
-                
-                for frame in victory_frames:
-                    await query.message.reply_text(frame, parse_mode='Markdown')
-                    await asyncio.sleep(1.5)
+                frames += animations.victory_celebration(user.first_name, rewards.get('cash', 0))
                 
                 # Show rewards
-                keyboard = [
-                    [InlineKeyboardButton("🛒 Spend Rewards", callback_data="shop")],
-                    [InlineKeyboardButton("⚔️ Fight Again", callback_data="combat_quick")],
-                    [InlineKeyboardButton("🎮 Main Menu", callback_data="main_menu")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = keyboards.BATTLE_VICTORY
                 
-                await query.message.reply_text(
+                frames.append(
                     f"🎊 **BATTLE COMPLETE!**\n\n"
                     f"**Rewards Earned:**\n"
                     f"💰 +${rewards.get('cash', 0)} Gold\n"
                     f"⭐ +{rewards.get('reputation', 0)} Reputation\n"
                     f"📈 +{rewards.get('exp', 0)} Experience\n\n"
-                    f"**What would you like to do?**",
-                    parse_mode='Markdown',
-                    reply_markup=reply_markup
+                    f"**What would you like to do?**"
                 )
             else:
                 # Defeat
-                keyboard = [
-                    [InlineKeyboardButton("⚔️ Try Again", callback_data="combat_quick")],
-                    [InlineKeyboardButton("🏥 Heal Up", callback_data="shop")],
-                    [InlineKeyboardButton("🎮 Main Menu", callback_data="main_menu")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = keyboards.BATTLE_DEFEAT
                 
-                await query.message.reply_text(
+                frames.append(
                     f"💀 **DEFEAT!**\n\n"
                     f"You were defeated in battle...\n\n"
-                    f"**Don't give up!** Heal up and try again!",
-                    parse_mode='Markdown',
-                    reply_markup=reply_markup
+                    f"**Don't give up!** Heal up and try again!"
                 )
-            
-            # Clear pending battle
-            self.pending_battles.pop(user.id, None)
+            renderer.spawn(query.message, frames, reply_markup=reply_markup)
             return
         
         # Battle continues - show next actions
-        player = db.get_player(user.id)
-        battle = combat_core.active_battles.get(battle_id, {})
-        
-        if battle.get('type') == 'pve':
-            npc = battle.get('npc', {})
-            npc_health = getattr(npc, 'health', 0)
-            npc_max_health = getattr(npc, 'max_health', 100)
-            
-            keyboard = [
-                [InlineKeyboardButton("💥 Attack", callback_data=f"battle_attack_{battle_id}")],
-                [InlineKeyboardButton("🛡️ Defend", callback_data=f"battle_defend_{battle_id}")],
-                [InlineKeyboardButton("✨ Special", callback_data=f"battle_special_{battle_id}")],
-                [InlineKeyboardButton("🏃 Escape", callback_data=f"battle_escape_{battle_id}")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+        player = battle['player1']
+        npc = battle['npc']
+        reply_markup = keyboards.battle_actions(handle, combat_core.battles.epoch)
+        
+        frames.append(
+            f"⚔️ **Battle Continues!**\n\n"
+            f"**Your Health:** {animations.generate_health_bar(player.health)}\n"
+            f"**{npc.name}'s Health:** {animations.generate_health_bar(npc.health, npc.max_health)}\n\n"
+            f"**Choose your next action:**"
+        )
+        renderer.spawn(query.message, frames, reply_markup=reply_markup)
+    
+    def _show_pvp_turn(self, battle, result, actor_id: int, frames, context):
+        """Play a PvP turn on both players' battle screens
+        
+        Each side gets the turn's frames and then its own view: victory or
+        defeat once the fight is over, otherwise whose move it is next.
+        """
+        players = {p.user_id: p for p in (battle['player1'], battle['player2'])}
+        reply_markup = keyboards.battle_actions(battle['handle'], combat_core.battles.epoch)
+        
+        for user_id, player in players.items():
+            opponent = next(p for uid, p in players.items() if uid != user_id)
+            if result.get('battle_ended'):
+                if result['winner'] == user_id:
+                    screen = [
+                        f"🏆 **VICTORY!**\n\n"
+                        f"You defeated {opponent.first_name}!\n\n"
+                        f"**What would you like to do?**"
+                    ]
+                    markup = keyboards.BATTLE_VICTORY
+                else:
+                    screen = [
+                        f"💀 **DEFEAT!**\n\n"
+                        f"You were defeated by {opponent.first_name}...\n\n"
+                        f"**Don't give up!** Heal up and try again!"
+                    ]
+                    markup = keyboards.BATTLE_DEFEAT
+            else:
+                your_turn = battle[battle['turn']].user_id == user_id
+                screen = [
+                    f"⚔️ **Battle Continues!**\n\n"
+                    f"**Your Health:** {animations.generate_health_bar(player.health)}\n"
+                    f"**{opponent.first_name}'s Health:** {animations.generate_health_bar(opponent.health)}\n\n"
+                    + ("**Your move!** Choose your action:" if your_turn
+                       else f"⏳ Waiting for {opponent.first_name}...")
+                ]
+                markup = reply_markup
             
-            await query.message.reply_text(
-                f"⚔️ **Battle Continues!**\n\n"
-                f"**Your Health:** {animations.generate_health_bar(player.health)}\n"
-                f"**{npc.name}'s Health:** {animations.generate_health_bar(npc_health, npc_max_health)}\n\n"
-                f"**Choose your next action:**",
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
+            message = battle.get('messages', {}).get(user_id)
+            if message is not None:
+                renderer.spawn(message, frames + screen, reply_markup=markup)
+            else:
+                # Joined without a battle screen of their own: just send the outcome
+                outbound.send(user_id, lambda user_id=user_id, text=screen[-1], markup=markup:
+                              context.bot.send_message(user_id, text, parse_mode='Markdown',
+                                                       reply_markup=markup))
+    
+    @staticmethod
+    def _turn_frames(result):
+        """Animation frames describing one executed turn"""
+        frames = []
+        for key in ('animation', 'damage_text', 'npc_animation', 'npc_damage_text', 'message'):
+            value = result.get(key)
+            if isinstance(value, list):
+                frames.extend(value)
+            elif value:
+                frames.append(value)
+        return frames
 
 # Create handler instance
 combat_handlers = CombatHandlers()
-
-# Handler registration function
-def get_combat_handlers():
-    return [
-        CallbackQueryHandler(combat_handlers.combat_menu, pattern="^combat$"),
-        CallbackQueryHandler(combat_handlers.start_quick_match, pattern="^combat_quick$"),
-        CallbackQueryHandler(combat_handlers.start_bot_battle, pattern="^combat_bot$"),
-        CallbackQueryHandler(combat_handlers.battle_action, pattern="^battle_"),
-    ]
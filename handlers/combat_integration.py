@@ -4,30 +4,35 @@ COMBAT SYSTEM INTEGRATION
 Connects the combat system to your main bot structure
 """
 
-from core.database import Database
+import logging
+from core.async_database import async_db
 from handlers.combat_core import combat_core
-from handlers.combat_handlers import get_combat_handlers
-from handlers.animation import CombatAnimations
-from handlers.npc import NPCFactory
+from handlers.combat_handlers import combat_handlers
+from handlers.combat_enhanced import combat_handler as bot_battle_handler
+from utils.animation import CombatAnimations
+from models.npc import NPCFactory
+
+logger = logging.getLogger(__name__)
 
 class CombatSystem:
     """Main combat system integration class"""
     
     def __init__(self):
-        self.db = Database()
+        self.db = async_db
         self.animations = CombatAnimations()
         self.core = combat_core
-        self.handlers = get_combat_handlers()
+        self.handlers = combat_handlers
+        self.bot_battles = bot_battle_handler
         
-        print("✅ Combat System Integrated Successfully!")
+        logger.info("Combat system loaded")
     
-    def get_handlers(self):
-        """Return all combat handlers for bot registration"""
-        return self.handlers
+    async def shutdown(self):
+        """Stop the matchmaker and battle sweeper"""
+        await shutdown_combat_system()
     
     async def initialize_player_combat(self, user_id: int):
         """Initialize player for combat - called when character is created"""
-        player = self.db.get_player(user_id)
+        player = await self.db.get_player(user_id)
         if player:
             # Ensure player has combat stats
             if not hasattr(player, 'health'):
@@ -41,13 +46,13 @@ class CombatSystem:
             if not hasattr(player, 'reputation'):
                 player.reputation = 0
             
-            self.db.save_player(player)
+            await self.db.save_player(player)
             return True
         return False
     
     async def get_player_combat_stats(self, user_id: int):
         """Get formatted combat stats for profile"""
-        player = self.db.get_player(user_id)
+        player = await self.db.get_player(user_id)
         if not player:
             return None
         
@@ -65,18 +70,9 @@ class CombatSystem:
 """
         return stats
     
-    async def process_energy_regen(self):
-        """Process energy regeneration for all players"""
-        # This would be called periodically (every hour)
-        all_players = self.db.get_all_players()
-        for player in all_players:
-            if player.energy < 50:
-                player.energy = min(50, player.energy + 5)
-                self.db.save_player(player)
-    
     async def award_victory_rewards(self, user_id: int, rewards: dict):
         """Award combat rewards to player"""
-        player = self.db.get_player(user_id)
+        player = await self.db.get_player(user_id)
         if player:
             player.gold += rewards.get('cash', 0)
             player.reputation += rewards.get('reputation', 0)
@@ -89,7 +85,7 @@ class CombatSystem:
                 player.level += 1
                 player.reputation = 0  # Reset for next level
             
-            self.db.save_player(player)
+            await self.db.save_player(player)
             
             # Return level up info if applicable
             if player.level > old_level:
@@ -106,20 +102,10 @@ class CombatSystem:
 # Global combat system instance
 combat_system = CombatSystem()
 
-# Integration functions for your core/bot.py
-def integrate_combat_system(application):
-    """Integrate combat system into main bot - call this from core/bot.py"""
-    try:
-        # Add all combat handlers
-        combat_handlers = combat_system.get_handlers()
-        for handler in combat_handlers:
-            application.add_handler(handler)
-        
-        print("🎯 Combat System: Handlers integrated successfully!")
-        return True
-    except Exception as e:
-        print(f"❌ Combat System Integration Failed: {e}")
-        return False
+async def shutdown_combat_system():
+    """Stop combat background services - call this on bot shutdown"""
+    await combat_core.matchmaker.stop()
+    await combat_core.battles.stop()
 
 def get_combat_integration():
     """Return combat system for use in other modules"""
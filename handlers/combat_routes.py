@@ -0,0 +1,24 @@
+from core.callback_codec import BATTLE_PREFIX
+
+# Combat buttons as (callback_data key, CombatHandlers method, prefix, block)
+#
+# Kept apart from combat_handlers so core/bot.py can register the routes
+# without importing the combat subsystem; it is loaded on the first tap.
+COMBAT_ROUTES = (
+    ("combat", "combat_menu", False, True),
+    # Non-blocking: waiting for the matchmaker must not hold up other updates
+    ("combat_quick", "start_quick_match", False, False),
+    ("combat_bot", "start_bot_battle", False, True),
+    (BATTLE_PREFIX, "battle_action", True, True),
+    # Old-style "battle_..." buttons still get a polite "expired" reply
+    ("battle_", "battle_action", True, True),
+)
+
+# Instant-resolve bot battles, same layout but EnhancedCombatHandler methods
+BOT_BATTLE_ROUTES = (
+    ("fight_bots", "bot_battle_menu", False, True),
+    ("bot_easy", "start_bot_battle", False, True),
+    ("bot_medium", "start_bot_battle", False, True),
+    ("bot_hard", "start_bot_battle", False, True),
+    ("bot_instant_toggle", "toggle_instant_mode", False, True),
+)
@@ -0,0 +1,222 @@
+# handlers/matchmaking.py
+import asyncio
+import bisect
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class QueueEntry:
+    user_id: int
+    level: int
+    joined_at: float
+    eligible: bool = True
+
+class MatchmakingQueue:
+    """Waiting PvP players bucketed by level
+
+    Eligible players (health > 0, energy >= 10, cached when they join or are
+    refreshed) sit in an insertion-ordered dict per level, so leaving or
+    cancelling removes the entry in O(1) and nothing stale is left behind.
+    The non-empty levels are kept in a sorted list, so Matchmaker can walk
+    everyone by level with no database reads. The allowed level gap starts at base_window and widens
+    by one every widen_every seconds a player has been waiting.
+    """
+
+    def __init__(self, base_window: int = 2, widen_every: float = 15.0, max_window: int = 10):
+        self.base_window = base_window
+        self.widen_every = widen_every
+        self.max_window = max_window
+        self._entries: Dict[int, QueueEntry] = {}
+        self._buckets: Dict[int, Dict[int, QueueEntry]] = {}  # level -> user_id -> entry, oldest first
+        self._levels: List[int] = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id: int):
+        return user_id in self._entries
+
+    @staticmethod
+    def is_eligible(player) -> bool:
+        return player.health > 0 and player.energy >= 10
+
+    def window(self, entry: QueueEntry, now: float) -> int:
+        """Level gap this entry currently accepts"""
+        widened = int((now - entry.joined_at) // self.widen_every)
+        return min(self.max_window, self.base_window + widened)
+
+    def add(self, player, now: float = None) -> QueueEntry:
+        """Queue a player, or refresh their cached level and eligibility"""
+        now = time.monotonic() if now is None else now
+        eligible = self.is_eligible(player)
+        entry = self._entries.get(player.user_id)
+        if entry is not None:
+            if entry.level == player.level and entry.eligible == eligible:
+                return entry
+            self._unlink(entry)
+            entry = QueueEntry(player.user_id, player.level, entry.joined_at)
+        else:
+            entry = QueueEntry(player.user_id, player.level, now)
+
+        self._entries[player.user_id] = entry
+        entry.eligible = eligible
+        if eligible:
+            self._link(entry)
+        return entry
+
+    def remove(self, user_id: int) -> bool:
+        """Take a player out of the queue"""
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return False
+        self._unlink(entry)
+        return True
+
+    def entries_by_level(self) -> List[QueueEntry]:
+        """Every eligible entry, by level and then by time waited"""
+        return [
+            entry
+            for level in self._levels
+            for entry in self._buckets[level].values()
+        ]
+
+    def _link(self, entry: QueueEntry):
+        bucket = self._buckets.get(entry.level)
+        if bucket is None:
+            bucket = self._buckets[entry.level] = {}
+            bisect.insort(self._levels, entry.level)
+        bucket[entry.user_id] = entry
+
+    def _unlink(self, entry: QueueEntry):
+        """Take an entry out of its level bucket, dropping the level once empty"""
+        bucket = self._buckets.get(entry.level)
+        if bucket is None or bucket.get(entry.user_id) is not entry:
+            return
+        del bucket[entry.user_id]
+        if not bucket:
+            del self._buckets[entry.level]
+            self._levels.pop(bisect.bisect_left(self._levels, entry.level))
+
+    def stats(self) -> Dict:
+        return {
+            'waiting': len(self._entries),
+            'eligible': sum(len(bucket) for bucket in self._buckets.values()),
+            'levels': len(self._levels),
+        }
+
+
+class Matchmaker:
+    """Background service pairing queued players in batches
+
+    Instead of matching inline when a player joins, a task on the event
+    loop wakes up every tick_interval seconds, sorts everyone waiting by
+    level and pairs neighbours with the smallest level gaps first (one
+    sort-and-sweep per tick instead of a scan per join). on_match(a, b) is
+    awaited once per pair and its result is handed to both waiting players.
+    """
+
+    def __init__(self, on_match: Callable[[int, int], Awaitable], queue: MatchmakingQueue = None,
+                 tick_interval: float = 0.5):
+        self.on_match = on_match
+        self.queue = queue or MatchmakingQueue()
+        self.tick_interval = tick_interval
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._task = None
+
+    async def request_match(self, player, timeout: float = 10.0):
+        """Queue a player and wait for a match
+
+        Returns on_match's result, or None if nobody was found in time.
+        """
+        self.start()
+        future = self._waiters.get(player.user_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters[player.user_id] = future
+        self.queue.add(player)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if self._waiters.get(player.user_id) is future:
+                # Not claimed by a tick, give up on PvP
+                del self._waiters[player.user_id]
+                self.queue.remove(player.user_id)
+                return None
+            # A tick is creating our match right now
+            return await future
+
+    def cancel(self, user_id: int):
+        """Withdraw a player from matchmaking"""
+        self.queue.remove(user_id)
+        future = self._waiters.pop(user_id, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def pair(self, now: float = None) -> List[Tuple[QueueEntry, QueueEntry]]:
+        """Best-fit pairing of everyone waiting, removing paired players from the queue"""
+        now = time.monotonic() if now is None else now
+        entries = self.queue.entries_by_level()
+
+        candidates = []
+        for index, (first, second) in enumerate(zip(entries, entries[1:])):
+            gap = second.level - first.level
+            if gap <= max(self.queue.window(first, now), self.queue.window(second, now)):
+                # Smallest gap first, then whoever has waited longest
+                candidates.append((gap, min(first.joined_at, second.joined_at), index))
+        candidates.sort()
+
+        used = set()
+        pairs = []
+        for _, _, index in candidates:
+            if index in used or index + 1 in used:
+                continue
+            used.update((index, index + 1))
+            pairs.append((entries[index], entries[index + 1]))
+
+        for first, second in pairs:
+            self.queue.remove(first.user_id)
+            self.queue.remove(second.user_id)
+        return pairs
+
+    async def tick(self):
+        """Run one batch of pairing and notify the matched players"""
+        for first, second in self.pair():
+            waiters = [self._waiters.pop(entry.user_id, None) for entry in (first, second)]
+            try:
+                result = await self.on_match(first.user_id, second.user_id)
+            except Exception:
+                logger.exception("Creating match %s vs %s failed", first.user_id, second.user_id)
+                result = None
+            for future in waiters:
+                if future is not None and not future.done():
+                    future.set_result(result)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Matchmaker tick failed")
+
+    def start(self):
+        """Start the tick task on the running event loop (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop ticking and release everyone still waiting"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for user_id in list(self._waiters):
+            self.cancel(user_id)
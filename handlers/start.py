@@ -1,16 +1,20 @@
+import logging
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
-from core.database import Database
+from core.async_database import async_db
+from core.outbound import outbound
 from models.player import Player
 
-# Initialize database
-db = Database()
+logger = logging.getLogger(__name__)
+
+# Shared async database facade
+db = async_db
 
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     # Check if player already exists
-    existing_player = db.get_player(user.id)
+    existing_player = await db.get_player(user.id)
     
     if existing_player:
         # Welcome back existing player
@@ -39,20 +43,22 @@ Your criminal empire awaits...
 Use /create to begin your journey!
         """
     
-    await update.message.reply_text(
+    await outbound.reply_text(
+        update.message,
         welcome_text,
         parse_mode='Markdown'
     )
-    print(f"✅ User accessed: {user.first_name} (ID: {user.id})")
+    logger.info("User accessed", extra={'event': 'user_access', 'user_id': user.id})
 
 async def create_character_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start character creation process"""
     user = update.effective_user
     
     # Check if player already exists
-    existing_player = db.get_player(user.id)
+    existing_player = await db.get_player(user.id)
     if existing_player:
-        await update.message.reply_text(
+        await outbound.reply_text(
+            update.message,
             f"⚠️ You already have a character!\n\n"
             f"Use /profile to see your stats.\n"
             f"Use /create again to reset your character (this will delete your progress!).",
@@ -67,7 +73,8 @@ async def create_character_handler(update: Update, context: ContextTypes.DEFAULT
     
     reply_markup = ReplyKeyboardMarkup(character_options, one_time_keyboard=True)
     
-    await update.message.reply_text(
+    await outbound.reply_text(
+        update.message,
         "**Choose your criminal specialty:**\n\n"
         "🎯 **Enforcer** - Strong in combat, extra health\n"
         "💻 **Hacker** - Better income, stealth operations\n"  
@@ -105,12 +112,13 @@ async def handle_class_selection(update: Update, context: ContextTypes.DEFAULT_T
         )
         
         # Save to database
-        db.save_player(new_player)
+        await db.save_player(new_player)
         
         # Clear the state
         context.user_data['awaiting_class'] = False
         
-        await update.message.reply_text(
+        await outbound.reply_text(
+            update.message,
             f"🎉 **Character Created!**\n\n"
             f"Welcome, {new_player.first_name} the {class_name.title()}!\n\n"
             f"{new_player.get_stats()}\n\n"
@@ -119,9 +127,10 @@ async def handle_class_selection(update: Update, context: ContextTypes.DEFAULT_T
             parse_mode='Markdown',
             reply_markup=None  # Remove keyboard
         )
-        print(f"✅ New character created: {user.first_name} as {class_name}")
+        logger.info("New character created", extra={'event': 'character_created', 'user_id': user.id, 'character_class': class_name})
     else:
-        await update.message.reply_text(
+        await outbound.reply_text(
+            update.message,
             "❌ Please select a valid class from the options!",
             reply_markup=None
         )
@@ -129,16 +138,18 @@ async def handle_class_selection(update: Update, context: ContextTypes.DEFAULT_T
 async def profile_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show player profile"""
     user = update.effective_user
-    player = db.get_player(user.id)
+    player = await db.get_player(user.id)
     
     if player:
-        await update.message.reply_text(
+        await outbound.reply_text(
+            update.message,
             f"📊 **Your Criminal Profile**\n\n"
             f"{player.get_stats()}",
             parse_mode='Markdown'
         )
     else:
-        await update.message.reply_text(
+        await outbound.reply_text(
+            update.message,
             "❌ You don't have a character yet! Use /create to start your criminal journey.",
             parse_mode='Markdown'
         )
@@ -8,19 +8,24 @@ project_root = os.path.dirname(os.path.abspath(__file__))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+from core.services import services
+from core.logging_config import configure_logging
+
+# Structured logs written off the event loop; see core/logging_config.py for LOG_* settings
+configure_logging()
 
 def main():
     try:
-        from core.bot import MafiaBot
-        bot = MafiaBot()
+        with services.phase("telegram"):
+            import telegram.ext
+        with services.phase("core.bot"):
+            from core.bot import MafiaBot
+        with services.phase("MafiaBot()"):
+            bot = MafiaBot()
         bot.run()
     except Exception as e:
-        print(f"❌ Failed to start bot: {e}")
-        print("💡 Make sure you have created a .env file with BOT_TOKEN!")
+        logging.getLogger(__name__).exception("Failed to start bot: %s", e)
+        logging.getLogger(__name__).error("Make sure you have created a .env file with BOT_TOKEN!")
 
 if __name__ == '__main__':
     main()
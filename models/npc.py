@@ -2,6 +2,13 @@ import random
 from dataclasses import dataclass
 from typing import Dict, List
 
+# Weighted action pools the NPC AI picks from, by personality
+PERSONALITY_ACTIONS = {
+    "aggressive": ["attack"] * 8 + ["special"] * 2,
+    "defensive": ["defend"] * 6 + ["attack"] * 4,
+    "tricky": ["attack"] * 5 + ["special"] * 3 + ["defend"] * 2,
+}
+
 @dataclass
 class NPC:
     name: str
@@ -21,21 +28,15 @@ class NPC:
     special_ability: str = None
     special_cooldown: int = 0
     
-    def choose_action(self, player_level: int) -> str:
+    def choose_action(self, player_level: int, rng: random.Random = None) -> str:
         """AI decision making based on personality"""
-        if self.personality == "aggressive":
-            choices = ["attack"] * 8 + ["special"] * 2
-        elif self.personality == "defensive":
-            choices = ["defend"] * 6 + ["attack"] * 4
-        else:  # tricky
-            choices = ["attack"] * 5 + ["special"] * 3 + ["defend"] * 2
-        
-        return random.choice(choices)
+        choices = PERSONALITY_ACTIONS.get(self.personality, PERSONALITY_ACTIONS["tricky"])
+        return (rng or random).choice(choices)
     
-    def calculate_damage(self) -> int:
+    def calculate_damage(self, rng: random.Random = None) -> int:
         """Calculate NPC damage with randomness"""
         base_damage = self.level * 5
-        damage = int(base_damage * self.damage_multiplier * random.uniform(0.8, 1.2))
+        damage = int(base_damage * self.damage_multiplier * (rng or random).uniform(0.8, 1.2))
         return max(5, damage)
     
     def take_damage(self, damage: int) -> int:
@@ -44,9 +45,9 @@ class NPC:
         self.health = max(0, self.health - actual_damage)
         return actual_damage
     
-    def should_escape(self) -> bool:
+    def should_escape(self, rng: random.Random = None) -> bool:
         """Check if NPC tries to escape"""
-        return random.random() < self.escape_chance
+        return (rng or random).random() < self.escape_chance
     
     def get_rewards(self) -> Dict:
         """Rewards for defeating this NPC"""
@@ -63,13 +64,18 @@ class NPC:
             return {"cash": base_cash * 5, "reputation": base_reputation * 5, "exp": 50}
 
 class NPCFactory:
-    """Factory to create different types of NPCs"""
+    """Factory to create different types of NPCs
+
+    Every factory takes an optional rng (a random.Random) so seeded battles
+    get the same NPC every time.
+    """
     
     @staticmethod
-    def create_street_thug(level: int) -> NPC:
+    def create_street_thug(level: int, rng: random.Random = None) -> NPC:
+        rng = rng or random
         names = ["Street Thug", "Alley Punk", "Backstreet Bully", "Rookie Gangster"]
         return NPC(
-            name=random.choice(names),
+            name=rng.choice(names),
             level=level,
             health=80 + (level * 5),
             max_health=80 + (level * 5),
@@ -81,15 +87,16 @@ class NPCFactory:
         )
     
     @staticmethod
-    def create_gang_member(level: int) -> NPC:
+    def create_gang_member(level: int, rng: random.Random = None) -> NPC:
+        rng = rng or random
         names = ["Gang Member", "Mafia Soldier", "Crew Enforcer", "Syndicate Thug"]
         return NPC(
-            name=random.choice(names),
+            name=rng.choice(names),
             level=level + 1,
             health=100 + (level * 6),
             max_health=100 + (level * 6),
-            character_class=random.choice(["enforcer", "smuggler"]),
-            personality=random.choice(["aggressive", "defensive"]),
+            character_class=rng.choice(["enforcer", "smuggler"]),
+            personality=rng.choice(["aggressive", "defensive"]),
             difficulty="medium",
             damage_multiplier=1.0,
             defense_multiplier=1.0,
@@ -97,13 +104,14 @@ class NPCFactory:
         )
     
     @staticmethod
-    def create_mafia_boss(level: int) -> NPC:
+    def create_mafia_boss(level: int, rng: random.Random = None) -> NPC:
+        rng = rng or random
         bosses = [
             {"name": "Tony 'The Shark'", "class": "enforcer", "personality": "aggressive"},
             {"name": "Vinnie 'The Ghost'", "class": "smuggler", "personality": "tricky"},
             {"name": "Don 'The Brain'", "class": "hacker", "personality": "defensive"}
         ]
-        boss = random.choice(bosses)
+        boss = rng.choice(bosses)
         return NPC(
             name=boss["name"],
             level=level + 3,
@@ -119,10 +127,11 @@ class NPCFactory:
         )
     
     @staticmethod
-    def create_police_officer(level: int) -> NPC:
+    def create_police_officer(level: int, rng: random.Random = None) -> NPC:
+        rng = rng or random
         ranks = ["Officer", "Detective", "Sergeant", "Lieutenant"]
         return NPC(
-            name=f"{random.choice(ranks)} {random.choice(['Miller', 'Johnson', 'Davis', 'Rodriguez'])}",
+            name=f"{rng.choice(ranks)} {rng.choice(['Miller', 'Johnson', 'Davis', 'Rodriguez'])}",
             level=level + 2,
             health=120 + (level * 7),
             max_health=120 + (level * 7),
@@ -1,6 +1,23 @@
-from dataclasses import dataclass
-from typing import Optional
-from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from datetime import datetime, timedelta
+
+# Numeric columns persisted as relative increments (cash = cash + ?) so a
+# concurrent writer's change to the same counter is never overwritten
+COUNTER_FIELDS = ('cash', 'reputation')
+
+# Regeneration is computed lazily from last_regen_at whenever a player is
+# read, so idle players cost nothing: every tick restores energy and health
+MAX_HEALTH = 100
+MAX_ENERGY = 50
+REGEN_TICK_SECONDS = 300  # 1 energy per 5 minutes
+ENERGY_PER_TICK = 1
+HEALTH_PER_TICK = 2
+
+REGEN_FIELDS = {'energy': MAX_ENERGY, 'health': MAX_HEALTH}
+
+# Fields shown on the stat card; changing one bumps Player.version
+CARD_FIELDS = frozenset(('first_name', 'character_class', 'level', 'cash', 'health', 'energy', 'reputation'))
 
 @dataclass
 class Player:
@@ -14,10 +31,38 @@ class Player:
     energy: int = 50
     reputation: int = 0
     created_at: Optional[str] = None
+    last_regen_at: Optional[str] = None
+    # Column values as last written to / read from the database (None = never saved)
+    _saved: Optional[Dict] = field(default=None, init=False, repr=False, compare=False)
+    # Bumped on every change to a CARD_FIELDS value; get_stats() caches per version
+    _version: int = field(default=0, init=False, repr=False, compare=False)
+    _card: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name, value):
+        if name in CARD_FIELDS and self.__dict__.get(name, value) != value:
+            object.__setattr__(self, '_version', self._version + 1)
+            if name in REGEN_FIELDS and self._is_full() and value < REGEN_FIELDS[name]:
+                # Start the regen clock when a full stat first drops, so time
+                # spent full isn't banked as instant regeneration
+                object.__setattr__(self, 'last_regen_at', datetime.now().isoformat())
+        object.__setattr__(self, name, value)
+    
+    def _is_full(self) -> bool:
+        """True once the object is initialised with energy and health at their caps"""
+        values = self.__dict__
+        return 'last_regen_at' in values and all(
+            values.get(name, 0) >= cap for name, cap in REGEN_FIELDS.items()
+        )
+    
+    @property
+    def version(self) -> int:
+        return self._version
     
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now().isoformat()
+        if self.last_regen_at is None:
+            self.last_regen_at = self.created_at
     
     def to_dict(self):
         """Convert player to dictionary for storage"""
@@ -31,7 +76,8 @@ class Player:
             'health': self.health,
             'energy': self.energy,
             'reputation': self.reputation,
-            'created_at': self.created_at
+            'created_at': self.created_at,
+            'last_regen_at': self.last_regen_at
         }
     
     @classmethod
@@ -39,14 +85,65 @@ class Player:
         """Create player from dictionary"""
         return cls(**data)
     
+    def apply_regen(self, now: Optional[datetime] = None) -> bool:
+        """Add the energy and health regenerated since last_regen_at
+
+        Only whole ticks are consumed, so partial progress carries over to
+        the next read. Returns True if any stat changed.
+        """
+        if self._is_full():
+            # Nothing to regenerate; the clock restarts when a stat drops (see __setattr__)
+            return False
+        now = now or datetime.now()
+        
+        last_regen = datetime.fromisoformat(self.last_regen_at)
+        ticks = int((now - last_regen).total_seconds() // REGEN_TICK_SECONDS)
+        if ticks <= 0:
+            return False
+        
+        old_energy, old_health = self.energy, self.health
+        self.energy = max(self.energy, min(MAX_ENERGY, self.energy + ticks * ENERGY_PER_TICK))
+        self.health = max(self.health, min(MAX_HEALTH, self.health + ticks * HEALTH_PER_TICK))
+        self.last_regen_at = (last_regen + timedelta(seconds=ticks * REGEN_TICK_SECONDS)).isoformat()
+        return (self.energy, self.health) != (old_energy, old_health)
+    
+    def mark_saved(self):
+        """Remember the current values as what the database holds"""
+        self._saved = self.to_dict()
+    
+    def is_new(self) -> bool:
+        """True until the player has been inserted into the database"""
+        return self._saved is None
+    
+    def get_changes(self) -> Dict:
+        """Columns modified since the last save, mapped to their new values"""
+        current = self.to_dict()
+        if self._saved is None:
+            return current
+        return {key: value for key, value in current.items() if self._saved.get(key) != value}
+    
+    def get_saved_value(self, key: str):
+        """Value of a column as the database last saw it"""
+        return self._saved.get(key) if self._saved else None
+    
+    def copy(self) -> "Player":
+        """Independent copy that keeps the saved-state tracking"""
+        clone = Player.from_dict(self.to_dict())
+        clone._saved = self._saved
+        return clone
+    
     def get_stats(self):
-        """Get formatted player stats"""
-        return f"""
+        """Get formatted player stats (re-rendered only after a change)"""
+        if self._card is not None and self._card[0] == self._version:
+            return self._card[1]
+        card = f"""
 👤 **{self.first_name}** ({self.character_class.title()})
 ⭐ Level: {self.level} | 💰 Cash: ${self.cash}
 ❤️ Health: {self.health} | ⚡ Energy: {self.energy}
 🎯 Reputation: {self.reputation}
         """
+        self._card = (self._version, card)
+        return card
 
 # Test the player class
 if __name__ == "__main__":
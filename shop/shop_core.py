@@ -1,7 +1,7 @@
-from core.database import Database
+from core.async_database import async_db
 from models.player import Player
 
-db = Database()
+db = async_db
 
 class ShopCore:
     def __init__(self):
@@ -93,9 +93,9 @@ class ShopCore:
         
         return True, "Can purchase"
     
-    def purchase_item(self, user_id, category, item_id):
+    async def purchase_item(self, user_id, category, item_id):
         """Process item purchase"""
-        player = db.get_player(user_id)
+        player = await db.get_player(user_id)
         if not player:
             return False, "Player not found"
         
@@ -122,8 +122,9 @@ class ShopCore:
         # Apply item effects
         purchase_message = self._apply_item_effects(player, item_data, item_id)
         
-        # Save player
-        db.save_player(player)
+        # Save player and make sure the purchase is on disk before confirming
+        await db.save_player(player)
+        await db.flush()
         
         return True, purchase_message
     
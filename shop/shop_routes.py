@@ -0,0 +1,9 @@
+# Shop buttons as (callback_data key, shop_handlers function, prefix, block)
+#
+# Kept apart from shop_handlers so core/bot.py can register the routes
+# without importing the shop; it is loaded on the first tap.
+SHOP_ROUTES = (
+    ("shop", "shop_main_menu", False, True),
+    ("shop_category_", "shop_category_menu", True, True),
+    ("shop_buy_", "shop_purchase_handler", True, True),
+)
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+# The repo root is a package itself, so put it on the path for "core", "handlers", ...
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("METRICS_PORT", "0")
+
+from models.player import Player
+
+class FakeDatabase:
+    """In-memory stand-in for the async database facade handlers talk to"""
+
+    def __init__(self, *players):
+        self.players = {p.user_id: p for p in players}
+        self.saved = []  # One list of players per save call
+
+    def add(self, *players):
+        self.players.update((p.user_id, p) for p in players)
+        return players[0] if len(players) == 1 else players
+
+    async def get_player(self, user_id):
+        if user_id not in self.players:
+            self.players[user_id] = make_player(user_id)
+        return self.players[user_id]
+
+    async def get_players(self, user_ids):
+        return {user_id: self.players[user_id] for user_id in user_ids if user_id in self.players}
+
+    async def save_player(self, player):
+        self.saved.append([player])
+
+    async def save_players(self, players):
+        self.saved.append(list(players))
+
+def make_player(user_id: int, **stats) -> Player:
+    return Player(user_id, f"user{user_id}", f"User{user_id}", **stats)
+
+@pytest.fixture
+def player():
+    """Factory: player(user_id, **stats) -> a fresh, never saved Player"""
+    return make_player
+
+@pytest.fixture
+def loaded():
+    """Factory for players as read back from the database (no pending changes)"""
+    def load(user_id: int, **stats) -> Player:
+        fresh = make_player(user_id, **stats)
+        fresh.mark_saved()
+        return fresh
+    return load
+
+@pytest.fixture
+def fake_db():
+    return FakeDatabase()
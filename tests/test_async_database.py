@@ -0,0 +1,26 @@
+import asyncio
+
+from core.async_database import AsyncDatabase
+from core.database import Database
+
+def test_save_player_is_written_behind_in_one_batch(tmp_path, player):
+    async def scenario():
+        facade = AsyncDatabase(Database(str(tmp_path / "test.db")))
+        try:
+            for user_id in (1, 2, 3):
+                await facade.save_player(player(user_id))
+            assert facade.db.write_transactions == 0
+
+            await facade.flush()
+            assert facade.db.write_transactions == 1
+            assert facade.db.players_written == 3
+            assert facade.cache.dirty_count == 0
+
+            # Nothing changed, so nothing is written again
+            await facade.flush()
+            assert facade.db.write_transactions == 1
+            assert (await facade.get_player(2)).first_name == "User2"
+        finally:
+            facade.close()
+
+    asyncio.run(scenario())
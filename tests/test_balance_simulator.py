@@ -0,0 +1,26 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.balance_simulator import BalanceSimulator
+
+def outcomes(report):
+    return [(r.character_class, r.level, r.archetype, r.wins, r.cash_total, r.reputation_total, r.ttk_counts)
+            for r in report.results]
+
+def sweep(seed, processes=1):
+    simulator = BalanceSimulator(npc_variants=8)
+    return simulator.sweep([1, 10], 2000, classes=("enforcer", "hacker"),
+                           archetypes=("street_thug", "gang_member"), processes=processes, seed=seed)
+
+def test_same_seed_reproduces_the_sweep():
+    assert outcomes(sweep(1234)) == outcomes(sweep(1234))
+
+def test_different_seeds_differ():
+    assert outcomes(sweep(1234)) != outcomes(sweep(4321))
+
+def test_npc_tables_come_from_the_seed():
+    first = BalanceSimulator(npc_variants=32, seed=7)._npc_table('gang_member', 5)
+    second = BalanceSimulator(npc_variants=32, seed=7)._npc_table('gang_member', 5)
+    for key in first:
+        assert np.array_equal(first[key], second[key])
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+
+from handlers.battle_registry import BattleRegistry
+from handlers.combat_core import CombatCore
+
+def battle(battle_id: str, *players) -> dict:
+    entry = {'battle_id': battle_id}
+    for key, participant in zip(('player1', 'player2'), players):
+        entry[key] = participant
+    return entry
+
+def test_lookup_by_id_user_and_handle(player):
+    registry = BattleRegistry()
+    added = registry.add(battle("b1", player(1), player(2)), now=0)
+
+    assert registry.get("b1") is added
+    assert registry.get_by_user(2) == [added]
+    assert registry.get_by_handle(added['handle'], registry.epoch) is added
+    assert registry.get_by_handle(added['handle'], registry.epoch ^ 1) is None
+
+def test_duplicate_id_is_rejected(player):
+    registry = BattleRegistry()
+    first = registry.add(battle("b1", player(1)), now=0)
+    with pytest.raises(ValueError):
+        registry.add(battle("b1", player(2)), now=0)
+    assert registry.get("b1") is first
+    assert registry.get_by_user(2) == []
+
+def test_idle_battles_expire_after_ttl(player):
+    registry = BattleRegistry(idle_ttl=10)
+    registry.add(battle("b1", player(1)), now=0)
+    registry.add(battle("b2", player(2)), now=5)
+
+    assert registry.pop_expired(now=9) == []
+    assert [b['battle_id'] for b in registry.pop_expired(now=10)] == ["b1"]
+    assert "b1" not in registry and registry.get_by_user(1) == []
+    assert [b['battle_id'] for b in registry.pop_expired(now=15)] == ["b2"]
+    assert len(registry) == 0
+
+def test_activity_postpones_expiry(player):
+    registry = BattleRegistry(idle_ttl=10)
+    registry.add(battle("b1", player(1)), now=0)
+    registry.touch("b1", now=8)
+
+    assert registry.pop_expired(now=12) == []
+    assert [b['battle_id'] for b in registry.pop_expired(now=18)] == ["b1"]
+
+def test_ended_battles_are_not_expired(player):
+    registry = BattleRegistry(idle_ttl=10)
+    registry.add(battle("b1", player(1)), now=0)
+    registry.remove("b1")
+    assert registry.pop_expired(now=100) == []
+
+def test_expired_battle_is_dropped_without_touching_energy(player, fake_db):
+    async def scenario():
+        core = CombatCore(seed=1)
+        live = fake_db.add(player(1, energy=20))
+        core.db = fake_db
+        core.battles = BattleRegistry(idle_ttl=10, on_expire=core._expire_battle)
+        data = await core.execute_npc_battle(live)
+        await core.execute_player_turn(data['battle_id'], 'defend', user_id=1)
+
+        assert await core.battles.reap(now=time.monotonic() + 11) == 1
+        await core.battles.stop()
+        return core, live, data
+
+    core, live, data = asyncio.run(scenario())
+    assert live.energy == 20
+    assert data['battle_id'] not in core.battles
+    assert core.battles.get_by_user(1) == []
+    assert core.battles.expired_total == 1
+
+def test_battle_ids_are_unique():
+    core = CombatCore(seed=1)
+    ids = {core._new_battle_id("npc", 1, "Thug") for _ in range(20000)}
+    assert len(ids) == 20000
@@ -0,0 +1,99 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+from handlers import combat_enhanced
+from handlers.combat_core import CombatCore
+
+def play(core: CombatCore, battle_data: dict, turns) -> list:
+    async def scenario():
+        battle = core.battles.get(battle_data['battle_id'])
+        results = []
+        for user_id, action in turns:
+            result = await core.execute_player_turn(battle['battle_id'], action, user_id=user_id)
+            if 'error' in result:
+                break
+            results.append(result)
+        await core.battles.stop()
+        return battle, results
+    return asyncio.run(scenario())
+
+def test_npc_battle_replays_identically(player, fake_db):
+    core = CombatCore(seed=99)
+    core.db = fake_db
+    live = player(1, level=3, health=60)
+    data = asyncio.run(core.execute_npc_battle(live))
+    battle, results = play(core, data, [(1, 'attack')] * 40)
+    assert results[-1]['battle_ended']
+
+    # The live player keeps changing after the battle (regen, other fights)
+    live.health, live.level = 100, 9
+    record = core.battle_record(battle)
+    for _ in range(2):
+        assert core.replay_battle(record) == results
+
+def test_pvp_battle_replays_identically(player):
+    core = CombatCore(seed=7)
+    first, second = player(1, level=2), player(2, level=4)
+    data = asyncio.run(core.execute_pvp_battle(first, second))
+    turns = [(1, 'attack'), (2, 'escape'), (1, 'attack'), (2, 'attack')] * 20
+    battle, results = play(core, data, turns)
+    assert results[-1]['battle_ended']
+
+    first.health = second.health = 100
+    replayed = core.replay_battle(core.battle_record(battle))
+    assert replayed == results
+
+def test_record_does_not_hold_live_players(player):
+    core = CombatCore(seed=1)
+    data = asyncio.run(core.execute_pvp_battle(player(1), player(2)))
+    record = core.battle_record(core.battles.get(data['battle_id']))
+    assert all(isinstance(stats, dict) for stats in record['initial'].values())
+    asyncio.run(core.battles.stop())
+
+def test_bot_battle_replays_identically(monkeypatch, player, fake_db):
+    async def edit_message_text(query, text, **kwargs):
+        pass
+
+    monkeypatch.setattr(combat_enhanced, 'db', fake_db)
+    monkeypatch.setattr(combat_enhanced, 'outbound', SimpleNamespace(edit_message_text=edit_message_text))
+    handler = combat_enhanced.EnhancedCombatHandler()
+
+    for seed in range(20):
+        live = player(1, level=4, health=80)
+        record = handler.battle_record(live, "medium", seed)
+        rng = random.Random(record['seed'])
+        npc = handler._create_npc("medium", live.level, rng)
+        result = asyncio.run(handler._execute_bot_battle(None, live, npc, rng, instant=True, record=record))
+        assert handler.replay_battle(record) == result
+    assert len(fake_db.saved) == 20
+
+def test_bot_battle_seeds_come_from_the_seeded_core(monkeypatch, fake_db):
+    async def edit_message_text(query, text, **kwargs):
+        pass
+
+    async def answer(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(combat_enhanced, 'db', fake_db)
+    monkeypatch.setattr(combat_enhanced, 'outbound', SimpleNamespace(edit_message_text=edit_message_text))
+    monkeypatch.setattr(combat_enhanced, 'combat_core', CombatCore(seed=5))
+    handler = combat_enhanced.EnhancedCombatHandler()
+    query = SimpleNamespace(data="bot_medium", from_user=SimpleNamespace(id=1, first_name="User1"),
+                            message=SimpleNamespace(chat_id=1), answer=answer)
+    context = SimpleNamespace(user_data={'instant_battles': True})
+
+    asyncio.run(handler.start_bot_battle(SimpleNamespace(callback_query=query), context))
+    assert context.user_data['last_bot_battle']['seed'] == CombatCore(seed=5).new_seed()
+
+def test_ended_battle_is_logged_with_its_seed_and_actions(caplog, player, fake_db):
+    core = CombatCore(seed=3)
+    core.db = fake_db
+    data = asyncio.run(core.execute_pvp_battle(player(1), player(2, health=1)))
+    with caplog.at_level("INFO", logger="handlers.combat_core"):
+        battle, _ = play(core, data, [(1, 'attack')])
+
+    [logged] = [r for r in caplog.records if getattr(r, 'event', None) == 'battle_ended']
+    record = core.battle_record(battle)
+    assert (logged.battle_id, logged.seed, logged.actions) == (record['battle_id'], record['seed'], ['attack'])
+    assert logged.winner == 'player1'
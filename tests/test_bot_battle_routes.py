@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+from core import keyboards
+from core.bot import MafiaBot
+from handlers import combat_enhanced
+
+class FakeOutbound:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_message_text(self, query, text, **kwargs):
+        self.edits.append((text, kwargs.get('reply_markup')))
+
+def tap(data: str, user_data: dict):
+    async def answer(*args, **kwargs):
+        pass
+
+    query = SimpleNamespace(data=data, from_user=SimpleNamespace(id=7, first_name="User"),
+                            message=SimpleNamespace(chat_id=7), answer=answer)
+    return SimpleNamespace(callback_query=query), SimpleNamespace(user_data=user_data)
+
+def test_combat_menu_leads_to_the_bot_battle_menu():
+    buttons = [button.callback_data for row in keyboards.COMBAT_MENU.inline_keyboard for button in row]
+    assert "fight_bots" in buttons
+
+def test_bot_battle_buttons_dispatch_to_the_enhanced_handler(monkeypatch, fake_db):
+    outbound = FakeOutbound()
+    monkeypatch.setattr(combat_enhanced, 'db', fake_db)
+    monkeypatch.setattr(combat_enhanced, 'outbound', outbound)
+    router = MafiaBot(token="123456:TEST").router
+
+    for data in ("fight_bots", "bot_easy", "bot_medium", "bot_hard", "bot_instant_toggle"):
+        assert router.resolve(data).key == data
+
+    user_data = {}
+    asyncio.run(router.dispatch(*tap("fight_bots", user_data)))
+    asyncio.run(router.dispatch(*tap("bot_instant_toggle", user_data)))
+
+    instant = not combat_enhanced.INSTANT_BATTLES_DEFAULT
+    assert user_data['instant_battles'] is instant
+    assert [markup for _, markup in outbound.edits] == [
+        keyboards.bot_difficulty(not instant), keyboards.bot_difficulty(instant)
+    ]
+    toggle = router.resolve("bot_instant_toggle")
+    assert toggle.calls == 1
+    assert toggle.callback.__self__ is combat_enhanced.combat_handler
+
+def test_double_tap_starts_one_bot_battle(monkeypatch, fake_db):
+    outbound = FakeOutbound()
+    monkeypatch.setattr(combat_enhanced, 'db', fake_db)
+    monkeypatch.setattr(combat_enhanced, 'outbound', outbound)
+    handler = combat_enhanced.EnhancedCombatHandler()
+    toasts = []
+
+    async def answer(text=None, **kwargs):
+        toasts.append(text)
+        await asyncio.sleep(0.01)
+
+    query = SimpleNamespace(data="bot_easy", from_user=SimpleNamespace(id=7, first_name="User"),
+                            message=SimpleNamespace(chat_id=7), answer=answer)
+    update, context = SimpleNamespace(callback_query=query), SimpleNamespace(user_data={'instant_battles': True})
+
+    async def scenario():
+        await asyncio.gather(handler.start_bot_battle(update, context), handler.start_bot_battle(update, context))
+
+    asyncio.run(scenario())
+    assert toasts == [None, "⏳ Already on it..."]
+    assert len(fake_db.saved) == 1
+    assert len(outbound.edits) == 1
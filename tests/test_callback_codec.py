@@ -0,0 +1,52 @@
+import base64
+import itertools
+import string
+import struct
+import zlib
+
+import pytest
+
+from core.callback_codec import (BATTLE_ACTIONS, BATTLE_PREFIX, CALLBACK_VERSION, CallbackDecodeError,
+                                 decode_battle_action, encode_battle_action)
+
+def raw(version: int, epoch: int, action_code: int, handle: int) -> str:
+    """callback_data with a valid checksum around arbitrary fields"""
+    body = struct.pack('>BHBI', version, epoch, action_code, handle)
+    payload = body + struct.pack('>H', zlib.crc32(body) & 0xFFFF)
+    return BATTLE_PREFIX + base64.urlsafe_b64encode(payload).rstrip(b'=').decode('ascii')
+
+@pytest.mark.parametrize("action, handle, epoch", list(itertools.product(
+    BATTLE_ACTIONS, (0, 1, 123456, 0xFFFFFFFF), (0, 42, 0xFFFF))))
+def test_round_trip(action, handle, epoch):
+    data = encode_battle_action(action, handle, epoch)
+    assert data.startswith(BATTLE_PREFIX)
+    assert len(data.encode()) == 16
+    assert decode_battle_action(data) == (action, handle, epoch)
+
+def test_every_single_character_change_is_rejected():
+    data = encode_battle_action('attack', 987654, 321)
+    alphabet = string.ascii_letters + string.digits + "-_"
+    for index in range(len(BATTLE_PREFIX), len(data)):
+        for char in alphabet:
+            if char == data[index]:
+                continue
+            with pytest.raises(CallbackDecodeError):
+                decode_battle_action(data[:index] + char + data[index + 1:])
+
+def test_other_version_is_rejected():
+    assert decode_battle_action(raw(CALLBACK_VERSION, 1, 0, 5)) == ('attack', 5, 1)
+    with pytest.raises(CallbackDecodeError, match="version"):
+        decode_battle_action(raw(CALLBACK_VERSION + 1, 1, 0, 5))
+
+def test_unknown_action_is_rejected():
+    with pytest.raises(CallbackDecodeError, match="action"):
+        decode_battle_action(raw(CALLBACK_VERSION, 1, len(BATTLE_ACTIONS), 5))
+
+@pytest.mark.parametrize("data", [
+    "", "battle_attack_npc_1_Thug_1234", "b:", "x:AQAqAgAB4kAQDg",
+    encode_battle_action('attack', 1, 1)[:-1], encode_battle_action('attack', 1, 1) + "A",
+    "b:!!!!!!!!!!!!!!",
+])
+def test_malformed_data_is_rejected(data):
+    with pytest.raises(CallbackDecodeError):
+        decode_battle_action(data)
@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+from core.database import Database
+from models.player import Player
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "test.db"), pool_size=2)
+    yield database
+    database.close()
+
+def test_connections_are_pooled_and_reused(db):
+    for _ in range(10):
+        db.get_player(1)
+    assert len(db._connections) == 1
+
+def test_pool_never_grows_past_pool_size(db):
+    threads = [threading.Thread(target=lambda: [db.get_player(1) for _ in range(50)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(db._connections) <= db.pool_size
+
+def test_connections_use_wal(db):
+    with db.connection() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+def test_failed_transaction_rolls_back(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO players (user_id, username) VALUES (1, 'x')")
+            raise RuntimeError("boom")
+    assert db.get_player(1) is None
+
+def test_nested_transaction_joins_outer(db):
+    with db.transaction() as outer:
+        with db.transaction() as inner:
+            assert inner is outer
+        db.save_player(Player(1, "u", "U"))
+    assert db.get_player(1).first_name == "U"
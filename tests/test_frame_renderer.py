@@ -0,0 +1,53 @@
+import asyncio
+
+from core.frame_renderer import FrameRenderer
+
+class FakeScheduler:
+    """Sends every call at once"""
+
+    def available(self, chat_id):
+        return True
+
+    async def send(self, chat_id, make_call, priority):
+        return await make_call()
+
+class FakeMessage:
+    def __init__(self, chat_id=1, failing=()):
+        self.chat_id = chat_id
+        self.failing = set(failing)
+        self.texts = []
+        self.replies = []
+
+    async def edit_text(self, text, **kwargs):
+        if text in self.failing:
+            raise RuntimeError("Bad Request: message can't be edited")
+        self.texts.append((text, kwargs.get('reply_markup')))
+
+    async def reply_text(self, text, **kwargs):
+        if text in self.failing:
+            raise RuntimeError("Bad Request: chat not found")
+        reply = FakeMessage(self.chat_id)
+        reply.texts.append((text, kwargs.get('reply_markup')))
+        self.replies.append(reply)
+        return reply
+
+def test_failed_middle_frame_does_not_stop_the_animation():
+    renderer = FrameRenderer(FakeScheduler(), min_interval=0)
+    message = FakeMessage(failing={"two"})
+    frames = ["one", "two", "three", "final"]
+
+    result = asyncio.run(renderer.play(message, frames, reply_markup="keyboard"))
+    assert result is message
+    assert message.texts == [("one", None), ("three", None), ("final", "keyboard")]
+    assert renderer.frames_failed == 1
+    assert renderer.frames_rendered == 3
+
+def test_failed_first_reply_is_retried_with_the_next_frame():
+    renderer = FrameRenderer(FakeScheduler(), min_interval=0)
+    message = FakeMessage(failing={"one"})
+
+    reply = asyncio.run(renderer.play(message, ["one", "two", "final"], reply_markup="keyboard",
+                                      new_message=True))
+    assert message.replies == [reply]
+    assert reply.texts == [("two", None), ("final", "keyboard")]
+    assert message.texts == []
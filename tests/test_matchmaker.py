@@ -0,0 +1,105 @@
+import asyncio
+
+from handlers.matchmaking import Matchmaker, MatchmakingQueue
+
+
+async def _no_match(first, second):
+    return None
+
+
+def ids(pairs):
+    return sorted(tuple(sorted((a.user_id, b.user_id))) for a, b in pairs)
+
+
+def test_pairs_closest_levels_first(player):
+    matchmaker = Matchmaker(_no_match)
+    for user_id, level in ((1, 1), (2, 5), (3, 6), (4, 2)):
+        matchmaker.queue.add(player(user_id, level=level), now=0)
+
+    assert ids(matchmaker.pair(now=0)) == [(1, 4), (2, 3)]
+    assert len(matchmaker.queue) == 0
+
+
+def test_level_gap_outside_window_is_not_paired(player):
+    matchmaker = Matchmaker(_no_match, MatchmakingQueue(base_window=2, widen_every=15))
+    matchmaker.queue.add(player(1, level=1), now=0)
+    matchmaker.queue.add(player(2, level=6), now=0)
+
+    assert matchmaker.pair(now=0) == []
+    assert len(matchmaker.queue) == 2
+
+
+def test_window_widens_while_waiting(player):
+    matchmaker = Matchmaker(_no_match, MatchmakingQueue(base_window=2, widen_every=15))
+    matchmaker.queue.add(player(1, level=1), now=0)
+    matchmaker.queue.add(player(2, level=6), now=0)
+
+    # 45 s of waiting widens the gap from 2 to 5 levels
+    assert ids(matchmaker.pair(now=45)) == [(1, 2)]
+
+
+def test_ineligible_players_wait_unpaired(player):
+    matchmaker = Matchmaker(_no_match)
+    matchmaker.queue.add(player(1, level=3, energy=5), now=0)
+    matchmaker.queue.add(player(2, level=3), now=0)
+
+    assert matchmaker.pair(now=0) == []
+    assert 1 in matchmaker.queue
+
+    # Refreshing with enough energy makes them matchable
+    matchmaker.queue.add(player(1, level=3), now=1)
+    assert ids(matchmaker.pair(now=1)) == [(1, 2)]
+
+
+def test_request_match_hands_result_to_both_players(player):
+    created = []
+
+    async def on_match(first, second):
+        created.append((first, second))
+        return f"battle {first}-{second}"
+
+    async def run():
+        matchmaker = Matchmaker(on_match, tick_interval=0.01)
+        try:
+            return await asyncio.gather(
+                matchmaker.request_match(player(1, level=4), timeout=1),
+                matchmaker.request_match(player(2, level=5), timeout=1),
+            )
+        finally:
+            await matchmaker.stop()
+
+    results = asyncio.run(run())
+    assert len(created) == 1
+    assert results[0] == results[1] == "battle %s-%s" % created[0]
+
+
+def test_request_match_times_out_alone(player):
+    async def run():
+        matchmaker = Matchmaker(_no_match, tick_interval=0.01)
+        try:
+            result = await matchmaker.request_match(player(1, level=4), timeout=0.05)
+            return result, len(matchmaker.queue)
+        finally:
+            await matchmaker.stop()
+
+    assert asyncio.run(run()) == (None, 0)
+
+
+def test_leaving_a_busy_level_leaves_nothing_behind(player):
+    queue = MatchmakingQueue()
+    queue.add(player(0, level=5), now=0)  # Keeps level 5 from ever emptying
+    for user_id in range(1, 1001):
+        queue.add(player(user_id, level=5), now=0)
+        queue.remove(user_id)
+    assert len(queue._buckets[5]) == 1
+    assert [entry.user_id for entry in queue.entries_by_level()] == [0]
+    assert queue.stats() == {'waiting': 1, 'eligible': 1, 'levels': 1}
+
+
+def test_refreshed_player_moves_to_their_new_level(player):
+    queue = MatchmakingQueue()
+    queue.add(player(1, level=3), now=0)
+    queue.add(player(2, level=3), now=0)
+    queue.add(player(1, level=4), now=5)
+    assert [(entry.user_id, entry.level) for entry in queue.entries_by_level()] == [(2, 3), (1, 4)]
+    assert queue.entries_by_level()[1].joined_at == 0
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+from telegram.error import RetryAfter
+
+from core.outbound import (PRIORITY_ANIMATION, PRIORITY_INTERACTIVE, OutboundScheduler,
+                           TokenBucket)
+
+def test_bucket_spends_burst_then_refills():
+    bucket = TokenBucket(rate=2, capacity=3)
+    now = bucket.updated = 100.0
+    for _ in range(3):
+        assert bucket.wait_time(now) == 0
+        bucket.take(now)
+    assert bucket.wait_time(now) == 0.5
+    assert bucket.wait_time(now + 0.5) == 0
+
+def test_blocked_bucket_waits_out_retry_after():
+    bucket = TokenBucket(rate=4, capacity=4)
+    now = bucket.updated = 100.0
+    bucket.block(2.0, now)
+    assert bucket.wait_time(now) == 2.0
+    assert bucket.wait_time(now + 1.5) == 0.5
+    assert not bucket.is_idle(now + 1.5)
+    # Starts refilling from empty once the block is over
+    assert bucket.wait_time(now + 2.0) == 0.25
+    assert bucket.wait_time(now + 2.25) == 0
+
+def test_retry_after_pauses_the_chat_and_retries_in_order():
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, per_chat_rate=1000, per_chat_burst=10)
+        sent = []
+        attempts = {'first': 0}
+
+        async def first():
+            attempts['first'] += 1
+            if attempts['first'] == 1:
+                raise RetryAfter(0.2)
+            sent.append(('first', time.monotonic()))
+            return "first ok"
+
+        async def second():
+            sent.append(('second', time.monotonic()))
+            return "second ok"
+
+        started = time.monotonic()
+        try:
+            results = await asyncio.wait_for(asyncio.gather(
+                scheduler.send(1, first),
+                scheduler.send(1, second),
+            ), timeout=5)
+        finally:
+            await scheduler.stop()
+
+        assert results == ["first ok", "second ok"]
+        assert attempts['first'] == 2
+        assert [name for name, _ in sent] == ['first', 'second']
+        assert sent[0][1] - started >= 0.2
+        assert scheduler.retry_after_total == 1
+        assert scheduler.sent_total == 2
+
+    asyncio.run(scenario())
+
+def test_retry_after_in_one_chat_does_not_hold_up_others():
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, per_chat_rate=1000, per_chat_burst=10)
+        delivered = []
+        attempts = []
+
+        async def throttled():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RetryAfter(0.3)
+            delivered.append(1)
+
+        async def other():
+            delivered.append(2)
+
+        try:
+            blocked = scheduler.send(1, throttled)
+            await asyncio.sleep(0.05)
+            await asyncio.wait_for(scheduler.send(2, other), timeout=0.2)
+            assert delivered == [2]
+            await asyncio.wait_for(blocked, timeout=5)
+            assert delivered == [2, 1]
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(scenario())
+
+def test_interactive_lane_overtakes_animation():
+    async def scenario():
+        # Only one token per second globally, so everything after the first call queues
+        scheduler = OutboundScheduler(global_rate=1, per_chat_rate=1000, per_chat_burst=10)
+        scheduler.global_bucket = TokenBucket(rate=20, capacity=1)
+        order = []
+
+        def call(name):
+            async def make():
+                order.append(name)
+            return make
+
+        try:
+            futures = [scheduler.send(1, call('frame1'), PRIORITY_ANIMATION),
+                       scheduler.send(2, call('frame2'), PRIORITY_ANIMATION),
+                       scheduler.send(3, call('reply'), PRIORITY_INTERACTIVE)]
+            await asyncio.wait_for(asyncio.gather(*futures), timeout=5)
+        finally:
+            await scheduler.stop()
+        assert order.index('reply') < order.index('frame2')
+
+    asyncio.run(scenario())
+
+def test_interactive_call_overtakes_animation_in_the_same_chat():
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1000, per_chat_rate=20, per_chat_burst=1)
+        order = []
+
+        def call(name):
+            async def make():
+                order.append(name)
+            return make
+
+        try:
+            futures = [scheduler.send(1, call(f'frame{n}'), PRIORITY_ANIMATION) for n in (1, 2, 3)]
+            futures.append(scheduler.send(1, call('reply'), PRIORITY_INTERACTIVE))
+            futures.append(scheduler.send(1, call('frame4'), PRIORITY_ANIMATION))
+            await asyncio.wait_for(asyncio.gather(*futures), timeout=5)
+        finally:
+            await scheduler.stop()
+        assert order == ['reply', 'frame1', 'frame2', 'frame3', 'frame4']
+
+    asyncio.run(scenario())
@@ -0,0 +1,97 @@
+from core.player_cache import PlayerCache
+
+def flush(cache: PlayerCache):
+    snapshots = cache.take_dirty()
+    for snapshot in snapshots:
+        snapshot.mark_saved()
+    cache.confirm_saved(snapshots)
+
+def test_get_returns_the_same_instance(player):
+    cache = PlayerCache()
+    first = cache.add(player(1))
+    assert cache.get(1) is first
+    assert cache.add(player(1)) is first
+
+def test_mark_dirty_and_take_dirty(player):
+    cache = PlayerCache()
+    live = cache.add(player(1))
+    cache.add(player(2))
+    cache.mark_dirty(live)
+    assert cache.dirty_count == 1
+
+    snapshots = cache.take_dirty()
+    assert [snapshot.user_id for snapshot in snapshots] == [1]
+    assert snapshots[0] is not live
+    assert cache.dirty_count == 0
+    assert cache.take_dirty() == []
+
+def test_confirm_saved_marks_live_player_clean(player):
+    cache = PlayerCache()
+    live = cache.add(player(1))
+    cache.mark_dirty(live)
+    snapshots = cache.take_dirty()
+    for snapshot in snapshots:
+        snapshot.mark_saved()
+    cache.confirm_saved(snapshots)
+    assert live.get_changes() == {}
+
+def test_restore_dirty_after_failed_write(player):
+    cache = PlayerCache()
+    cache.mark_dirty(cache.add(player(1)))
+    snapshots = cache.take_dirty()
+    cache.restore_dirty(snapshots)
+    assert cache.dirty_count == 1
+
+def test_evicts_least_recently_used_clean_entries(loaded):
+    cache = PlayerCache(max_entries=2)
+    cache.add(loaded(1))
+    cache.add(loaded(2))
+    cache.get(1)
+    cache.add(loaded(3))
+    assert 2 not in cache
+    assert 1 in cache and 3 in cache
+
+def test_dirty_entries_are_never_evicted(player, loaded):
+    cache = PlayerCache(max_entries=2)
+    for user_id in (1, 2, 3):
+        cache.mark_dirty(player(user_id))
+    assert len(cache) == 3
+    flush(cache)
+    cache.add(loaded(4))
+    assert len(cache) == 2
+
+def test_players_changed_in_place_are_not_evicted(loaded):
+    cache = PlayerCache(max_entries=1)
+    live = cache.add(loaded(1))
+    live.health -= 30  # e.g. battle damage, without save_player()
+    cache.add(loaded(2))
+    assert cache.get(1) is live
+    assert 2 not in cache
+
+def test_players_being_flushed_are_not_evicted(loaded):
+    cache = PlayerCache(max_entries=1)
+    live = cache.add(loaded(1))
+    live.cash += 100
+    cache.mark_dirty(live)
+    snapshots = cache.take_dirty()
+    assert cache.dirty_count == 0 and cache.flushing_count == 1
+
+    # The write is still running: the entry must survive
+    cache.add(loaded(2))
+    assert cache.get(1) is live
+
+    for snapshot in snapshots:
+        snapshot.mark_saved()
+    cache.confirm_saved(snapshots)
+    assert cache.flushing_count == 0
+    assert 1 not in cache or 2 not in cache
+    assert len(cache) == 1
+
+def test_invalidate_keeps_unsaved_players(loaded):
+    cache = PlayerCache()
+    cache.mark_dirty(cache.add(loaded(1)))
+    cache.add(loaded(2))
+    cache.add(loaded(3)).level = 7
+    for user_id in (1, 2, 3):
+        cache.invalidate(user_id)
+    assert 1 in cache and 2 not in cache and 3 in cache
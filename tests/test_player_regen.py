@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+from models.player import Player, MAX_ENERGY, REGEN_TICK_SECONDS
+
+def test_full_player_read_is_not_a_change():
+    player = Player(1, "u", "User")
+    player.mark_saved()
+    assert player.apply_regen(datetime.now() + timedelta(hours=5)) is False
+    assert player.get_changes() == {}
+
+def test_idle_time_while_full_is_not_banked():
+    player = Player(1, "u", "User", last_regen_at=(datetime.now() - timedelta(hours=5)).isoformat())
+    player.energy -= 10
+    # The clock restarted when energy dropped, so nothing has regenerated yet
+    assert player.apply_regen() is False
+    assert player.energy == MAX_ENERGY - 10
+
+def test_regen_applies_whole_ticks_and_carries_the_rest():
+    player = Player(1, "u", "User")
+    player.energy = 10
+    start = datetime.fromisoformat(player.last_regen_at)
+    assert player.apply_regen(start + timedelta(seconds=2.5 * REGEN_TICK_SECONDS)) is True
+    assert player.energy == 12
+    assert datetime.fromisoformat(player.last_regen_at) == start + timedelta(seconds=2 * REGEN_TICK_SECONDS)
+
+def test_regen_stops_at_the_cap():
+    player = Player(1, "u", "User")
+    player.energy = MAX_ENERGY - 1
+    start = datetime.fromisoformat(player.last_regen_at)
+    player.apply_regen(start + timedelta(days=1))
+    assert player.energy == MAX_ENERGY
@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+from core import keyboards
+from core.callback_codec import encode_battle_action
+from handlers import combat_handlers as handlers_module
+from handlers.combat_core import CombatCore
+
+def test_only_the_player_whose_turn_it_is_may_act(player):
+    async def scenario():
+        core = CombatCore(seed=1)
+        data = await core.execute_pvp_battle(player(1), player(2))
+        battle_id = data['battle_id']
+
+        out_of_turn = await core.execute_player_turn(battle_id, 'attack', user_id=2)
+        outsider = await core.execute_player_turn(battle_id, 'attack', user_id=3)
+        assert out_of_turn['rejected'] and outsider['rejected']
+        assert core.battles.get(battle_id)['actions'] == []
+
+        first = await core.execute_player_turn(battle_id, 'attack', user_id=1)
+        assert first['battle_ended'] is False
+        assert (await core.execute_player_turn(battle_id, 'attack', user_id=1))['rejected']
+        assert 'rejected' not in await core.execute_player_turn(battle_id, 'attack', user_id=2)
+        await core.battles.stop()
+
+    asyncio.run(scenario())
+
+def test_finishing_blow_ends_the_battle_with_a_winner(player):
+    async def scenario():
+        core = CombatCore(seed=1)
+        loser = player(2, health=1)
+        data = await core.execute_pvp_battle(player(1), loser)
+
+        result = await core.execute_player_turn(data['battle_id'], 'attack', user_id=1)
+        assert result['battle_ended'] is True
+        assert result['winner'] == 1
+        assert loser.health == 0
+        assert data['battle_id'] not in core.battles
+        await core.battles.stop()
+
+    asyncio.run(scenario())
+
+class FakeRenderer:
+    def __init__(self):
+        self.shown = {}
+
+    def spawn(self, message, frames, reply_markup=None, **kwargs):
+        self.shown[message.chat_id] = (frames[-1], reply_markup)
+
+def test_both_players_see_the_pvp_outcome(monkeypatch, player):
+    core = CombatCore(seed=1)
+    renderer = FakeRenderer()
+    monkeypatch.setattr(handlers_module, 'combat_core', core)
+    monkeypatch.setattr(handlers_module, 'renderer', renderer)
+
+    async def scenario():
+        data = await core.execute_pvp_battle(player(1), player(2, health=1))
+        battle = core.battles.get(data['battle_id'])
+        battle['messages'] = {2: SimpleNamespace(chat_id=2)}
+
+        async def answer(*args, **kwargs):
+            pass
+
+        query = SimpleNamespace(
+            from_user=SimpleNamespace(id=1, first_name="User1"),
+            data=encode_battle_action('attack', battle['handle'], core.battles.epoch),
+            message=SimpleNamespace(chat_id=1),
+            answer=answer,
+        )
+        await handlers_module.combat_handlers.battle_action(SimpleNamespace(callback_query=query), None)
+        await core.battles.stop()
+
+    asyncio.run(scenario())
+    winner_text, winner_markup = renderer.shown[1]
+    loser_text, loser_markup = renderer.shown[2]
+    assert "VICTORY" in winner_text and winner_markup is keyboards.BATTLE_VICTORY
+    assert "DEFEAT" in loser_text and loser_markup is keyboards.BATTLE_DEFEAT
+
+def test_every_turn_queues_the_damaged_players_for_writing(player, fake_db):
+    async def scenario():
+        core = CombatCore(seed=1)
+        core.db = fake_db
+        data = await core.execute_pvp_battle(player(1), player(2))
+        await core.execute_player_turn(data['battle_id'], 'attack', user_id=1)
+        await core.execute_player_turn(data['battle_id'], 'attack', user_id=2)
+        await core.battles.stop()
+
+    asyncio.run(scenario())
+    assert [sorted(p.user_id for p in batch) for batch in fake_db.saved] == [[1, 2], [1, 2]]
@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from core.bot import MafiaBot
+from core.callback_codec import encode_battle_action
+from core.router import CallbackRouter, RouteConflictError
+from core.services import services
+from handlers.combat_routes import BOT_BATTLE_ROUTES, COMBAT_ROUTES
+from shop.shop_routes import SHOP_ROUTES
+
+async def noop(update, context):
+    pass
+
+def tap(data: str):
+    answered = []
+
+    async def answer(*args, **kwargs):
+        answered.append(args)
+
+    query = SimpleNamespace(data=data, answer=answer)
+    return SimpleNamespace(callback_query=query), answered
+
+@pytest.mark.parametrize("first, second", [
+    (("shop", False), ("shop", False)),          # Same exact key twice
+    (("shop_buy_", True), ("shop_buy_gun", False)),  # Prefix covers a later exact key
+    (("shop_buy_gun", False), ("shop_buy_", True)),  # ... or an earlier one
+    (("shop_", True), ("shop_buy_", True)),        # Nested prefixes, either order
+    (("shop_buy_", True), ("shop_", True)),
+    (("shop_", True), ("shop_", True)),
+])
+def test_overlapping_routes_are_rejected(first, second):
+    router = CallbackRouter()
+    router.add(first[0], noop, prefix=first[1])
+    with pytest.raises(RouteConflictError):
+        router.add(second[0], noop, prefix=second[1])
+    assert len(router) == 1
+
+def test_sibling_prefixes_and_exact_keys_coexist():
+    router = CallbackRouter()
+    router.add("shop", noop)
+    router.add("shop_buy_", noop, prefix=True)
+    router.add("shop_category_", noop, prefix=True)
+    router.add("b:", noop, prefix=True)
+
+    assert router.resolve("shop").key == "shop"
+    assert router.resolve("shop_buy_pistol").key == "shop_buy_"
+    assert router.resolve("shop_category_weapons").key == "shop_category_"
+    assert router.resolve("b:AQAqAgAB4kAQDg").key == "b:"
+    assert router.resolve("shop_") is None
+    assert router.resolve("shopping") is None
+    assert len(router) == 4
+
+def test_lazy_route_loads_its_callback_once():
+    router = CallbackRouter()
+    calls = []
+    loads = []
+
+    async def callback(update, context):
+        calls.append(update.callback_query.data)
+
+    def loader():
+        loads.append(1)
+        return callback
+
+    route = router.add_lazy("shop_buy_", loader, prefix=True)
+    assert route.callback is None and "lazy" in route.describe()
+
+    for data in ("shop_buy_gun", "shop_buy_vest"):
+        asyncio.run(router.dispatch(tap(data)[0], None))
+    assert loads == [1]
+    assert calls == ["shop_buy_gun", "shop_buy_vest"]
+    assert route.calls == 2
+
+def test_unmatched_callback_is_answered():
+    router = CallbackRouter()
+    update, answered = tap("nothing_here")
+    asyncio.run(router.dispatch(update, None))
+    assert answered == [()]
+    assert router.unmatched == 1
+
+def test_bot_route_table_has_a_single_owner_per_key():
+    router = MafiaBot(token="123456:TEST").router
+    routes = COMBAT_ROUTES + BOT_BATTLE_ROUTES + (SHOP_ROUTES if services.available("shop") else ())
+    for key, _, prefix, _ in routes:
+        data = key + "x" if prefix else key
+        assert router.resolve(data).key == key
+    assert router.resolve(encode_battle_action('attack', 1, 1)).name == "lazy combat.battle_action"
+    assert router.resolve("main_menu") is not None
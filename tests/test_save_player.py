@@ -0,0 +1,60 @@
+import pytest
+
+from core.database import Database
+from models.player import Player
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "test.db"))
+    yield database
+    database.close()
+
+def test_new_player_is_inserted(db):
+    player = Player(1, "u", "User")
+    assert player.is_new()
+    db.save_player(player)
+    assert not player.is_new()
+    assert player.get_changes() == {}
+    assert db.get_player(1).to_dict() == player.to_dict()
+
+def test_update_touches_only_changed_columns(db):
+    db.save_player(Player(1, "u", "User"))
+    player = db.get_player(1)
+    player.level = 5
+    sql, params = db._update_statement(player, player.get_changes())
+    assert sql == "UPDATE players SET level = ? WHERE user_id = ?"
+    assert params == (5, 1)
+
+def test_counters_are_written_as_increments(db):
+    db.save_player(Player(1, "u", "User", cash=1000))
+    player = db.get_player(1)
+    player.cash += 250
+    sql, params = db._update_statement(player, player.get_changes())
+    assert sql == "UPDATE players SET cash = cash + ? WHERE user_id = ?"
+    assert params == (250, 1)
+
+def test_concurrent_counter_changes_are_not_lost(db):
+    db.save_player(Player(1, "u", "User", cash=1000))
+    first = db.get_player(1)
+    second = db.get_player(1)
+    first.cash += 100
+    second.cash -= 30
+    db.save_player(first)
+    db.save_player(second)
+    assert db.get_player(1).cash == 1070
+
+def test_unchanged_player_is_not_written(db):
+    db.save_player(Player(1, "u", "User"))
+    written = db.write_transactions
+    db.save_player(db.get_player(1))
+    assert db.write_transactions == written
+
+def test_vanished_row_is_written_back_whole(db):
+    db.save_player(Player(1, "u", "User"))
+    player = db.get_player(1)
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM players WHERE user_id = 1")
+    player.level = 3
+    db.save_player(player)
+    restored = db.get_player(1)
+    assert restored.level == 3 and restored.first_name == "User"
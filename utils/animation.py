@@ -1,25 +1,31 @@
 import random
 import time
+from functools import lru_cache
 from typing import List
 
+@lru_cache(maxsize=8192)
+def _health_bar(health: int, max_health: int, bar_length: int) -> str:
+    # Only a few hundred (health, max) pairs ever show up, so each is built once
+    percentage = health / max_health
+    filled = int(percentage * bar_length)
+    
+    # Different colors based on health percentage
+    if percentage > 0.7:
+        filled_char = '🟩'  # Green
+    elif percentage > 0.3:
+        filled_char = '🟨'  # Yellow
+    else:
+        filled_char = '🟥'  # Red
+        
+    empty_char = '⬜'
+    bar = filled_char * filled + empty_char * (bar_length - filled)
+    return f"{bar} {health}/{max_health} ❤️"
+
 class CombatAnimations:
     @staticmethod
     def generate_health_bar(health: int, max_health: int = 100, bar_length: int = 15) -> str:
-        """Generate a beautiful visual health bar with emojis"""
-        percentage = health / max_health
-        filled = int(percentage * bar_length)
-        
-        # Different colors based on health percentage
-        if percentage > 0.7:
-            filled_char = '🟩'  # Green
-        elif percentage > 0.3:
-            filled_char = '🟨'  # Yellow
-        else:
-            filled_char = '🟥'  # Red
-            
-        empty_char = '⬜'
-        bar = filled_char * filled + empty_char * (bar_length - filled)
-        return f"{bar} {health}/{max_health} ❤️"
+        """Generate a beautiful visual health bar with emojis (memoized)"""
+        return _health_bar(health, max_health, bar_length)
 
     @staticmethod
     def combat_intro(attacker_name: str, defender_name: str) -> List[str]:
@@ -33,8 +39,8 @@ class CombatAnimations:
         ]
 
     @staticmethod
-    def class_specific_attack(attacker_name: str, character_class: str) -> str:
-        """Special animated attacks for each class"""
+    def class_specific_attack(attacker_name: str, character_class: str, rng: random.Random = None) -> str:
+        """Special animated attacks for each class (pass the battle's rng to keep replays exact)"""
         class_animations = {
             'enforcer': [
                 f"💥 **{attacker_name}** lands a **DEVASTATING PUNCH!** 🤜💥",
@@ -55,7 +61,7 @@ class CombatAnimations:
                 f"🛡️ **{attacker_name}** uses **IMPROVISED WEAPONS!** 🔧💥"
             ]
         }
-        return random.choice(class_animations.get(character_class, class_animations['enforcer']))
+        return (rng or random).choice(class_animations.get(character_class, class_animations['enforcer']))
 
     @staticmethod
     def damage_animation(damage: int, critical: bool = False) -> str:
@@ -0,0 +1,289 @@
+"""
+BALANCE SIMULATOR
+Headless Monte Carlo runs of bot battles for tuning class and NPC numbers
+
+Mirrors the fight in EnhancedCombatHandler._simulate_fight: the player
+attacks with CombatCalculator.calculate_damage, the NPC answers with an
+action from its personality pool, for up to max_rounds rounds. Random draws
+are made for a whole batch of fights at once with NumPy, so a million
+fights take a few seconds on one core.
+
+    python -m utils.balance_simulator --fights 100000 --levels 1,5,10,20
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Only needed for offline balance runs, not by the bot
+    np = None
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.npc import NPCFactory, PERSONALITY_ACTIONS
+from models.player import MAX_HEALTH
+from utils.combat_calculator import CombatCalculator
+
+ARCHETYPES = {
+    'street_thug': NPCFactory.create_street_thug,
+    'gang_member': NPCFactory.create_gang_member,
+    'police_officer': NPCFactory.create_police_officer,
+    'mafia_boss': NPCFactory.create_mafia_boss,
+}
+CLASSES = tuple(CombatCalculator.CLASS_BONUSES)
+ACTIONS = ('attack', 'special', 'defend')
+
+MAX_BOT_ROUNDS = 3  # Same cap as handlers.combat_enhanced
+DEFEAT_REPUTATION = -2
+CHUNK_SIZE = 250_000
+
+@dataclass
+class MatchupResult:
+    """Totals for one class vs archetype pairing at one level"""
+    character_class: str
+    archetype: str
+    level: int
+    fights: int = 0
+    wins: int = 0
+    cash_total: int = 0
+    reputation_total: int = 0
+    # ttk_counts[r] = fights won on round r; index 0 counts losses and draws
+    ttk_counts: List[int] = field(default_factory=list)
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.fights if self.fights else 0.0
+
+    @property
+    def avg_cash(self) -> float:
+        return self.cash_total / self.fights if self.fights else 0.0
+
+    @property
+    def avg_reputation(self) -> float:
+        return self.reputation_total / self.fights if self.fights else 0.0
+
+    @property
+    def avg_ttk(self) -> float:
+        """Mean rounds to kill over won fights"""
+        if not self.wins:
+            return 0.0
+        return sum(rounds * count for rounds, count in enumerate(self.ttk_counts)) / self.wins
+
+class BalanceSimulator:
+    """Vectorized bot battle simulation
+
+    NPC variety (random names, classes and personalities) comes straight
+    from NPCFactory: each matchup samples npc_variants NPCs from the factory
+    and every simulated fight picks one of them at random. The factories
+    draw from a random.Random derived from the same seed as the fights, so
+    a seed reproduces the whole run.
+    """
+
+    def __init__(self, max_rounds: int = MAX_BOT_ROUNDS, start_health: int = MAX_HEALTH,
+                 npc_variants: int = 64, seed: Optional[int] = None):
+        if np is None:
+            raise RuntimeError("The balance simulator needs NumPy: pip install numpy")
+        self.max_rounds = max_rounds
+        self.start_health = start_health
+        self.npc_variants = npc_variants
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        fight_seed, npc_seed = seed.spawn(2)
+        self.rng = np.random.default_rng(fight_seed)
+        self.npc_rng = random.Random(int(npc_seed.generate_state(1, np.uint64)[0]))
+
+    def _npc_table(self, archetype: str, level: int) -> Dict:
+        """Per-variant NPC parameters as arrays"""
+        npcs = [ARCHETYPES[archetype](level, self.npc_rng) for _ in range(self.npc_variants)]
+        action_probs = []
+        for npc in npcs:
+            pool = PERSONALITY_ACTIONS.get(npc.personality, PERSONALITY_ACTIONS["tricky"])
+            action_probs.append([pool.count(action) / len(pool) for action in ACTIONS])
+        rewards = [npc.get_rewards() for npc in npcs]
+        return {
+            'health': np.array([npc.health for npc in npcs]),
+            'level': np.array([npc.level for npc in npcs]),
+            'damage_multiplier': np.array([npc.damage_multiplier for npc in npcs]),
+            'defense_multiplier': np.array([npc.defense_multiplier for npc in npcs]),
+            'action_cdf': np.cumsum(np.array(action_probs), axis=1),
+            'cash': np.array([reward['cash'] for reward in rewards]),
+            'reputation': np.array([reward['reputation'] for reward in rewards]),
+        }
+
+    def _run_chunk(self, character_class: str, level: int, table: Dict, fights: int):
+        """Simulate fights in one batch, returning (won, ttk, cash, reputation) arrays"""
+        rng = self.rng
+        low, high = CombatCalculator.RANDOM_RANGE
+        attack_power = (
+            CombatCalculator.BASE_DAMAGE
+            + CombatCalculator.CLASS_BONUSES.get(character_class, CombatCalculator.DEFAULT_CLASS_BONUS)
+            + level * CombatCalculator.LEVEL_BONUS
+        )
+
+        variant = rng.integers(0, self.npc_variants, size=fights)
+        npc_health = table['health'][variant].astype(np.int64)
+        npc_power = table['level'][variant] * 5 * table['damage_multiplier'][variant]  # NPC.calculate_damage
+        defense = table['defense_multiplier'][variant]
+        action_cdf = table['action_cdf'][variant]
+        player_health = np.full(fights, self.start_health, dtype=np.int64)
+        ttk = np.zeros(fights, dtype=np.int64)
+
+        for round_num in range(1, self.max_rounds + 1):
+            active = (player_health > 0) & (npc_health > 0)
+            if not active.any():
+                break
+
+            # Player turn: CombatCalculator.calculate_damage, then NPC.take_damage
+            damage = np.maximum(CombatCalculator.MIN_DAMAGE,
+                                (attack_power * rng.uniform(low, high, fights)).astype(np.int64))
+            dealt = (damage / defense).astype(np.int64)
+            npc_health = np.where(active, np.maximum(0, npc_health - dealt), npc_health)
+            ttk[active & (npc_health == 0)] = round_num
+
+            # NPC turn: choose_action, then calculate_damage (x1.5 for specials)
+            answering = active & (npc_health > 0)
+            roll = rng.random(fights)
+            is_attack = roll < action_cdf[:, 0]
+            is_special = ~is_attack & (roll < action_cdf[:, 1])
+            npc_damage = np.maximum(5, (npc_power * rng.uniform(0.8, 1.2, fights)).astype(np.int64))
+            npc_damage = np.where(is_special, (npc_damage * 1.5).astype(np.int64), npc_damage)
+            npc_damage = np.where(is_attack | is_special, npc_damage, 0)
+            player_health = np.where(answering, player_health - npc_damage, player_health)
+
+        won = npc_health == 0
+        cash = np.where(won, table['cash'][variant], 0)
+        reputation = np.where(won, table['reputation'][variant], DEFEAT_REPUTATION)
+        return won, ttk, cash, reputation
+
+    def simulate(self, character_class: str, level: int, archetype: str, fights: int) -> MatchupResult:
+        """Run fights battles of one class against one NPC archetype"""
+        table = self._npc_table(archetype, level)
+        result = MatchupResult(character_class, archetype, level, ttk_counts=[0] * (self.max_rounds + 1))
+        ttk_counts = np.zeros(self.max_rounds + 1, dtype=np.int64)
+        remaining = fights
+        while remaining > 0:
+            batch = min(CHUNK_SIZE, remaining)
+            won, ttk, cash, reputation = self._run_chunk(character_class, level, table, batch)
+            result.fights += batch
+            result.wins += int(won.sum())
+            result.cash_total += int(cash.sum())
+            result.reputation_total += int(reputation.sum())
+            ttk_counts += np.bincount(ttk, minlength=self.max_rounds + 1)
+            remaining -= batch
+        result.ttk_counts = [int(count) for count in ttk_counts]
+        return result
+
+    def sweep(self, levels: Iterable[int], fights: int, classes: Sequence[str] = CLASSES,
+              archetypes: Sequence[str] = tuple(ARCHETYPES), processes: int = 1,
+              seed: Optional[int] = None) -> 'SweepReport':
+        """Simulate every class x level x archetype combination
+
+        With processes > 1 the matchups are spread over a process pool; each
+        one gets its own child seed, so results don't depend on scheduling.
+        """
+        tasks = [
+            (character_class, level, archetype)
+            for level in levels
+            for character_class in classes
+            for archetype in archetypes
+        ]
+        seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+        jobs = [
+            (task, fights, child, self.max_rounds, self.start_health, self.npc_variants)
+            for task, child in zip(tasks, seeds)
+        ]
+
+        if processes > 1:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                results = list(pool.map(_simulate_job, jobs, chunksize=max(1, len(jobs) // (processes * 4))))
+        else:
+            results = [_simulate_job(job) for job in jobs]
+        return SweepReport(results)
+
+def _simulate_job(job) -> MatchupResult:
+    (character_class, level, archetype), fights, seed, max_rounds, start_health, npc_variants = job
+    simulator = BalanceSimulator(max_rounds, start_health, npc_variants, seed=seed)
+    return simulator.simulate(character_class, level, archetype, fights)
+
+class SweepReport:
+    """Results of a sweep, with matrix and table views"""
+
+    def __init__(self, results: List[MatchupResult]):
+        self.results = results
+        self._index: Dict[Tuple[str, int, str], MatchupResult] = {
+            (result.character_class, result.level, result.archetype): result
+            for result in results
+        }
+
+    @property
+    def total_fights(self) -> int:
+        return sum(result.fights for result in self.results)
+
+    def levels(self) -> List[int]:
+        return sorted({result.level for result in self.results})
+
+    def matrix(self, level: int, metric: str = 'win_rate'):
+        """(classes, archetypes, values) with one row per class, one column per archetype"""
+        classes = sorted({result.character_class for result in self.results}, key=CLASSES.index)
+        archetypes = [name for name in ARCHETYPES if any(result.archetype == name for result in self.results)]
+        values = np.array([
+            [getattr(self._index[(character_class, level, archetype)], metric) for archetype in archetypes]
+            for character_class in classes
+        ])
+        return classes, archetypes, values
+
+    def format_table(self, level: int) -> str:
+        """Win rate / avg cash / avg reputation / avg rounds-to-kill table for one level"""
+        classes, archetypes, _ = self.matrix(level)
+        lines = [f"📊 Level {level}", f"{'':<10}" + "".join(f"{name:>26}" for name in archetypes)]
+        for character_class in classes:
+            cells = []
+            for archetype in archetypes:
+                result = self._index[(character_class, level, archetype)]
+                cells.append(f"{result.win_rate:>6.1%} ${result.avg_cash:>6.1f} "
+                             f"{result.avg_reputation:>+5.1f}r {result.avg_ttk:>3.1f}t")
+            lines.append(f"{character_class:<10}" + "".join(f"{cell:>26}" for cell in cells))
+        return "\n".join(lines)
+
+def _parse_levels(text: str) -> List[int]:
+    """'1,5,10' or '1-20'"""
+    levels = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            levels.extend(range(int(first), int(last) + 1))
+        else:
+            levels.append(int(part))
+    return levels
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo balance runs for bot battles")
+    parser.add_argument('--fights', type=int, default=100_000, help="fights per class/level/archetype")
+    parser.add_argument('--levels', type=_parse_levels, default=[1, 5, 10, 20], help="e.g. 1,5,10 or 1-20")
+    parser.add_argument('--max-rounds', type=int, default=MAX_BOT_ROUNDS)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    simulator = BalanceSimulator(max_rounds=args.max_rounds)
+    started = time.perf_counter()
+    report = simulator.sweep(args.levels, args.fights, processes=args.processes, seed=args.seed)
+    elapsed = time.perf_counter() - started
+
+    print("cell = win rate, avg cash, avg reputation, avg rounds to kill\n")
+    for level in report.levels():
+        print(report.format_table(level))
+        print()
+    print(f"✅ {report.total_fights:,} fights in {elapsed:.2f}s "
+          f"({report.total_fights / elapsed:,.0f} fights/s)")
+
+if __name__ == "__main__":
+    main()
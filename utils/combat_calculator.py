@@ -2,31 +2,41 @@ import random
 from models.player import Player
 
 class CombatCalculator:
+    # Damage tuning, shared with utils/balance_simulator.py
+    BASE_DAMAGE = 10
+    CLASS_BONUSES = {
+        'enforcer': 15,
+        'hacker': 8,
+        'smuggler': 10
+    }
+    DEFAULT_CLASS_BONUS = 10
+    LEVEL_BONUS = 2
+    RANDOM_RANGE = (0.8, 1.2)
+    MIN_DAMAGE = 5
+    
     @staticmethod
-    def calculate_damage(attacker: Player, defender: Player) -> int:
-        """Calculate damage based on classes and levels"""
-        base_damage = 10
+    def calculate_damage(attacker: Player, defender: Player, rng: random.Random = None) -> int:
+        """Calculate damage based on classes and levels (rng defaults to the random module)"""
+        rng = rng or random
+        base_damage = CombatCalculator.BASE_DAMAGE
         
         # Class bonuses
-        class_bonuses = {
-            'enforcer': 15,
-            'hacker': 8,
-            'smuggler': 10
-        }
+        class_bonus = CombatCalculator.CLASS_BONUSES.get(attacker.character_class, CombatCalculator.DEFAULT_CLASS_BONUS)
         
         # Level bonus
-        level_bonus = attacker.level * 2
+        level_bonus = attacker.level * CombatCalculator.LEVEL_BONUS
         
         # Random factor (80% to 120%)
-        random_factor = random.uniform(0.8, 1.2)
+        random_factor = rng.uniform(*CombatCalculator.RANDOM_RANGE)
         
-        damage = int((base_damage + class_bonuses.get(attacker.character_class, 10) + level_bonus) * random_factor)
+        damage = int((base_damage + class_bonus + level_bonus) * random_factor)
         
-        return max(5, damage)  # Minimum 5 damage
+        return max(CombatCalculator.MIN_DAMAGE, damage)  # Minimum 5 damage
     
     @staticmethod
-    def calculate_escape_chance(attacker: Player, defender: Player) -> bool:
+    def calculate_escape_chance(attacker: Player, defender: Player, rng: random.Random = None) -> bool:
         """Calculate if defender can escape combat"""
+        rng = rng or random
         escape_chance = 0.3  # Base 30% chance
         
         # Smugglers have better escape chance
@@ -37,7 +47,7 @@ class CombatCalculator:
         level_diff = defender.level - attacker.level
         escape_chance += level_diff * 0.05
         
-        return random.random() < escape_chance
+        return rng.random() < escape_chance
     
     @staticmethod
     def calculate_rewards(attacker: Player, defender: Player, victory: bool) -> dict:
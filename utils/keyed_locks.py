@@ -0,0 +1,45 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable
+
+class KeyedLocks:
+    """asyncio locks created on demand per key and dropped when unused
+
+    hold() takes several keys at once, always in sorted order, so two
+    coroutines locking overlapping key sets cannot deadlock.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._users: Dict[Hashable, int] = {}
+
+    def __len__(self):
+        return len(self._locks)
+
+    def locked(self, key: Hashable) -> bool:
+        lock = self._locks.get(key)
+        return lock is not None and lock.locked()
+
+    @asynccontextmanager
+    async def hold(self, *keys: Hashable):
+        keys = sorted(set(keys), key=repr)
+        for key in keys:
+            if key not in self._locks:
+                self._locks[key] = asyncio.Lock()
+                self._users[key] = 0
+            self._users[key] += 1
+
+        acquired = []
+        try:
+            for key in keys:
+                await self._locks[key].acquire()
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._locks[key].release()
+            for key in keys:
+                self._users[key] -= 1
+                if self._users[key] == 0:
+                    del self._users[key]
+                    del self._locks[key]
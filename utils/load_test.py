@@ -0,0 +1,374 @@
+"""
+LOAD TEST
+Thousands of virtual players driving the real bot, without Telegram
+
+Synthetic Updates go through the Application built by MafiaBot (handlers,
+router, combat, database, outbound scheduler and all); only the HTTP layer
+is swapped for StubBotAPI, which answers Bot API calls locally after a
+simulated latency and can throw in RetryAfter responses.
+
+Each virtual player plays a script the way a person would, pressing the
+buttons the bot actually sent it:
+
+    /start -> create_char -> class_* -> my_profile -> combat
+           -> combat_quick or combat_bot -> battle actions until it ends
+           -> main_menu
+
+Latency is measured per step, from putting the update on the queue until
+the bot's answer (the message with the next keyboard) reaches the stub.
+
+    python -m utils.load_test --players 2000 --ramp 10 --retry-after-rate 0.01
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The load test must never open a metrics port of its own
+os.environ.setdefault("METRICS_PORT", "0")
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+from core.async_database import async_db
+from core.callback_codec import BATTLE_PREFIX
+from core.frame_renderer import renderer
+from core.logging_config import configure_logging
+from core.metrics import Histogram, metrics
+from core.outbound import outbound, TokenBucket
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': "Mafia Wars", 'username': "mafia_wars_load_bot"}
+VISIBLE_METHODS = frozenset({'sendMessage', 'editMessageText', 'sendDocument'})
+FIRST_USER_ID = 10_000_000
+CLASSES = ('class_enforcer', 'class_hacker', 'class_smuggler')
+
+class StubBotAPI(BaseRequest):
+    """Local stand-in for api.telegram.org
+
+    Every call is counted per method, answered after `latency` seconds
+    (+/- `jitter` as a fraction) and, with probability retry_after_rate,
+    rejected with a 429 RetryAfter instead. Calls that show something in
+    a chat are passed to on_reply(chat_id, message) once they succeed.
+    """
+
+    def __init__(self, latency: float = 0.03, jitter: float = 0.5, retry_after_rate: float = 0.0,
+                 retry_after: int = 1, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.retry_afters = 0
+        self.on_reply: Optional[Callable[[int, Dict], None]] = None
+        self._message_ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: RequestData = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * (1 + self.jitter * (2 * self.rng.random() - 1)))
+
+        if api_method != 'getMe' and self.rng.random() < self.retry_after_rate:
+            self.retry_afters += 1
+            return 429, json.dumps({
+                'ok': False, 'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after},
+            }).encode()
+
+        result = self._result(api_method, params)
+        if api_method in VISIBLE_METHODS and self.on_reply is not None:
+            self.on_reply(result['chat']['id'], result)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    def _result(self, api_method: str, params: Dict):
+        if api_method == 'getMe':
+            return BOT_USER
+        if api_method in VISIBLE_METHODS:
+            chat_id = int(params['chat_id'])
+            message = {
+                'message_id': int(params.get('message_id') or next(self._message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }
+            if params.get('reply_markup'):
+                message['reply_markup'] = params['reply_markup']
+            return message
+        return True
+
+def _buttons(message: Dict) -> List[str]:
+    """callback_data of every inline button on a message"""
+    markup = message.get('reply_markup') or {}
+    return [button['callback_data'] for row in markup.get('inline_keyboard', ()) for button in row
+            if 'callback_data' in button]
+
+class VirtualPlayer:
+    """One scripted user talking to the bot in its own private chat"""
+
+    def __init__(self, harness: 'LoadTest', user_id: int, rng: random.Random):
+        self.harness = harness
+        self.user_id = user_id
+        self.rng = rng
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': f"Player{user_id}",
+                     'username': f"player{user_id}"}
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.message: Optional[Dict] = None  # The bot message whose buttons we press
+
+    async def run(self, battles: int, quick_ratio: float, think: float):
+        await self.command("start")
+        for data in ("create_char", self.rng.choice(CLASSES), "my_profile"):
+            if not await self.press(data, think):
+                return
+        for _ in range(battles):
+            # Victory/defeat screens only offer a rematch, so go through the main menu
+            if "combat" not in _buttons(self.message) and not await self.press("main_menu", think):
+                return
+            if not await self.press("combat", think):
+                return
+            start = "combat_quick" if self.rng.random() < quick_ratio else "combat_bot"
+            if not await self.press(start, think):
+                return
+            actions = self._battle_buttons()
+            while actions:
+                if "⏳ Waiting for" in self.message.get('text', ''):
+                    # PvP: the opponent moves first, then the screen comes back to us
+                    if not await self.wait_turn():
+                        break
+                    actions = self._battle_buttons()
+                    continue
+                # Laid out as in keyboards.battle_actions: attack, defend, special, escape
+                button = self.rng.choices(actions[:3], (6, 2, 2))[0]
+                if not await self.press(button, think, step="battle_action"):
+                    # A PvP opponent may have finished the battle first; start over from /start
+                    if not await self.command("start"):
+                        return
+                    break
+                actions = self._battle_buttons()
+        if "main_menu" in _buttons(self.message):
+            await self.press("main_menu", think)
+
+    def _battle_buttons(self) -> List[str]:
+        return [data for data in _buttons(self.message) if data.startswith(BATTLE_PREFIX)]
+
+    async def command(self, name: str):
+        message = {
+            'message_id': 0, 'date': int(time.time()), 'text': f"/{name}", 'from': self.user,
+            'chat': {'id': self.user_id, 'type': 'private'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(name) + 1}],
+        }
+        return await self._send({'message': message}, f"/{name}")
+
+    async def press(self, data: str, think: float, step: str = None) -> bool:
+        if self.message is None or data not in _buttons(self.message):
+            self.harness.failures[f"missing button {step or data}"] += 1
+            return False
+        if think:
+            await asyncio.sleep(self.rng.uniform(0, 2 * think))
+        query = {
+            'id': str(self.harness.next_update_id()), 'from': self.user, 'chat_instance': str(self.user_id),
+            'data': data, 'message': self.message,
+        }
+        return await self._send({'callback_query': query}, step or data)
+
+    async def _send(self, payload: Dict, step: str) -> bool:
+        """Feed one update and wait for the bot's next keyboard (or an error) in this chat"""
+        while not self.inbox.empty():
+            self.inbox.get_nowait()
+        payload['update_id'] = self.harness.next_update_id()
+        update = Update.de_json(payload, self.harness.application.bot)
+        started = time.perf_counter()
+        await self.harness.application.update_queue.put(update)
+        self.harness.updates_sent += 1
+        return await self._next_screen(step, started)
+
+    async def wait_turn(self) -> bool:
+        """Wait, without pressing anything, for the opponent's move to reach our screen"""
+        return await self._next_screen("pvp_wait", time.perf_counter(), record=False)
+
+    async def _next_screen(self, step: str, started: float, record: bool = True) -> bool:
+        """Wait for the bot's next keyboard (or an error) in this chat"""
+        deadline = started + self.harness.step_timeout
+        while True:
+            try:
+                message = await asyncio.wait_for(self.inbox.get(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                self.harness.failures[f"timeout {step}"] += 1
+                return False
+            if message.get('reply_markup'):
+                break
+            if message.get('text', '').startswith("❌"):
+                self.harness.failures[f"error {step}"] += 1
+                self.message = message
+                return False
+
+        if record:
+            self.harness.record(step, time.perf_counter() - started)
+        self.message = message
+        return True
+
+class LoadTest:
+    """Runs virtual players against a MafiaBot wired to a StubBotAPI"""
+
+    def __init__(self, players: int, stub: StubBotAPI, battles: int = 2, quick_ratio: float = 0.5,
+                 ramp: float = 5.0, think: float = 0.0, step_timeout: float = 30.0,
+                 real_limits: bool = False, frame_interval: float = 0.0, seed: Optional[int] = None):
+        self.players = players
+        self.stub = stub
+        self.battles = battles
+        self.quick_ratio = quick_ratio
+        self.ramp = ramp
+        self.think = think
+        self.step_timeout = step_timeout
+        self.real_limits = real_limits
+        self.frame_interval = frame_interval
+        self.rng = random.Random(seed)
+        self.application = None
+        self.updates_sent = 0
+        self.latency = Histogram()
+        self.step_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.failures: Counter = Counter()
+        self._update_ids = itertools.count(1)
+        self._players: Dict[int, VirtualPlayer] = {}
+
+    def next_update_id(self) -> int:
+        return next(self._update_ids)
+
+    def record(self, step: str, seconds: float):
+        micros = seconds * 1_000_000
+        self.latency.record(micros)
+        self.step_latency[step].record(micros)
+
+    def _deliver(self, chat_id: int, message: Dict):
+        player = self._players.get(chat_id)
+        if player is not None:
+            player.inbox.put_nowait(message)
+
+    async def run(self) -> Dict:
+        from core.bot import MafiaBot
+
+        bot = MafiaBot(token="123456:LOAD-TEST", request=self.stub)
+        self.application = application = bot.application
+        self.stub.on_reply = self._deliver
+        if not self.real_limits:
+            # Measure the bot itself rather than Telegram's rate limits
+            outbound.global_bucket = TokenBucket(1e9, 1e9)
+            outbound.per_chat_rate = outbound.per_chat_burst = 1e9
+            renderer.min_interval = self.frame_interval
+
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+        try:
+            started = time.perf_counter()
+            tasks = []
+            for index in range(self.players):
+                player = VirtualPlayer(self, FIRST_USER_ID + index, random.Random(self.rng.getrandbits(64)))
+                self._players[player.user_id] = player
+                tasks.append(asyncio.create_task(self._start_player(player, index)))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+        finally:
+            await application.stop()
+            await application.post_stop(application)
+            await application.shutdown()
+            await application.post_shutdown(application)
+        return self.report(elapsed)
+
+    async def _start_player(self, player: VirtualPlayer, index: int):
+        if self.ramp:
+            await asyncio.sleep(self.ramp * index / self.players)
+        await player.run(self.battles, self.quick_ratio, self.think)
+
+    def report(self, elapsed: float) -> Dict:
+        database = async_db.db
+        return {
+            'players': self.players,
+            'elapsed_s': elapsed,
+            'updates': self.updates_sent,
+            'updates_per_s': self.updates_sent / elapsed if elapsed else 0.0,
+            'p50_ms': self.latency.percentile(0.5) / 1000,
+            'p99_ms': self.latency.percentile(0.99) / 1000,
+            'max_ms': self.latency.max / 1000,
+            'steps': {
+                step: (histogram.count, histogram.percentile(0.5) / 1000, histogram.percentile(0.99) / 1000)
+                for step, histogram in self.step_latency.items()
+            },
+            'api_calls': dict(self.stub.calls.most_common()),
+            'retry_afters': self.stub.retry_afters,
+            'db_write_transactions': database.write_transactions,
+            'db_players_written': database.players_written,
+            'db_calls': {row['label']: row['calls'] for row in metrics.summary("db", limit=20)},
+            'handler_errors': sum(row['errors'] for row in metrics.summary("handler", limit=1000)),
+            'failures': dict(self.failures),
+        }
+
+def format_report(report: Dict) -> str:
+    lines = [
+        f"📊 {report['players']:,} players, {report['updates']:,} updates in {report['elapsed_s']:.1f}s "
+        f"= {report['updates_per_s']:,.0f} updates/s",
+        f"⏱️ latency p50 {report['p50_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms, max {report['max_ms']:.1f} ms",
+        "",
+        f"{'step':<20}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}",
+    ]
+    for step, (count, p50, p99) in sorted(report['steps'].items(), key=lambda item: -item[1][0]):
+        lines.append(f"{step:<20}{count:>8}{p50:>10.1f}{p99:>10.1f}")
+    lines += [
+        "",
+        f"📡 Bot API calls: {report['api_calls']} ({report['retry_afters']} RetryAfter)",
+        f"💾 DB: {report['db_write_transactions']} write transactions, "
+        f"{report['db_players_written']} player rows written; calls {report['db_calls']}",
+        f"❌ handler errors: {report['handler_errors']}, failed steps: {report['failures'] or 'none'}",
+    ]
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test against a stub Bot API")
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--battles', type=int, default=2, help="battles per player")
+    parser.add_argument('--quick-ratio', type=float, default=0.5, help="share of battles via combat_quick (PvP)")
+    parser.add_argument('--ramp', type=float, default=5.0, help="seconds over which players join")
+    parser.add_argument('--think', type=float, default=0.0, help="mean seconds between a player's taps")
+    parser.add_argument('--latency', type=float, default=0.03, help="simulated Bot API latency in seconds")
+    parser.add_argument('--retry-after-rate', type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument('--step-timeout', type=float, default=30.0)
+    parser.add_argument('--real-limits', action='store_true',
+                        help="keep Telegram's rate limits and animation pacing")
+    parser.add_argument('--db', default=None, help="SQLite file (default: a fresh temporary one)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--log-level', default="WARNING")
+    args = parser.parse_args(argv)
+
+    configure_logging(level=args.log_level)
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ["DB_PATH"] = args.db or os.path.join(scratch, "load_test.db")
+        stub = StubBotAPI(latency=args.latency, retry_after_rate=args.retry_after_rate, seed=args.seed)
+        test = LoadTest(args.players, stub, battles=args.battles, quick_ratio=args.quick_ratio,
+                        ramp=args.ramp, think=args.think, step_timeout=args.step_timeout,
+                        real_limits=args.real_limits, seed=args.seed)
+        report = asyncio.run(test.run())
+    print(format_report(report))
+
+if __name__ == "__main__":
+    main()